@@ -1,107 +1,419 @@
 import os
+import json
 import time
+import secrets
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime
-from flask import Flask, render_template, request, redirect, url_for, flash, session
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, session, stream_with_context
 from dotenv import load_dotenv
 
-from utils.read_preprocess import DocumentProcessor
-from utils.chunk_data import TextChunker
-from utils.qdrant_db import VectorDatabase
-from utils.retrieval_qa import LLMAgent
-from utils.tavily import WebScraper
-from utils.critic_agent import CriticAgent
+from utils.answer_cache import SemanticAnswerCache
+from utils.conversation_store import create_conversation_store
+from utils.hybrid_search import exact_terms
+from utils.lazy import Lazy, build, is_built
+from utils.metrics import REGISTRY, Trace, set_trace, span, submit_in_context
+from utils.resilience import detached, remaining_budget, set_budget, upstream_stats
 
 load_dotenv()
 
 app = Flask(__name__)
 app.secret_key = os.getenv('FLASK_SECRET_KEY', 'your-secret-key')
 
-# Initialize components
-vector_db = VectorDatabase()
-llm_agent = LLMAgent()
-web_scraper = WebScraper()
-critic_agent = CriticAgent()
-doc_processor = DocumentProcessor()
-text_chunker = TextChunker()
 
+# Components are built on first use, so a worker boots without importing the upstream
+# clients; ingestion lives in ingest.py and is never loaded by the server
+def _build_vector_db():
+    from utils.qdrant_db import create_vector_database
+    vector_db = create_vector_database()
+    REGISTRY.register_histogram(
+        "medbot_query_embedding_batch_size", "Queries per batched embed call",
+        vector_db.embedding_manager.query_batcher.batch_sizes,
+    )
+    REGISTRY.register_histogram(
+        "medbot_query_embedding_batch_wait_ms", "Time a query waited for its embed batch (ms)",
+        vector_db.embedding_manager.query_batcher.wait_ms,
+    )
+    return vector_db
 
-def initialize_database():
-    try:
-        print("Checking database status...")
-        
-        # Check if collection has documents
-        count = vector_db.get_collection_count()
-        if count > 0:
-            print(f" Using existing collection with {count} documents")
-            return True
-        
-        # Collection is empty or doesn't exist, need to load documents
-        print("Loading and processing PDF documents...")
-        
-        # Load documents
-        documents = doc_processor.get_all_documents()
-        if not documents:
-            print(" No PDF documents found in data folder")
-            return False
-        
-        print(f"Found {len(documents)} PDF documents. Processing...")
-        
-        # Chunk documents
-        chunked_docs = text_chunker.chunk_documents(documents)
-        if not chunked_docs:
-            print(" No chunks created from documents")
-            return False
-        
-        print(f"Created {len(chunked_docs)} chunks. Storing in vector database...")
-        
-        # Store in database
-        success = vector_db.store_documents(chunked_docs)
-        if success:
-            final_count = vector_db.get_collection_count()
-            print(f" Database initialized successfully with {final_count} documents")
-            return True
-        else:
-            print(" Failed to store documents in vector database")
-            return False
-            
-    except Exception as e:
-        print(f" Database initialization error: {e}")
-        return False
+
+def _build_llm_agent():
+    from utils.retrieval_qa import LLMAgent
+    return LLMAgent()
+
+
+def _build_web_scraper():
+    from utils.tavily import WebScraper
+    return WebScraper()
+
+
+def _build_critic_agent():
+    from utils.critic_agent import CriticAgent
+    return CriticAgent()
+
+
+def _build_lexical_index():
+    from utils.hybrid_search import create_lexical_index
+    return create_lexical_index(vector_db.collection_name)
+
+
+def _build_hybrid_retriever():
+    from utils.hybrid_search import HybridRetriever
+    return HybridRetriever(build(vector_db), build(lexical_index))
+
+
+vector_db = Lazy(_build_vector_db)
+llm_agent = Lazy(_build_llm_agent)
+web_scraper = Lazy(_build_web_scraper)
+critic_agent = Lazy(_build_critic_agent)
+lexical_index = Lazy(_build_lexical_index)
+hybrid_retriever = Lazy(_build_hybrid_retriever)
+SERVING_COMPONENTS = (vector_db, lexical_index, hybrid_retriever, llm_agent, web_scraper, critic_agent)
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+
+
+def question_key_terms(query):
+    #Numbers, codes and units; rare terms too once the lexical index is loaded, as they need its document counts
+    if HYBRID_SEARCH and is_built(hybrid_retriever):
+        return hybrid_retriever.key_terms(query)
+    return exact_terms(query)
+
+
+# Semantic answer cache: near-duplicate questions skip web search, generation and critique
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE", "true").lower() == "true"
+answer_cache = SemanticAnswerCache(
+    max_size=int(os.getenv("ANSWER_CACHE_SIZE", "1000")),
+    ttl=float(os.getenv("ANSWER_CACHE_TTL", "3600")),
+    threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+    min_score=float(os.getenv("ANSWER_CACHE_MIN_SCORE", "7")),
+    key_terms=question_key_terms,
+)
+
+# Chat history lives server-side; the session cookie only carries its ID
+conversations = create_conversation_store()
+HISTORY_SIDEBAR_ENTRIES = 15
+
+# Critic: a local pre-check decides whether the LLM critique is needed; in deferred mode
+# the answer is returned first and the critique finishes in the background
+CRITIC_MODE = os.getenv("CRITIC_MODE", "deferred").lower()
+critic_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("CRITIC_WORKERS", "4")),
+    thread_name_prefix="critic",
+)
+
+# Upstream calls of one question share this many seconds until its answer is complete;
+# every call gets the smaller of its own timeout and what is left (utils/resilience.py)
+REQUEST_BUDGET = float(os.getenv("REQUEST_BUDGET", "45"))
+
+# Retrieval stage: vector and web search run concurrently, each with its own deadline
+VECTOR_SEARCH_TIMEOUT = float(os.getenv("VECTOR_SEARCH_TIMEOUT", "8"))
+WEB_SEARCH_TIMEOUT = float(os.getenv("WEB_SEARCH_TIMEOUT", "10"))
+retrieval_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("RETRIEVAL_WORKERS", "8")),
+    thread_name_prefix="retrieval",
+)
+
+
+# Prometheus metrics: per-stage spans are recorded by the components, the rest is exported here
+REQUEST_SECONDS = REGISTRY.histogram(
+    "medbot_request_seconds", "Time to answer a question, end to end", labelnames=("cache_hit",)
+)
+FIRST_TOKEN_SECONDS = REGISTRY.histogram("medbot_time_to_first_token_seconds", "Time until the first answer token")
+# Totals and gauges of components that are not built yet read 0 instead of building them
+REGISTRY.counter_callback("medbot_answer_cache_hits_total", "Semantic answer cache hits", lambda: answer_cache.hits)
+REGISTRY.counter_callback("medbot_answer_cache_misses_total", "Semantic answer cache misses",
+                          lambda: answer_cache.misses)
+REGISTRY.counter_callback("medbot_web_cache_hits_total", "Web search cache hits",
+                          lambda: web_scraper.cache.hits if is_built(web_scraper) else 0)
+REGISTRY.counter_callback("medbot_web_cache_misses_total", "Web search cache misses",
+                          lambda: web_scraper.cache.misses if is_built(web_scraper) else 0)
+REGISTRY.counter_callback("medbot_critic_gate_passed_total", "Answers that skipped the LLM critique",
+                          lambda: critic_agent.stats.gate_passed if is_built(critic_agent) else 0)
+REGISTRY.counter_callback("medbot_speculative_follow_ups_total", "Speculative follow-up searches by outcome",
+                          lambda: speculation_outcomes() if is_built(critic_agent) else {}, labelnames=("outcome",))
+REGISTRY.gauge("medbot_context_tokens_saved", "Prompt context tokens saved by packing versus fixed truncation",
+               lambda: llm_agent.context_packer.stats()["tokens_saved"] if is_built(llm_agent) else 0)
+
+
+def retrieve_context(query):
+    return collect_context(start_retrieval(query))
+
+
+def start_retrieval(query):
+    #Start vector and web search at once; collect_context waits for them
+    # BM25 + dense fusion once a lexical index exists; plain dense search otherwise
+    search = hybrid_retriever.search if HYBRID_SEARCH and len(lexical_index) else vector_db.search_similar
+    return time.time(), {
+        "vector_db": (submit_in_context(retrieval_executor, search, query, 5), VECTOR_SEARCH_TIMEOUT),
+        "web_search": (submit_in_context(retrieval_executor, web_scraper.search_web, query, 3), WEB_SEARCH_TIMEOUT),
+    }
 
 
-def process_medical_query(query):
+def collect_context(retrieval):
+    #Keep whatever finishes before its deadline
+    start_time, stages = retrieval
+    results = {}
+    timed_out = []
+    budget = remaining_budget()
+    budget_deadline = time.time() + budget if budget is not None else float("inf")
+    for name, (future, timeout) in stages.items():
+        remaining = max(0.0, min(start_time + timeout, budget_deadline) - time.time())
+        try:
+            results[name] = future.result(timeout=remaining)
+        except FutureTimeoutError:
+            # The call keeps running in the pool; its result is simply ignored
+            future.cancel()
+            timed_out.append(name)
+            results[name] = []
+            print(f"{name} timed out after {timeout:.1f}s, continuing without it")
+        except Exception as e:
+            print(f"{name} failed: {e}")
+            results[name] = []
+
+    return results["vector_db"], results["web_search"], timed_out
+
+
+def stream_medical_query(query, trace=None):
+    #Run the pipeline, yielding (event, data) pairs as each stage completes; pass a Trace to collect a waterfall
     start_time = time.time()
-    try:
-        # Step 1: Vector search
-        vector_results = vector_db.search_similar(query, limit=5)
+    set_trace(trace)
+    set_budget(REQUEST_BUDGET)
 
-        # Step 2: Web search
-        web_results = web_scraper.search_web(query, max_results=3)
+    # Step 1 + 2 start right away: vector search and web search, concurrently
+    retrieval = start_retrieval(query)
 
-        # Step 3: Generate response
-        llm_response = llm_agent.generate_response(query, vector_results, web_results)
+    # Step 0: Near-duplicate questions are answered from the semantic answer cache, checked
+    # while retrieval runs; the embedding call is shared with the vector search's
+    query_embedding = None
+    if ANSWER_CACHE_ENABLED:
+        query_embedding = vector_db.embedding_manager.try_query_embedding(query)
+        cached = answer_cache.lookup(query_embedding, query) if query_embedding is not None else None
+        if cached:
+            # The retrieval still running is dropped; a web search still lands in the web cache
+            yield from cache_hit_events(query, cached, start_time, trace)
+            return
 
-        # Step 4: Critic evaluation
+    vector_results, web_results, timed_out_sources = collect_context(retrieval)
+    yield "sources", sources_payload(vector_results, web_results, timed_out_sources)
+
+    # Weak retrieval usually ends in a follow-up search; start it now, alongside generation
+    follow_up = start_follow_up(query, vector_results, web_results)
+
+    # Step 3: Generate response, token by token
+    pieces = []
+    time_to_first_token = None
+    for piece in llm_agent.stream_response(query, vector_results, web_results):
+        if time_to_first_token is None:
+            time_to_first_token = time.time() - start_time
+        pieces.append(piece)
+        yield "token", piece
+    llm_response = "".join(pieces).strip()
+
+    # Step 4: Critic evaluation, only when the local pre-check is not convincing
+    gate = critic_agent.pre_gate(query, llm_response, vector_results, web_results)
+    critic_eval, critic_source = critic_decision(gate)
+    critique = None
+    if critic_source == "pending":
+        critique = submit_in_context(
+            critic_executor, detached(critic_agent.evaluate_response), query, llm_response, vector_results, web_results
+        )
+    elif critic_source == "llm":
         critic_eval = critic_agent.evaluate_response(query, llm_response, vector_results, web_results)
-        critic_score = critic_eval.get("score", 0)
 
-        final_response = llm_response
-        if critic_eval.get("needs_more_info", False) and critic_score < 6:
-            additional_web = web_scraper.search_web(
-                f"{query} detailed medical information treatment", max_results=2
-            )
-            web_results.extend(additional_web)
-            final_response = llm_agent.generate_response(query, vector_results, web_results)
+    final_response = llm_response
+    if critic_eval and needs_regeneration(critic_eval):
+        final_response = regenerate_response(query, vector_results, web_results, follow_up)
+        follow_up = None
+        yield "replace", final_response
+    elif critique is None:
+        discard_follow_up(follow_up)
 
-        return {
-            "query": query,
-            "vector_results": vector_results,
-            "web_results": web_results,
-            "llm_response": llm_response,
-            "final_response": final_response,
-            "critic_score": critic_score,
-            "processing_time": time.time() - start_time,
-        }
+    result = answer_result(query, vector_results, web_results, llm_response, final_response,
+                           critic_eval, critic_source, timed_out_sources, start_time, time_to_first_token)
+    cache_key = answer_cache_key(query_embedding, timed_out_sources)
+    if critique is None:
+        cache_answer(cache_key, result)
+        yield "done", with_waterfall(result, trace)
+        return
+
+    # Deferred critique: the answer is complete now, the score is attached when the critique lands
+    answered_at = time.time()
+    critique.add_done_callback(lambda future: attach_critique(future, result, cache_key, answered_at))
+    try:
+        yield "done", with_waterfall(result, trace)
+
+        # The answer is out; a follow-up regeneration is no longer held to the request budget
+        set_budget(None)
+        critic_eval = critique.result()
+        if needs_regeneration(critic_eval):
+            final_response = regenerate_response(query, vector_results, web_results, follow_up)
+            follow_up = None
+            yield "replace", final_response
+    finally:
+        # Also reached when the caller stops reading after "done", as the form POST does
+        discard_follow_up(follow_up)
+    yield "critique", critique_payload(critic_eval, llm_response, final_response)
+
+
+# The steps below involve no upstream I/O and are shared with the async pipeline in asgi.py
+def cache_hit_events(query, cached, start_time, trace):
+    #The events that replay a cached answer
+    result, similarity = cached
+    yield "sources", sources_payload(result["vector_results"], result["web_results"], [])
+    yield "token", result["final_response"]
+    elapsed = time.time() - start_time
+    REQUEST_SECONDS.labels(cache_hit=True).observe(elapsed)
+    yield "done", with_waterfall({
+        **result,
+        "query": query,
+        "timed_out_sources": [],
+        "cache_hit": True,
+        "cache_similarity": similarity,
+        "time_to_first_token": elapsed,
+        "processing_time": elapsed,
+    }, trace)
+
+
+def sources_payload(vector_results, web_results, timed_out_sources):
+    return {
+        "vector_results": vector_results,
+        "web_results": web_results,
+        "timed_out_sources": timed_out_sources,
+    }
+
+
+def critic_decision(gate):
+    #(evaluation, source) after the local pre-check: the local evaluation when it is convincing,
+    #else no evaluation yet and "llm" for an inline critique or "pending" for a deferred one
+    if not gate["needs_critique"]:
+        return gate["evaluation"], "local"
+    return None, "pending" if CRITIC_MODE == "deferred" else "llm"
+
+
+def answer_result(query, vector_results, web_results, llm_response, final_response,
+                  critic_eval, critic_source, timed_out_sources, start_time, time_to_first_token):
+    #The answer as returned and cached; records the request metrics
+    result = {
+        "query": query,
+        "vector_results": vector_results,
+        "web_results": web_results,
+        "llm_response": llm_response,
+        "final_response": final_response,
+        "critic_score": critic_eval.get("score", 0) if critic_eval else None,
+        "critic_source": critic_source,
+        "timed_out_sources": timed_out_sources,
+        "cache_hit": False,
+        "time_to_first_token": time_to_first_token or 0.0,
+        "processing_time": time.time() - start_time,
+    }
+    REQUEST_SECONDS.labels(cache_hit=False).observe(result["processing_time"])
+    FIRST_TOKEN_SECONDS.labels().observe(result["time_to_first_token"])
+    return result
+
+
+def answer_cache_key(query_embedding, timed_out_sources):
+    #Answers that timed out on a source are incomplete; don't serve them again
+    return query_embedding if not timed_out_sources else None
+
+
+def cache_answer(cache_key, result):
+    #Only an LLM critique vouches for an answer: one that passed the local pre-check alone is not replayed
+    if cache_key is not None and result["critic_source"] == "llm":
+        answer_cache.store(cache_key, result)
+
+
+def critique_payload(critic_eval, llm_response, final_response):
+    return {
+        "critic_score": critic_eval.get("score", 0),
+        "needs_more_info": critic_eval.get("needs_more_info", False),
+        "regenerated": final_response != llm_response,
+    }
+
+
+def with_waterfall(result, trace):
+    #The stored result stays free of per-request traces; the caller gets a copy with its waterfall
+    if trace is None:
+        return result
+    return {**result, "waterfall": trace.waterfall()}
+
+
+def needs_regeneration(critic_eval):
+    return critic_eval.get("needs_more_info", False) and critic_eval.get("score", 0) < 6
+
+
+def follow_up_query(query):
+    return f"{query} detailed medical information treatment"
+
+
+def speculative_search(query):
+    #The follow-up search, timed so a regeneration that uses it can tell how much waiting it saved
+    started = time.perf_counter()
+    with span("speculative_search"):
+        results = web_scraper.search_web(follow_up_query(query), max_results=2)
+    return results, time.perf_counter() - started
+
+
+def start_follow_up(query, vector_results, web_results):
+    #Future of the follow-up search when the critic is predicted to ask for it, else None
+    if not critic_agent.predicts_follow_up(vector_results, web_results):
+        return None
+    critic_agent.stats.record_speculation()
+    return submit_in_context(retrieval_executor, speculative_search, query)
+
+
+def discard_follow_up(follow_up):
+    #The answer stands without a follow-up search; works for futures and asyncio tasks
+    if follow_up is not None:
+        follow_up.cancel()
+        critic_agent.stats.record_speculation_outcome(used=False)
+
+
+def follow_up_used(search_seconds, waited_seconds):
+    critic_agent.stats.record_speculation_outcome(used=True, saved_seconds=max(0.0, search_seconds - waited_seconds))
+
+
+def speculation_outcomes():
+    snapshot = critic_agent.stats.snapshot()["speculative_follow_up"]
+    return {(outcome,): snapshot[outcome] for outcome in ("started", "used", "wasted", "missed")}
+
+
+def regenerate_response(query, vector_results, web_results, follow_up=None):
+    #One more, broader web search and a fresh answer; web_results is extended in place.
+    #A follow-up search started speculatively is waited for instead of searching again
+    with span("regeneration"):
+        if follow_up is not None:
+            waiting_since = time.perf_counter()
+            additional_web, search_seconds = follow_up.result()
+            follow_up_used(search_seconds, time.perf_counter() - waiting_since)
+        else:
+            if critic_agent.speculative_follow_up:
+                critic_agent.stats.record_speculation_miss()
+            additional_web = web_scraper.search_web(follow_up_query(query), max_results=2)
+        web_results.extend(additional_web)
+        return llm_agent.generate_response(query, vector_results, web_results)
+
+
+def attach_critique(future, result, cache_key, answered_at):
+    #Runs when a deferred critique finishes: log it, attach the score and cache good answers
+    critic_eval = future.result()
+    critic_agent.stats.record_deferred(time.time() - answered_at)
+    result["critic_score"] = critic_eval.get("score", 0)
+    result["critic_source"] = "llm"
+    print(f"Deferred critique for {result['query']!r}: score {result['critic_score']}, "
+          f"needs more info: {critic_eval.get('needs_more_info', False)}")
+    if not needs_regeneration(critic_eval):
+        cache_answer(cache_key, result)
+
+
+def process_medical_query(query, trace=None):
+    start_time = time.time()
+    try:
+        result = None
+        for event, data in stream_medical_query(query, trace):
+            if event == "done":
+                # A deferred critique keeps running in the background and attaches its score later
+                result = data
+                break
+        return result
     except Exception as e:
         print(f"Error processing query: {e}")
         return {
@@ -111,10 +423,83 @@ def process_medical_query(query):
             "llm_response": "I encountered an error while processing your query.",
             "final_response": "I encountered an error while processing your query.",
             "critic_score": 0,
+            "critic_source": "local",
+            "timed_out_sources": [],
+            "cache_hit": False,
+            "time_to_first_token": 0.0,
             "processing_time": time.time() - start_time,
         }
 
 
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def conversation_id(create=False):
+    #The session's history ID; a new one is only issued when there is something to store
+    if "sid" not in session and create:
+        session["sid"] = secrets.token_urlsafe(16)
+    return session.get("sid")
+
+
+class StreamedAnswer:
+    """The history entry of one /chat/stream answer, shared by the sync and async servers.
+
+    It is final at "done", unless the critique was deferred: then it waits for the critique,
+    so the history keeps its score and any regenerated answer the user was shown.
+    """
+
+    def __init__(self, sid, query):
+        self.sid = sid
+        self.query = query
+        self.response = None
+        self.score = None
+        self.recorded = False
+
+    def update(self, event, data):
+        #Takes one streamed event; returns the entry to append once it is final, else None
+        if event == "done":
+            self.response, self.score = data["final_response"], data["critic_score"]
+            final = data["critic_source"] != "pending"
+        elif event == "replace":
+            self.response, final = data, False
+        else:
+            final = event == "critique"
+            if final:
+                self.score = data["critic_score"]
+        return self.entry() if final else None
+
+    def entry(self):
+        #(sid, query, response, score), once; also called when the stream stops before the critique
+        if self.recorded or self.response is None:
+            return None
+        self.recorded = True
+        return self.sid, self.query, self.response, self.score
+
+
+def chat_stream_event(event, data):
+    #One /chat/stream event, shared by the sync and async servers
+    if event == "done":
+        # The answer text has already been streamed; send only the analytics
+        data = {
+            "critic_score": data["critic_score"],
+            "critic_source": data["critic_source"],
+            "processing_time": data["processing_time"],
+            "time_to_first_token": data["time_to_first_token"],
+            "timed_out_sources": data["timed_out_sources"],
+            "cache_hit": data["cache_hit"],
+            **({"waterfall": data["waterfall"]} if "waterfall" in data else {}),
+        }
+    return sse_event(event, data)
+
+
+@app.context_processor
+def inject_chat_history():
+    sid = conversation_id()
+    entries = conversations.history(sid, limit=HISTORY_SIDEBAR_ENTRIES)["entries"] if sid else []
+    return {"chat_history": entries}
+
+
 @app.route("/")
 def index():
     return render_template("chat.html")
@@ -127,37 +512,109 @@ def chat():
         flash("Please enter a medical question.", "error")
         return redirect(url_for("index"))
 
-    result = process_medical_query(query)
+    # Opt-in per-request waterfall of stage timings
+    trace = Trace() if request.values.get("waterfall", "").lower() in ("1", "true") else None
+    result = process_medical_query(query, trace)
 
-    if "chat_history" not in session:
-        session["chat_history"] = []
-
-    session["chat_history"].append(
-        {
-            "query": query,
-            "response": result["final_response"],
-            "score": result["critic_score"],
-            "timestamp": datetime.now().strftime("%H:%M:%S"),
-        }
-    )
-    session["chat_history"] = session["chat_history"][-20:]
-    session.modified = True
+    conversations.append(conversation_id(create=True), query, result["final_response"], result["critic_score"])
 
     return render_template("chat.html", result=result)
 
 
+@app.route("/chat/stream")
+def chat_stream():
+    query = request.args.get("query", "").strip()
+    if not query:
+        return Response(sse_event("error", {"message": "Please enter a medical question."}),
+                        mimetype="text/event-stream")
+
+    trace = Trace() if request.args.get("waterfall", "").lower() in ("1", "true") else None
+    # Issued before streaming starts, while the cookie can still be set
+    sid = conversation_id(create=True)
+
+    def generate():
+        answer = StreamedAnswer(sid, query)
+        try:
+            for event, data in stream_medical_query(query, trace):
+                entry = answer.update(event, data)
+                if entry:
+                    conversations.append(*entry)
+                yield chat_stream_event(event, data)
+        except Exception as e:
+            print(f"Error streaming query: {e}")
+            yield sse_event("error", {"message": "I encountered an error while processing your query."})
+        finally:
+            # A client that leaves before the deferred critique keeps the answer it was shown
+            entry = answer.entry()
+            if entry:
+                conversations.append(*entry)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.route("/clear_history")
 def clear_history():
-    session.pop("chat_history", None)
+    sid = conversation_id()
+    if sid:
+        conversations.clear(sid)
     flash("Chat history cleared.", "success")
     return redirect(url_for("index"))
 
 
+@app.route("/history")
+def history():
+    #Paginated chat history of this session, newest first
+    offset = max(0, request.args.get("offset", 0, type=int))
+    limit = min(100, max(1, request.args.get("limit", 20, type=int)))
+    sid = conversation_id()
+    if not sid:
+        return {"entries": [], "total": 0, "offset": offset, "limit": limit}
+    return conversations.history(sid, offset, limit)
+
+
+@app.route("/metrics")
+def metrics():
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/ready")
+def ready():
+    #Readiness probe: builds the serving components on its first call and needs a non-empty collection
+    try:
+        for component in SERVING_COMPONENTS:
+            build(component)
+        count = vector_db.get_collection_count()
+    except Exception as e:
+        return {"ready": False, "error": str(e)}, 503
+    if count == 0:
+        return {"ready": False, "error": "The vector collection is empty; run python ingest.py"}, 503
+    return {"ready": True, "documents": count}
+
+
 @app.route("/status")
 def status():
     try:
         count = vector_db.get_collection_count()
-        return {"status": "healthy", "documents": count, "timestamp": datetime.now().isoformat()}
+        return {
+            "status": "healthy",
+            "documents": count,
+            "query_embedding_cache": vector_db.embedding_manager.query_cache.stats(),
+            "document_embedding": vector_db.embedding_manager.stats(),
+            "chunk_store": vector_db.chunk_store.stats() if vector_db.chunk_store is not None else None,
+            "query_embedding_batching": vector_db.embedding_manager.query_batcher.stats(),
+            "hybrid_search": hybrid_retriever.stats(),
+            "answer_cache": answer_cache.stats(),
+            "web_search_cache": web_scraper.stats(),
+            "critic": critic_agent.stats.snapshot(),
+            "context_packing": llm_agent.context_packer.stats(),
+            "conversations": conversations.stats(),
+            "upstreams": upstream_stats(),
+            "timestamp": datetime.now().isoformat(),
+        }
     except Exception as e:
         return {"status": "error", "error": str(e), "timestamp": datetime.now().isoformat()}
 
@@ -166,14 +623,14 @@ if __name__ == "__main__":
     print(" Starting Medical AI Chatbot...")
 
     # Check required environment variables
-    required_keys = ["QDRANT_URL", "QDRANT_API_KEY", "GROQ_API_KEY", "TAVILY_API_KEY", "COHERE_API_KEY"]
-    missing = [k for k in required_keys if not os.getenv(k)]
+    from ingest import initialize_database, missing_environment
+    missing = missing_environment()
     if missing:
         print(f" Missing environment variables: {', '.join(missing)}")
         exit(1)
 
-    # Initialize database
-    if initialize_database():
+    # Development server: bring the collection up to date first (production servers run python ingest.py)
+    if initialize_database(build(vector_db), build(lexical_index)):
         print(" Database ready")
     else:
         print(" Database initialization incomplete, but continuing...")
@@ -0,0 +1,268 @@
+import time
+import asyncio
+import secrets
+from contextlib import asynccontextmanager
+from itsdangerous import BadSignature
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware.wsgi import WSGIMiddleware
+from starlette.responses import StreamingResponse
+from starlette.routing import Mount, Route
+
+from app import (
+    app as flask_app, vector_db, web_scraper, lexical_index, hybrid_retriever, answer_cache,
+    critic_agent, HYBRID_SEARCH, ANSWER_CACHE_ENABLED, VECTOR_SEARCH_TIMEOUT, WEB_SEARCH_TIMEOUT, REQUEST_BUDGET,
+    conversations, sse_event, chat_stream_event, StreamedAnswer, needs_regeneration, attach_critique, with_waterfall,
+    follow_up_query, discard_follow_up, follow_up_used, cache_hit_events, sources_payload, critic_decision,
+    answer_result, answer_cache_key, cache_answer, critique_payload,
+)
+from utils.http_pool import close_async_client
+from utils.lazy import Lazy, build, is_built
+from utils.metrics import Trace, set_trace, span
+from utils.resilience import detached, remaining_budget, set_budget
+
+# Async serving mode: the question pipeline runs on the event loop, so one process holds
+# many conversations at once. Pages, the form POST and /status are served by the Flask app.
+#   uvicorn asgi:app --host 0.0.0.0 --port 8000
+# Like the sync components, these are built on first use
+def _build_async_vector_db():
+    from utils.qdrant_db import AsyncVectorDatabase
+    return AsyncVectorDatabase(build(vector_db))
+
+
+def _build_async_web_scraper():
+    from utils.tavily import AsyncWebScraper
+    return AsyncWebScraper(cache=web_scraper.cache)
+
+
+def _build_async_llm_agent():
+    from utils.retrieval_qa import AsyncLLMAgent
+    return AsyncLLMAgent()
+
+
+def _build_async_critic_agent():
+    from utils.critic_agent import AsyncCriticAgent
+    agent = AsyncCriticAgent()
+    agent.stats = critic_agent.stats  # One set of critic counters on /status
+    return agent
+
+
+async_vector_db = Lazy(_build_async_vector_db)
+async_web_scraper = Lazy(_build_async_web_scraper)
+async_llm_agent = Lazy(_build_async_llm_agent)
+async_critic_agent = Lazy(_build_async_critic_agent)
+
+
+async def _with_deadline(name, coro, timeout):
+    budget = remaining_budget()
+    if budget is not None:
+        timeout = max(0.0, min(timeout, budget))
+    try:
+        return await asyncio.wait_for(coro, timeout), False
+    except asyncio.TimeoutError:
+        print(f"{name} timed out after {timeout:.1f}s, continuing without it")
+        return [], True
+    except Exception as e:
+        print(f"{name} failed: {e}")
+        return [], False
+
+
+async def retrieve_context(query):
+    #Vector and web search concurrently, each with its own deadline
+    if HYBRID_SEARCH and not is_built(hybrid_retriever):
+        # The first request loads the lexical index from disk; not on the event loop
+        await run_in_threadpool(build, hybrid_retriever)
+    if HYBRID_SEARCH and len(lexical_index):
+        vector_search = hybrid_retriever.asearch(query, async_vector_db, 5)
+    else:
+        vector_search = async_vector_db.search_similar(query, 5)
+    (vector_results, vector_timed_out), (web_results, web_timed_out) = await asyncio.gather(
+        _with_deadline("vector_db", vector_search, VECTOR_SEARCH_TIMEOUT),
+        _with_deadline("web_search", async_web_scraper.search_web(query, 3), WEB_SEARCH_TIMEOUT),
+    )
+    timed_out = [name for name, flag in (("vector_db", vector_timed_out), ("web_search", web_timed_out)) if flag]
+    return vector_results, web_results, timed_out
+
+
+async def stream_medical_query(query, trace=None):
+    #Async counterpart of app.stream_medical_query, yielding the same (event, data) pairs
+    start_time = time.time()
+    set_trace(trace)
+    set_budget(REQUEST_BUDGET)
+
+    # Step 1 + 2 start right away: vector search and web search, concurrently
+    retrieval = asyncio.ensure_future(retrieve_context(query))
+
+    # Step 0: Near-duplicate questions are answered from the semantic answer cache, checked
+    # while retrieval runs; the embedding call is shared with the vector search's
+    query_embedding = None
+    if ANSWER_CACHE_ENABLED:
+        query_embedding = await vector_db.embedding_manager.aquery_embedding(query)
+        cached = answer_cache.lookup(query_embedding, query) if query_embedding is not None else None
+        if cached:
+            retrieval.cancel()
+            for event, data in cache_hit_events(query, cached, start_time, trace):
+                yield event, data
+            return
+
+    vector_results, web_results, timed_out_sources = await retrieval
+    yield "sources", sources_payload(vector_results, web_results, timed_out_sources)
+
+    # Weak retrieval usually ends in a follow-up search; start it now, alongside generation
+    follow_up = start_follow_up(query, vector_results, web_results)
+
+    # Step 3: Generate response, token by token
+    pieces = []
+    time_to_first_token = None
+    async for piece in async_llm_agent.stream_response(query, vector_results, web_results):
+        if time_to_first_token is None:
+            time_to_first_token = time.time() - start_time
+        pieces.append(piece)
+        yield "token", piece
+    llm_response = "".join(pieces).strip()
+
+    # Step 4: Critic evaluation, only when the local pre-check is not convincing
+    gate = async_critic_agent.pre_gate(query, llm_response, vector_results, web_results)
+    critic_eval, critic_source = critic_decision(gate)
+    critique = None
+    if critic_source == "pending":
+        critique = asyncio.ensure_future(
+            detached(async_critic_agent.evaluate_response)(query, llm_response, vector_results, web_results)
+        )
+    elif critic_source == "llm":
+        critic_eval = await async_critic_agent.evaluate_response(query, llm_response, vector_results, web_results)
+
+    final_response = llm_response
+    if critic_eval and needs_regeneration(critic_eval):
+        final_response = await regenerate_response(query, vector_results, web_results, follow_up)
+        follow_up = None
+        yield "replace", final_response
+    elif critique is None:
+        discard_follow_up(follow_up)
+
+    result = answer_result(query, vector_results, web_results, llm_response, final_response,
+                           critic_eval, critic_source, timed_out_sources, start_time, time_to_first_token)
+    cache_key = answer_cache_key(query_embedding, timed_out_sources)
+    if critique is None:
+        cache_answer(cache_key, result)
+        yield "done", with_waterfall(result, trace)
+        return
+
+    # Deferred critique: the answer is complete now, the score is attached when the critique lands
+    answered_at = time.time()
+    critique.add_done_callback(lambda task: attach_critique(task, result, cache_key, answered_at))
+    try:
+        yield "done", with_waterfall(result, trace)
+
+        set_budget(None)
+        critic_eval = await asyncio.shield(critique)
+        if needs_regeneration(critic_eval):
+            final_response = await regenerate_response(query, vector_results, web_results, follow_up)
+            follow_up = None
+            yield "replace", final_response
+    finally:
+        discard_follow_up(follow_up)
+    yield "critique", critique_payload(critic_eval, llm_response, final_response)
+
+
+async def speculative_search(query):
+    started = time.perf_counter()
+    with span("speculative_search"):
+        results = await async_web_scraper.search_web(follow_up_query(query), max_results=2)
+    return results, time.perf_counter() - started
+
+
+def start_follow_up(query, vector_results, web_results):
+    #Task of the follow-up search when the critic is predicted to ask for it; cancelled if it is not needed
+    if not async_critic_agent.predicts_follow_up(vector_results, web_results):
+        return None
+    async_critic_agent.stats.record_speculation()
+    return asyncio.ensure_future(speculative_search(query))
+
+
+async def regenerate_response(query, vector_results, web_results, follow_up=None):
+    with span("regeneration"):
+        if follow_up is not None:
+            waiting_since = time.perf_counter()
+            additional_web, search_seconds = await follow_up
+            follow_up_used(search_seconds, time.perf_counter() - waiting_since)
+        else:
+            if async_critic_agent.speculative_follow_up:
+                async_critic_agent.stats.record_speculation_miss()
+            additional_web = await async_web_scraper.search_web(follow_up_query(query), max_results=2)
+        web_results.extend(additional_web)
+        return await async_llm_agent.generate_response(query, vector_results, web_results)
+
+
+def conversation_id(request):
+    #The history ID from Flask's signed session cookie, so both servers share one history;
+    #returns (sid, cookie value to set), the cookie only when a new ID was issued
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    try:
+        data = serializer.loads(request.cookies[flask_app.session_interface.get_cookie_name(flask_app)])
+    except (KeyError, BadSignature):
+        data = {}
+    if "sid" in data:
+        return data["sid"], None
+    data["sid"] = secrets.token_urlsafe(16)
+    return data["sid"], serializer.dumps(data)
+
+
+async def chat_stream(request):
+    query = request.query_params.get("query", "").strip()
+    if not query:
+        return StreamingResponse(iter([sse_event("error", {"message": "Please enter a medical question."})]),
+                                 media_type="text/event-stream")
+
+    trace = Trace() if request.query_params.get("waterfall", "").lower() in ("1", "true") else None
+    sid, cookie = conversation_id(request)
+
+    async def generate():
+        answer = StreamedAnswer(sid, query)
+        try:
+            async for event, data in stream_medical_query(query, trace):
+                entry = answer.update(event, data)
+                if entry:
+                    # The SQLite store blocks; keep it off the event loop
+                    await run_in_threadpool(conversations.append, *entry)
+                yield chat_stream_event(event, data)
+        except Exception as e:
+            print(f"Error streaming query: {e}")
+            yield sse_event("error", {"message": "I encountered an error while processing your query."})
+        finally:
+            entry = answer.entry()
+            if entry:
+                # Not awaited: the stream may be closing because the client went away
+                asyncio.get_running_loop().run_in_executor(None, conversations.append, *entry)
+
+    response = StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    if cookie is not None:
+        interface = flask_app.session_interface
+        response.set_cookie(
+            interface.get_cookie_name(flask_app), cookie,
+            path=interface.get_cookie_path(flask_app),
+            domain=interface.get_cookie_domain(flask_app),
+            secure=interface.get_cookie_secure(flask_app),
+            httponly=interface.get_cookie_httponly(flask_app),
+            samesite=(interface.get_cookie_samesite(flask_app) or "lax").lower(),
+        )
+    return response
+
+
+@asynccontextmanager
+async def lifespan(_):
+    yield
+    await close_async_client()
+
+
+app = Starlette(
+    routes=[
+        Route("/chat/stream", chat_stream),
+        Mount("/", WSGIMiddleware(flask_app)),
+    ],
+    lifespan=lifespan,
+)
@@ -0,0 +1,96 @@
+"""Compare the native offset chunker with langchain's RecursiveCharacterTextSplitter on the corpus.
+
+Usage: python benchmarks/bench_chunking.py [--data data] [--repeat 3] [--span-pages]
+
+The baseline needs langchain (pip install langchain==0.0.340); without it only the native chunker runs.
+"""
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.read_preprocess import DocumentProcessor
+from utils.chunk_data import TextChunker
+
+
+def legacy_chunker(chunk_size=2000, chunk_overlap=400):
+    # The previous splitter and chunk dicts, kept here as the baseline
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        separators=["\n\n", "\n", "Section ", "SECTION ", "Sec. ", "CHAPTER ", "Chapter ", ". ", " ", ""]
+    )
+
+    def chunk_documents(documents):
+        chunked_documents = []
+        for doc in documents:
+            metadata = doc.metadata
+            for i, chunk in enumerate(splitter.split_text(doc.page_content)):
+                chunked_documents.append({
+                    "id": f"{metadata['source']}_{metadata['page']}_{i}",
+                    "text": chunk,
+                    "source": metadata["source"],
+                    "page": metadata["page"],
+                    "chunk_id": i,
+                    **metadata
+                })
+        return chunked_documents
+
+    return chunk_documents
+
+
+def load_pages(data_folder):
+    processor = DocumentProcessor(data_folder)
+    pages = list(processor.get_all_documents())
+    if not pages:
+        sys.exit(f"No PDFs found in {data_folder}")
+    return pages
+
+
+def report(label, chunk_documents, pages, repeat):
+    best = None
+    chunks = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = chunk_documents(pages)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    # Peak memory of one run, including the chunk records it returns
+    del chunks
+    tracemalloc.start()
+    chunks = chunk_documents(pages)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    chars = sum(len(page.page_content) for page in pages)
+    sizes = [len(chunk["text"]) for chunk in chunks]
+    print(f"{label:<26} {len(chunks):>7} chunks  avg {sum(sizes) / len(sizes):6.0f} chars  "
+          f"{best:6.2f}s  {chars / best / 1e6:6.1f} MB/s  peak {peak / 1e6:7.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data", default="data")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--span-pages", action="store_true", help="Also time chunks that cross page breaks")
+    args = parser.parse_args()
+
+    pages = load_pages(args.data)
+    print(f"{len(pages)} pages, {sum(len(page.page_content) for page in pages) / 1e6:.1f}M characters\n")
+
+    try:
+        report("langchain splitter", legacy_chunker(), pages, args.repeat)
+    except ImportError:
+        print("langchain not installed, skipping the baseline")
+    report("native", TextChunker().chunk_documents, pages, args.repeat)
+    if args.span_pages:
+        report("native, across pages", TextChunker(span_pages=True).chunk_documents, pages, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
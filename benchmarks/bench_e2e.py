@@ -0,0 +1,326 @@
+"""End-to-end benchmark of ingestion and question answering with local stand-ins for every upstream.
+
+Qdrant runs in-memory, and Cohere, Groq and Tavily are replaced by fakes (benchmarks/fakes.py) with
+configurable latency distributions and error rates. Ingestion runs on the bundled PDF, then the Flask
+app is driven at the target concurrency. The report covers throughput and p50/p95/p99 per stage.
+
+Usage: python benchmarks/bench_e2e.py [--concurrency 8] [--requests 100] [--ingest-pages 200]
+       [--save results.json] [--baseline results.json --tolerance 0.25]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import FakeCohereClient, FakeGroqClient, FakeTavilyClient, Upstream
+
+QUESTIONS = [
+    "What is the treatment for malaria?",
+    "How is hypertension managed in adults?",
+    "What are the symptoms of tuberculosis?",
+    "How should acute diarrhoea in children be treated?",
+    "What is the first-line treatment for asthma?",
+    "How is diabetes mellitus diagnosed?",
+    "What antibiotics are used for pneumonia?",
+    "How is anaemia in pregnancy managed?",
+    "What is the management of snake bite?",
+    "How are urinary tract infections treated?",
+]
+
+# Topics the guidelines hardly cover: thin retrieval, a single web result and a critic asking for more
+NICHE_QUESTIONS = [
+    "Which wearable devices detect atrial fibrillation?",
+    "What is the recovery time after LASIK eye surgery?",
+    "How effective is CAR-T cell therapy for lymphoma?",
+    "What are the latest gene therapies for sickle cell disease?",
+    "Is semaglutide approved for adolescent obesity?",
+]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def summarize(samples):
+    return {
+        "count": len(samples),
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        "p99": percentile(samples, 99),
+    }
+
+
+def configure_environment(workdir, args):
+    #Everything the app reads at import time: dummy keys, throwaway caches, no real quota
+    os.environ.update({
+        "GROQ_API_KEY": "offline", "TAVILY_API_KEY": "offline", "COHERE_API_KEY": "offline",
+        "VECTOR_BACKEND": "qdrant",
+        "QDRANT_URL": ":memory:",
+        "QDRANT_COLLECTION_NAME": "Benchmark",
+        "EMBEDDING_CACHE_DIR": os.path.join(workdir, "embeddings"),
+        "INGEST_MANIFEST_PATH": os.path.join(workdir, "manifest.json"),
+        "LEXICAL_INDEX_DIR": os.path.join(workdir, "bm25"),
+        "CHUNK_STORE_DIR": os.path.join(workdir, "chunks"),
+        "COHERE_EMBED_RPM": "1000000",
+        "ANSWER_CACHE": "true" if args.answer_cache else "false",
+        "CRITIC_MODE": args.critic_mode,
+        "SPECULATIVE_FOLLOW_UP": "true" if args.speculative_follow_up else "false",
+    })
+
+
+def install_fakes(app_module, args):
+    upstreams = {
+        "cohere": Upstream(args.embed_latency, args.error_rate),
+        "groq": Upstream(args.llm_latency, args.error_rate),
+        "tavily": Upstream(args.search_latency, args.error_rate),
+    }
+    # With a follow-up rate, that share of the questions is niche, and those are the ones the critic sends back
+    niche_topics = [question.rstrip("?").casefold() for question in NICHE_QUESTIONS] if args.follow_up_rate else []
+    app_module.vector_db.embedding_manager.client = FakeCohereClient(upstreams["cohere"])
+    groq = FakeGroqClient(upstreams["groq"], args.token_latency, args.answer_tokens, args.follow_up_rate, niche_topics)
+    app_module.llm_agent.client = groq
+    app_module.critic_agent.client = groq
+    app_module.web_scraper.client = FakeTavilyClient(upstreams["tavily"], niche_topics)
+    return upstreams
+
+
+def bench_ingestion(app_module, args):
+    from ingest import build_ingestor
+    ingestor = build_ingestor(app_module.vector_db, app_module.lexical_index)
+    processor = ingestor.doc_processor
+    processor.pdf_files = [args.pdf]
+    if args.ingest_pages:
+        full_iter = processor.iter_pdf_pages
+        processor.iter_pdf_pages = lambda pdf_file: islice(full_iter(pdf_file), args.ingest_pages)
+
+    start = time.perf_counter()
+    stats = ingestor.sync()
+    wall = time.perf_counter() - start
+    pipeline = ingestor.pipeline_stats or {}
+    return {
+        "pages": pipeline.get("pages", 0),
+        "chunks": pipeline.get("chunks", 0),
+        "failed_pages": stats["failed_pages"],
+        "seconds": wall,
+        "pages_per_second": pipeline.get("pages", 0) / wall if wall else 0.0,
+        "chunks_per_second": pipeline.get("chunks", 0) / wall if wall else 0.0,
+        "stage_seconds": pipeline.get("stage_seconds", {}),
+        "points": app_module.vector_db.get_collection_count(),
+    }
+
+
+def ask(client, query):
+    #Streams one question; returns (time to first token, time to done, error)
+    start = time.perf_counter()
+    first_token = done = None
+    response = client.get("/chat/stream", query_string={"query": query}, buffered=False)
+    try:
+        for chunk in response.response:
+            text = chunk.decode("utf-8") if isinstance(chunk, bytes) else chunk
+            if first_token is None and "event: token" in text:
+                first_token = time.perf_counter() - start
+            if "event: error" in text:
+                return first_token, None, True
+            if done is None and "event: done" in text:
+                done = time.perf_counter() - start
+    finally:
+        response.close()
+    return first_token, done, done is None
+
+
+def bench_queries(app_module, args):
+    from utils.metrics import add_span_listener
+
+    stage_samples = defaultdict(list)
+    stage_errors = defaultdict(int)
+    context_tokens = {"packed": 0, "baseline": 0, "prompts": 0}
+    lock = threading.Lock()
+
+    def record(stage, seconds, attrs, error):
+        with lock:
+            stage_samples[stage].append(seconds)
+            if error:
+                stage_errors[stage] += 1
+            if stage == "context_packing" and "context_tokens" in attrs:
+                context_tokens["packed"] += attrs["context_tokens"]
+                context_tokens["baseline"] += attrs["baseline_tokens"]
+                context_tokens["prompts"] += 1
+
+    add_span_listener(record)
+
+    local = threading.local()
+    first_tokens, latencies, errors = [], [], 0
+
+    def worker(index):
+        nonlocal errors
+        if not hasattr(local, "client"):
+            local.client = app_module.app.test_client()
+        niche = args.follow_up_rate and random.Random(args.seed * 100003 + index).random() < args.follow_up_rate
+        questions = NICHE_QUESTIONS if niche else QUESTIONS
+        query = questions[index % len(questions)]
+        if not args.answer_cache:
+            query = f"{query} (case {index})"
+        first_token, done, failed = ask(local.client, query)
+        with lock:
+            if failed:
+                errors += 1
+            else:
+                first_tokens.append(first_token or done)
+                latencies.append(done)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(worker, range(args.requests)))
+    wall = time.perf_counter() - start
+
+    # Deferred critiques may still be running; give them a moment to land in the stage samples
+    app_module.critic_executor.shutdown(wait=True)
+
+    return {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "speculative_follow_up": app_module.critic_agent.stats.snapshot()["speculative_follow_up"],
+        "context_tokens": context_tokens,
+        "errors": errors,
+        "error_rate": errors / args.requests if args.requests else 0.0,
+        "seconds": wall,
+        "throughput": len(latencies) / wall if wall else 0.0,
+        "time_to_first_token": summarize(first_tokens),
+        "latency": summarize(latencies),
+        "stages": {
+            stage: {**summarize(samples), "errors": stage_errors[stage]}
+            for stage, samples in sorted(stage_samples.items())
+        },
+    }
+
+
+def report(results):
+    ingestion = results.get("ingestion")
+    if ingestion:
+        stage = ingestion["stage_seconds"]
+        print(f"\nIngestion: {ingestion['pages']} pages, {ingestion['chunks']} chunks, {ingestion['points']} points "
+              f"in {ingestion['seconds']:.1f}s ({ingestion['pages_per_second']:.1f} pages/s, "
+              f"{ingestion['chunks_per_second']:.1f} chunks/s, {ingestion['failed_pages']} failed)")
+        print("  stage busy time: " + ", ".join(f"{name} {seconds:.1f}s" for name, seconds in stage.items()))
+
+    queries = results.get("queries")
+    if queries:
+        print(f"\nQueries: {queries['requests']} at concurrency {queries['concurrency']}, "
+              f"{queries['throughput']:.2f} req/s, {queries['errors']} errors ({queries['error_rate']:.1%})")
+        print(f"  {'stage':<22}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        rows = [("time_to_first_token", {**queries["time_to_first_token"], "errors": 0}),
+                ("end_to_end", {**queries["latency"], "errors": queries["errors"]})]
+        rows += list(queries["stages"].items())
+        for name, row in rows:
+            print(f"  {name:<22}{row['count']:>7}{row['errors']:>8}"
+                  f"{row['p50'] * 1000:>10.1f}{row['p95'] * 1000:>10.1f}{row['p99'] * 1000:>10.1f}")
+        context = queries.get("context_tokens")
+        if context and context["prompts"]:
+            print(f"  prompt context: {context['packed'] / context['prompts']:.0f} tokens per prompt, "
+                  f"{context['baseline'] / context['prompts']:.0f} with fixed truncation "
+                  f"({1 - context['packed'] / (context['baseline'] or 1):.0%} saved)")
+        speculation = queries["speculative_follow_up"]
+        if speculation["started"] or speculation["missed"]:
+            print(f"  speculative follow-up searches: {speculation['started']} started, {speculation['used']} used, "
+                  f"{speculation['wasted']} wasted, {speculation['missed']} missed, "
+                  f"{speculation['saved_seconds']:.1f}s of waiting saved")
+
+
+def regressions(results, baseline, tolerance):
+    #p95 latencies that grew, or throughputs that shrank, by more than the tolerance
+    found = []
+    for section, key in (("ingestion", "pages_per_second"), ("queries", "throughput")):
+        old, new = baseline.get(section, {}).get(key), results.get(section, {}).get(key)
+        if old and new is not None and new < old * (1 - tolerance):
+            found.append(f"{section} {key}: {old:.2f} -> {new:.2f}")
+
+    old_queries, new_queries = baseline.get("queries", {}), results.get("queries", {})
+    pairs = [("end_to_end", old_queries.get("latency"), new_queries.get("latency")),
+             ("time_to_first_token", old_queries.get("time_to_first_token"), new_queries.get("time_to_first_token"))]
+    pairs += [(stage, old_queries.get("stages", {}).get(stage), row)
+              for stage, row in new_queries.get("stages", {}).items()]
+    for name, old, new in pairs:
+        if old and new and old["p95"] and new["p95"] > old["p95"] * (1 + tolerance):
+            found.append(f"{name} p95: {old['p95'] * 1000:.1f}ms -> {new['p95'] * 1000:.1f}ms")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pdf", default="Standard_Treatment_Guidelines.pdf", help="PDF in data/ to ingest")
+    parser.add_argument("--ingest-pages", type=int, default=0, help="Only ingest the first N pages (0 = all)")
+    parser.add_argument("--skip-ingest", action="store_true")
+    parser.add_argument("--skip-queries", action="store_true")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--embed-latency", default="lognormal:40:0.4", help="Cohere embed call latency")
+    parser.add_argument("--search-latency", default="lognormal:800:0.5", help="Tavily search latency")
+    parser.add_argument("--llm-latency", default="lognormal:250:0.4", help="Groq time to first token")
+    parser.add_argument("--token-latency", default="fixed:4", help="Groq time per generated token")
+    parser.add_argument("--answer-tokens", type=int, default=120)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of upstream calls that fail")
+    parser.add_argument("--critic-mode", choices=("deferred", "inline"), default="deferred")
+    parser.add_argument("--answer-cache", action="store_true", help="Keep the semantic answer cache on")
+    parser.add_argument("--speculative-follow-up", action="store_true",
+                        help="Start the critic's follow-up search alongside generation when it is predicted")
+    parser.add_argument("--follow-up-rate", type=float,
+                        help="Share of questions on niche topics, where the critic asks for more information")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="Write the results as JSON")
+    parser.add_argument("--baseline", help="Results JSON to compare against; exits 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    os.chdir(ROOT)
+    workdir = tempfile.mkdtemp(prefix="medbot-bench-")
+    configure_environment(workdir, args)
+
+    import app as app_module
+    upstreams = install_fakes(app_module, args)
+
+    results = {"config": vars(args)}
+    if not args.skip_ingest:
+        results["ingestion"] = bench_ingestion(app_module, args)
+    if not args.skip_queries:
+        if app_module.vector_db.get_collection_count() == 0:
+            app_module.vector_db.create_collection()
+        results["queries"] = bench_queries(app_module, args)
+    results["upstream_calls"] = {name: {"calls": u.calls, "errors": u.errors} for name, u in upstreams.items()}
+
+    report(results)
+    print("\nUpstream calls: " + ", ".join(
+        f"{name} {row['calls']} ({row['errors']} failed)" for name, row in results["upstream_calls"].items()
+    ))
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        if found:
+            print(f"\nRegressions beyond {args.tolerance:.0%}:")
+            for line in found:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Report PDF extraction throughput (pages/second) for the serial and process-pool modes.
+
+Usage: python benchmarks/bench_extraction.py [--pdf data/Standard_Treatment_Guidelines.pdf] [--workers 4]
+"""
+import os
+import re
+import sys
+import time
+import argparse
+
+import fitz
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.read_preprocess import DocumentProcessor
+
+
+def legacy_clean_text(text):
+    # The previous seven-pass cleaner, kept here as the baseline
+    text = re.sub(r'\s+', ' ', text).strip()
+    text = re.sub(r'\bPage\s*\d+\b', '', text, flags=re.IGNORECASE)
+    text = re.sub(r'\b\d+\s*/\s*\d+\b', '', text)
+    text = re.sub(r'\f', ' ', text)
+    text = re.sub(r'\.{3,}', '...', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def run_legacy(pdf_path):
+    pages = 0
+    doc = fitz.open(pdf_path)
+    for page_num in range(len(doc)):
+        text = doc.load_page(page_num).get_text()
+        if text.strip() and legacy_clean_text(text):
+            pages += 1
+    doc.close()
+    return pages
+
+
+def run_processor(pdf_path, workers):
+    processor = DocumentProcessor(os.path.dirname(pdf_path), workers=workers)
+    return sum(1 for _ in processor.iter_pdf_pages(os.path.basename(pdf_path)))
+
+
+def report(label, fn, repeat):
+    best = None
+    pages = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        pages = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<28} {pages:>6} pages  {best:7.2f}s  {pages / best:8.1f} pages/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pdf", default=os.path.join("data", "Standard_Treatment_Guidelines.pdf"))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    report("legacy (7 passes, serial)", lambda: run_legacy(args.pdf), args.repeat)
+    report("fused, 1 worker", lambda: run_processor(args.pdf, 1), args.repeat)
+    report(f"fused, {args.workers} workers", lambda: run_processor(args.pdf, args.workers), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Compare chat history in the signed session cookie with the server-side conversation stores.
+
+Each simulated request adds one exchange with a full-length answer (about 1200 tokens, taken
+from the bundled PDF's pages) to a history capped at --entries, then reads the sidebar history.
+
+Usage: python benchmarks/bench_history.py [--requests 200] [--entries 20] [--pdf Standard_Treatment_Guidelines.pdf]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+from itertools import islice
+from datetime import datetime
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.read_preprocess import DocumentProcessor
+from utils.conversation_store import MemoryConversationStore, SQLiteConversationStore
+
+
+def sample_answers(pdf, count, chars=4800):
+    pages = [page.page_content for page in islice(DocumentProcessor().iter_pdf_pages(pdf), 300)]
+    pages = [text for text in pages if len(text) > chars // 2]
+    return [pages[i % len(pages)][:chars] for i in range(count)]
+
+
+def bench_cookie(answers, entries):
+    #The old scheme: every request decodes the cookie, appends, trims and re-signs it
+    app = Flask(__name__)
+    app.secret_key = "bench"
+    serializer = app.session_interface.get_signing_serializer(app)
+    cookie = serializer.dumps({})
+    started = time.perf_counter()
+    for i, answer in enumerate(answers):
+        session = serializer.loads(cookie)
+        history = session.get("chat_history", [])
+        history.append({"query": f"question {i}", "response": answer, "score": 8,
+                        "timestamp": datetime.now().strftime("%H:%M:%S")})
+        session["chat_history"] = history[-entries:]
+        cookie = serializer.dumps(session)
+    return (time.perf_counter() - started) * 1000 / len(answers), len(cookie), serializer
+
+
+def bench_store(store, answers, serializer):
+    cookie = serializer.dumps({"sid": "0123456789abcdefghijkl"})
+    started = time.perf_counter()
+    for i, answer in enumerate(answers):
+        session = serializer.loads(cookie)
+        store.append(session["sid"], f"question {i}", answer, 8)
+        store.history(session["sid"], limit=15)
+    return (time.perf_counter() - started) * 1000 / len(answers), len(cookie)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--entries", type=int, default=20)
+    parser.add_argument("--pdf", default="Standard_Treatment_Guidelines.pdf")
+    args = parser.parse_args()
+
+    answers = sample_answers(args.pdf, args.requests)
+    cookie_ms, cookie_bytes, serializer = bench_cookie(answers, args.entries)
+    print(f"{'cookie':<8} {cookie_bytes:>8} B cookie  {cookie_ms:6.2f} ms/request  "
+          f"(browsers drop cookies over 4096 B)")
+
+    workdir = tempfile.mkdtemp(prefix="medbot-history-")
+    stores = {
+        "memory": MemoryConversationStore(max_entries=args.entries),
+        "sqlite": SQLiteConversationStore(os.path.join(workdir, "conversations.sqlite3"), max_entries=args.entries),
+    }
+    for name, store in stores.items():
+        ms, size = bench_store(store, answers, serializer)
+        stats = store.stats()
+        extra = (f"compression {stats['compression_ratio']:.1f}x" if "compression_ratio" in stats
+                 else f"{stats['stored_bytes'] / 1024:.0f} KB stored")
+        print(f"{name:<8} {size:>8} B cookie  {ms:6.2f} ms/request  {stats['entries']} entries kept, {extra}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Check every Qdrant collection profile: creation, filtered search, recall@k and vector memory.
+
+Runs against Qdrant's local mode by default, so no server is needed; pass --url to measure a real
+Qdrant, where quantization and the HNSW settings take effect (local mode searches exactly).
+
+Usage: python benchmarks/bench_profiles.py [--points 20000] [--queries 200] [--url http://localhost:6333]
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.collection_profiles import COLLECTION_PROFILES
+
+
+def make_corpus(points, dim, sources, rng):
+    #Clustered unit vectors, like chunk embeddings, with source/page payloads
+    centers = rng.standard_normal((max(8, points // 200), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), points)] + 0.35 * rng.standard_normal((points, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    chunks = [
+        {"text": f"chunk {i}", "source": f"source_{i % sources}.pdf", "page": (i // sources) % 400, "chunk_id": i}
+        for i in range(points)
+    ]
+    return vectors, chunks
+
+
+def vector_ram_bytes(profile, points, dim):
+    #Vector bytes Qdrant keeps in RAM for this profile (HNSW graph and payloads excluded)
+    full = 0 if profile.vectors_on_disk else points * dim * 4
+    quantized = {"int8": points * dim, "binary": points * dim // 8}.get(profile.quantization, 0)
+    return full + quantized
+
+
+def run_profile(name, vectors, chunks, queries, limit, url):
+    os.environ["QDRANT_PROFILE"] = name
+    os.environ["QDRANT_COLLECTION_NAME"] = f"profile_{name}"
+    if url:
+        os.environ["QDRANT_URL"] = url
+    from utils.qdrant_db import VectorDatabase
+
+    vector_db = VectorDatabase()
+    vector_db.vector_size = vectors.shape[1]
+    vector_db.reset_collection()
+    vector_db.upsert_points(vector_db.build_points(chunks, vectors), batch_size=1000)
+
+    exact = np.argsort(-(queries @ vectors.T), axis=1)[:, :limit]
+    recall, started = 0.0, time.perf_counter()
+    for query, truth in zip(queries, exact):
+        hits = vector_db.search_by_vector(query, limit)
+        recall += len({hit["chunk_id"] for hit in hits} & set(truth.tolist())) / limit
+    latency_ms = (time.perf_counter() - started) * 1000 / len(queries)
+
+    # Filtered search has to return only matching points
+    source, page = chunks[0]["source"], chunks[0]["page"]
+    filtered = vector_db.search_by_vector(queries[0], limit, source=source, page=page)
+    assert filtered, f"{name}: filtered search returned nothing"
+    assert all(hit["source"] == source and hit["page"] == page for hit in filtered), f"{name}: filter ignored"
+
+    indexed = sorted(vector_db.client.get_collection(vector_db.collection_name).payload_schema)
+    print(f"{name:<10} recall@{limit} {recall / len(queries):5.3f}  {latency_ms:6.2f} ms/query  "
+          f"vector RAM {vector_ram_bytes(vector_db.profile, len(vectors), vectors.shape[1]) / 1e6:7.1f} MB  "
+          f"payload indexes {indexed or 'n/a (local mode)'}")
+    vector_db.client.delete_collection(vector_db.collection_name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--url", help="Qdrant server URL; local in-memory mode when omitted")
+    args = parser.parse_args()
+
+    os.environ.setdefault("COHERE_API_KEY", "offline")
+    os.environ["QDRANT_URL"] = ":memory:"
+    os.environ.pop("QDRANT_PATH", None)
+    os.environ["CHUNK_STORE"] = "false"  # Only the vectors are being measured
+
+    rng = np.random.default_rng(0)
+    vectors, chunks = make_corpus(args.points, args.dim, sources=4, rng=rng)
+    queries = vectors[rng.choice(len(vectors), args.queries, replace=False)]
+    queries = queries + 0.1 * rng.standard_normal(queries.shape).astype(np.float32)
+
+    print(f"{args.points} points, {args.dim} dimensions, {'Qdrant at ' + args.url if args.url else 'local mode'}\n")
+    for name in COLLECTION_PROFILES:
+        run_profile(name, vectors, chunks, queries, args.limit, args.url)
+
+
+if __name__ == "__main__":
+    main()
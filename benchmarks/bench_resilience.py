@@ -0,0 +1,90 @@
+"""Exercise the upstream call policies against the local Tavily stand-in: hedging, circuit breaking,
+request budgets and bounded concurrency. Each scenario runs WebScraper.search_web with and without
+the policy feature it tests.
+
+Usage: python benchmarks/bench_resilience.py [--searches 200] [--concurrency 8]
+"""
+import io
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fakes import FakeTavilyClient, Upstream
+from bench_e2e import summarize
+from utils.resilience import UpstreamPolicy, set_budget
+from utils.tavily import WebScraper
+
+
+def run(policy, upstream, searches, concurrency, budget=None):
+    #search_web over distinct queries (no cache hits); returns latency summary, empty results and upstream calls
+    scraper = WebScraper()
+    scraper.client = FakeTavilyClient(upstream)
+    scraper.policy = policy
+    latencies, empty = [], 0
+    lock = threading.Lock()
+    peak_waiting = 0
+
+    def search(index):
+        nonlocal empty, peak_waiting
+        set_budget(budget)
+        started = time.perf_counter()
+        results = scraper.search_web(f"question {index} {random.random()}")
+        with lock:
+            latencies.append(time.perf_counter() - started)
+            empty += not results
+            peak_waiting = max(peak_waiting, policy.waiting)
+
+    # The scraper logs every failed search; only the summary is of interest here
+    with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(search, range(searches)))
+    while policy.in_flight:  # Abandoned calls still count once they reach the upstream
+        time.sleep(0.05)
+    return summarize(latencies), empty, upstream.calls, peak_waiting
+
+
+def report(label, outcome, policy):
+    latency, empty, calls, peak_waiting = outcome
+    print(f"  {label:<24} p50 {latency['p50'] * 1000:7.0f} ms  p95 {latency['p95'] * 1000:7.0f} ms  "
+          f"p99 {latency['p99'] * 1000:7.0f} ms  {empty:>4} empty  {calls:>4} upstream calls  "
+          f"hedges {policy.hedges} (won {policy.hedge_wins})  circuit opened {policy.breaker.opened}x  "
+          f"peak queue {peak_waiting}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--searches", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    os.environ.setdefault("TAVILY_API_KEY", "offline")
+    n, c = args.searches, args.concurrency
+
+    print("Tail latency: lognormal 300 ms median, sigma 0.9")
+    for label, hedge_after in (("no hedging", 0.0), ("hedge after 600 ms", 0.6)):
+        policy = UpstreamPolicy("tavily", timeout=30.0, hedge_after=hedge_after)
+        report(label, run(policy, Upstream("lognormal:300:0.9"), n, c), policy)
+
+    print("\nOutage: every call fails after 800 ms")
+    for label, failures in (("no circuit breaker", 10 ** 9), ("breaker after 5 failures", 5)):
+        policy = UpstreamPolicy("tavily", timeout=30.0, failure_threshold=failures, reset_timeout=60.0)
+        report(label, run(policy, Upstream("fixed:800", error_rate=1.0), n // 2, c), policy)
+
+    print("\nStall: calls hang for 5 s")
+    for label, budget in (("no request budget", None), ("2 s request budget", 2.0)):
+        policy = UpstreamPolicy("tavily", timeout=30.0, failure_threshold=10 ** 9)
+        report(label, run(policy, Upstream("fixed:5000"), c, c, budget), policy)
+
+    print(f"\nSaturation: 4 slots, {c * 4} concurrent callers, 500 ms calls, 1.2 s budget")
+    policy = UpstreamPolicy("tavily", timeout=30.0, max_concurrency=4, failure_threshold=10 ** 9)
+    report("bounded concurrency", run(policy, Upstream("fixed:500"), c * 8, c * 4, 1.2), policy)
+
+
+if __name__ == "__main__":
+    main()
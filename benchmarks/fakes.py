@@ -0,0 +1,179 @@
+"""Local stand-ins for the Cohere, Groq and Tavily clients, with configurable latency and error rates.
+
+Latency specs: "fixed:MS", "uniform:LO_MS:HI_MS" or "lognormal:MEDIAN_MS:SIGMA".
+"""
+import json
+import math
+import time
+import random
+import threading
+import zlib
+from types import SimpleNamespace
+
+import numpy as np
+
+TOKEN_SPLIT = str.maketrans({c: " " for c in ".,;:!?()[]\"'/\n\t"})
+
+
+class FakeUpstreamError(Exception):
+    """Injected failure; the app treats it like any other upstream error"""
+
+
+class Latency:
+    def __init__(self, spec: str):
+        kind, *params = spec.split(":")
+        self.kind = kind
+        self.params = [float(p) for p in params]
+        if kind not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+        self.spec = spec
+
+    def sample(self) -> float:
+        #Seconds
+        if self.kind == "fixed":
+            return self.params[0] / 1000
+        if self.kind == "uniform":
+            return random.uniform(self.params[0], self.params[1]) / 1000
+        median, sigma = self.params
+        return random.lognormvariate(math.log(median), sigma) / 1000
+
+    def wait(self):
+        time.sleep(self.sample())
+
+
+class Upstream:
+    """Latency and error injection shared by the fake clients; counts calls and failures"""
+
+    def __init__(self, latency: str, error_rate: float = 0.0):
+        self.latency = Latency(latency)
+        self.error_rate = error_rate
+        self.calls = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def call(self, name: str):
+        self.latency.wait()
+        with self._lock:
+            self.calls += 1
+            failed = random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        if failed:
+            raise FakeUpstreamError(f"injected {name} failure")
+
+
+def hashed_embedding(text: str, dim: int) -> list:
+    #Feature-hashed bag of words: texts sharing words get similar vectors, so retrieval stays meaningful
+    vector = np.zeros(dim, dtype=np.float32)
+    for token in text.lower().translate(TOKEN_SPLIT).split():
+        h = zlib.crc32(token.encode("utf-8"))
+        vector[h % dim] += 1.0 if (h >> 16) & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector + 1.0 / math.sqrt(dim)).tolist()
+
+
+class FakeCohereClient:
+    def __init__(self, upstream: Upstream, dim: int = 384):
+        self.upstream = upstream
+        self.dim = dim
+        self.api_key = "offline"
+
+    def embed(self, texts, model=None, input_type=None):
+        self.upstream.call("cohere")
+        return SimpleNamespace(embeddings=[hashed_embedding(text, self.dim) for text in texts])
+
+
+def mentions(text: str, topics) -> bool:
+    text = text.casefold()
+    return any(topic in text for topic in topics)
+
+
+class FakeTavilyClient:
+    """Niche topics (lower-case question texts) find a single result on the medical sites"""
+
+    def __init__(self, upstream: Upstream, niche_topics=()):
+        self.upstream = upstream
+        self.niche_topics = niche_topics
+        self.api_key = "offline"
+        self.base_url = "http://tavily.invalid/search"
+
+    def search(self, query, search_depth="basic", max_results=5, include_domains=None, **kwargs):
+        self.upstream.call("tavily")
+        if mentions(query, self.niche_topics):
+            max_results = min(max_results, 1)
+        domains = include_domains or ["example.org"]
+        return {"results": [
+            {
+                "title": f"Result {i + 1} for {query[:40]}",
+                "content": f"Overview of {query}. " * 20,
+                "url": f"https://{domains[i % len(domains)]}/article/{i}",
+                "score": round(0.9 - 0.1 * i, 2),
+            }
+            for i in range(max_results)
+        ]}
+
+
+class _FakeCompletions:
+    def __init__(self, upstream: Upstream, token_latency: Latency, answer_tokens: int, follow_up_rate=None,
+                 niche_topics=()):
+        self.upstream = upstream
+        self.token_latency = token_latency
+        self.answer_tokens = answer_tokens
+        self.follow_up_rate = follow_up_rate
+        self.niche_topics = niche_topics
+
+    def create(self, messages, model=None, max_tokens=None, temperature=None, stream=False):
+        self.upstream.call("groq")  # Time to first token
+        prompt = " ".join(message["content"] for message in messages)
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": 0}
+
+        if "medical response critic" in prompt:
+            if self.niche_topics:
+                # Like a real critic, ask for more on the questions the documents don't cover
+                needs_more_info = mentions(prompt.split("RESPONSE TO EVALUATE:")[0], self.niche_topics)
+                score = random.uniform(3.5, 5.5) if needs_more_info else random.uniform(6.5, 9.5)
+            elif self.follow_up_rate is None:
+                score, needs_more_info = random.uniform(5.5, 9.5), random.random() < 0.1
+            else:
+                # This share of critiques asks for a follow-up search and regeneration
+                needs_more_info = random.random() < self.follow_up_rate
+                score = random.uniform(3.5, 5.5) if needs_more_info else random.uniform(6.5, 9.5)
+            text = json.dumps({
+                "score": round(score, 1),
+                "reasoning": "Offline evaluation",
+                "needs_more_info": needs_more_info,
+                "suggestions": "",
+            })
+        else:
+            words = ["Offline", "answer", "about", "the", "condition,", "its", "treatment", "and", "care."]
+            text = " ".join(words[i % len(words)] for i in range(self.answer_tokens))
+            text += " Please consult a doctor for medical advice."
+        usage["completion_tokens"] = len(text.split())
+
+        if not stream:
+            for _ in range(usage["completion_tokens"]):
+                self.token_latency.wait()
+            return SimpleNamespace(
+                choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+                usage=SimpleNamespace(**usage),
+            )
+        return self._stream(text, usage)
+
+    def _stream(self, text, usage):
+        pieces = text.split(" ")
+        for i, piece in enumerate(pieces):
+            self.token_latency.wait()
+            last = i == len(pieces) - 1
+            yield SimpleNamespace(
+                choices=[SimpleNamespace(delta=SimpleNamespace(content=piece + ("" if last else " ")))],
+                usage=None,
+                x_groq={"usage": usage} if last else None,
+            )
+
+
+class FakeGroqClient:
+    def __init__(self, upstream: Upstream, token_latency: str = "fixed:5", answer_tokens: int = 120,
+                 follow_up_rate=None, niche_topics=()):
+        self.chat = SimpleNamespace(
+            completions=_FakeCompletions(upstream, Latency(token_latency), answer_tokens, follow_up_rate, niche_topics)
+        )
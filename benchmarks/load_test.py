@@ -0,0 +1,113 @@
+"""Load-test the streaming chat endpoint and compare the sync (Flask/gunicorn) and async (ASGI) modes.
+
+Start both servers against the same upstreams (disable ANSWER_CACHE for a fair comparison), e.g.
+    gunicorn -w 2 --threads 8 -b :5000 app:app
+    uvicorn asgi:app --port 8000
+then run:
+    python benchmarks/load_test.py --sync-url http://localhost:5000 --async-url http://localhost:8000 \
+        --concurrency 100 --requests 400
+"""
+import time
+import asyncio
+import argparse
+
+import httpx
+
+QUESTIONS = [
+    "What are the symptoms of dengue fever?",
+    "How is type 2 diabetes treated?",
+    "What causes migraine headaches?",
+    "How do I manage high blood pressure?",
+    "What are the early signs of asthma?",
+    "When should a fever be treated with antibiotics?",
+    "What is the first aid for a burn?",
+    "How is iron deficiency anaemia diagnosed?",
+]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+async def one_request(client, base_url, index):
+    #Returns (time to first token, total time) or raises on failure
+    query = f"{QUESTIONS[index % len(QUESTIONS)]} (case {index})"
+    start = time.perf_counter()
+    first_token = None
+    async with client.stream("GET", f"{base_url}/chat/stream", params={"query": query}) as response:
+        response.raise_for_status()
+        event = None
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[7:]
+                if event == "token" and first_token is None:
+                    first_token = time.perf_counter() - start
+                elif event == "error":
+                    raise RuntimeError("server reported an error")
+                elif event == "done":
+                    break
+    return first_token or 0.0, time.perf_counter() - start
+
+
+async def run(base_url, concurrency, total, timeout):
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    first_tokens, latencies, errors = [], [], 0
+
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        async def worker(index):
+            nonlocal errors
+            async with semaphore:
+                try:
+                    first_token, latency = await one_request(client, base_url, index)
+                    first_tokens.append(first_token)
+                    latencies.append(latency)
+                except Exception:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(total)))
+        wall = time.perf_counter() - start
+
+    return {
+        "ok": len(latencies),
+        "errors": errors,
+        "wall": wall,
+        "throughput": len(latencies) / wall if wall else 0.0,
+        "ttft": [percentile(first_tokens, p) for p in (50, 95, 99)],
+        "latency": [percentile(latencies, p) for p in (50, 95, 99)],
+    }
+
+
+def report(label, stats):
+    ttft, latency = stats["ttft"], stats["latency"]
+    print(
+        f"{label:<6} ok {stats['ok']:>5}  errors {stats['errors']:>4}  {stats['throughput']:7.2f} req/s  "
+        f"first token p50/p95/p99 {ttft[0]:5.2f}/{ttft[1]:5.2f}/{ttft[2]:5.2f}s  "
+        f"total p50/p95/p99 {latency[0]:5.2f}/{latency[1]:5.2f}/{latency[2]:5.2f}s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sync-url", help="Base URL of the Flask (WSGI) server")
+    parser.add_argument("--async-url", help="Base URL of the ASGI server")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    if not args.sync_url and not args.async_url:
+        parser.error("give --sync-url, --async-url or both")
+
+    print(f"{args.requests} requests, {args.concurrency} concurrent")
+    for label, url in (("sync", args.sync_url), ("async", args.async_url)):
+        if url:
+            report(label, asyncio.run(run(url.rstrip("/"), args.concurrency, args.requests, args.timeout)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Bring the vector collection, chunk store and lexical index in line with the PDFs in data/.
+
+Only added, changed or removed pages are processed. The web servers never ingest; run this
+after adding documents, then restart the workers so they load the new lexical index.
+
+Usage: python ingest.py [--reset] [--data data]
+"""
+import os
+import sys
+import argparse
+from dotenv import load_dotenv
+
+from utils.read_preprocess import DocumentProcessor
+from utils.chunk_data import TextChunker
+from utils.ingestion import IncrementalIngestor
+from utils.qdrant_db import create_vector_database
+from utils.hybrid_search import create_lexical_index
+
+
+def missing_environment():
+    #Required settings that are not set
+    required_keys = ["GROQ_API_KEY", "TAVILY_API_KEY", "COHERE_API_KEY"]
+    if os.getenv("VECTOR_BACKEND", "qdrant").lower() != "local":
+        required_keys = ["QDRANT_URL", "QDRANT_API_KEY"] + required_keys
+    return [k for k in required_keys if not os.getenv(k)]
+
+
+def build_ingestor(vector_db, lexical_index, data_folder: str = "data") -> IncrementalIngestor:
+    return IncrementalIngestor(DocumentProcessor(data_folder), TextChunker(), vector_db, lexical_index=lexical_index)
+
+
+def initialize_database(vector_db, lexical_index, data_folder: str = "data"):
+    try:
+        print("Checking database status...")
+
+        # Only added, changed or removed pages are processed; unchanged files are skipped
+        build_ingestor(vector_db, lexical_index, data_folder).sync()
+
+        final_count = vector_db.get_collection_count()
+        if final_count > 0:
+            print(f" Database ready with {final_count} documents")
+            return True
+        else:
+            print(" No documents stored in vector database")
+            return False
+
+    except Exception as e:
+        print(f" Database initialization error: {e}")
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data", default="data", help="Folder with the PDFs")
+    parser.add_argument("--reset", action="store_true", help="Drop the collection and ingest everything again")
+    args = parser.parse_args()
+
+    load_dotenv()
+    # Only the vector store and Cohere are needed to ingest
+    missing = [key for key in missing_environment() if key not in ("GROQ_API_KEY", "TAVILY_API_KEY")]
+    if missing:
+        print(f" Missing environment variables: {', '.join(missing)}")
+        return 1
+
+    vector_db = create_vector_database()
+    lexical_index = create_lexical_index(vector_db.collection_name)
+    if args.reset:
+        vector_db.reset_collection()
+        lexical_index.remove(list(lexical_index.docs))
+
+    return 0 if initialize_database(vector_db, lexical_index, args.data) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
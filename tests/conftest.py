@@ -0,0 +1,20 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# app.py reads its configuration at import time; the upstream clients are only built on first
+# use, so placeholder keys are enough as long as a test never reaches them
+_state = tempfile.mkdtemp(prefix="medbot-tests-")
+os.environ.update({
+    "GROQ_API_KEY": "test",
+    "COHERE_API_KEY": "test",
+    "TAVILY_API_KEY": "test",
+    "QDRANT_URL": ":memory:",
+    "CONVERSATION_STORE": "memory",
+    "CHUNK_STORE_DIR": _state,
+    "LEXICAL_INDEX_DIR": _state,
+    "EMBEDDING_CACHE_DIR": _state,
+})
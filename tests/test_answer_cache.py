@@ -0,0 +1,31 @@
+import numpy as np
+
+from utils.answer_cache import SemanticAnswerCache
+from utils.hybrid_search import exact_terms
+
+EMBEDDING = np.array([1.0, 0.0], dtype=np.float32)
+
+
+def answer(query):
+    return {"query": query, "final_response": f"About {query}", "critic_score": 9, "processing_time": 1.0}
+
+
+def test_hit_needs_the_same_numbers_and_units():
+    cache = SemanticAnswerCache(key_terms=exact_terms)
+    cache.store(EMBEDDING, answer("Metformin 500 mg dose for adults"))
+
+    assert cache.lookup(EMBEDDING, "metformin 850 mg dose for adults") is None
+    assert cache.lookup(EMBEDDING, "Metformin 500 mcg dose for adults") is None
+    result, _ = cache.lookup(EMBEDDING, "What is the metformin 500 mg dose for adults?")
+    assert result["query"] == "Metformin 500 mg dose for adults"
+    assert cache.stats()["key_term_mismatches"] == 2
+
+
+def test_closest_matching_question_is_served():
+    cache = SemanticAnswerCache(key_terms=exact_terms)
+    cache.store(EMBEDDING, answer("Paracetamol 1 g every 6 hours"))
+    cache.store(np.array([0.96, 0.28], dtype=np.float32), answer("Paracetamol 500 mg every 6 hours"))
+
+    result, similarity = cache.lookup(EMBEDDING, "paracetamol 500 mg every 6 hours")
+    assert result["query"] == "Paracetamol 500 mg every 6 hours"
+    assert similarity < 1.0
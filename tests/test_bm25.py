@@ -0,0 +1,59 @@
+import json
+import os
+from types import SimpleNamespace
+
+from utils.bm25 import BM25Index
+from utils.hybrid_search import HybridRetriever
+
+CHUNKS = {
+    "a": {"text": "Metformin 500mg twice daily for type 2 diabetes.", "source": "diabetes.pdf", "page": 1, "chunk_id": 0},
+    "b": {"text": "Asthma inhalers open the airways.", "source": "asthma.pdf", "page": 3, "chunk_id": 0},
+    "c": {"text": "Diabetes diet: fibre, vegetables and less sugar.", "source": "diabetes.pdf", "page": 2, "chunk_id": 1},
+}
+
+
+def ranking(index, query):
+    return [(point_id, round(score, 5), matched) for point_id, _, score, matched in index.search(query)]
+
+
+def test_index_keeps_no_text_and_rebuilds_from_its_postings(tmp_path):
+    index = BM25Index(str(tmp_path / "bm25"))
+    for point_id, chunk in CHUNKS.items():
+        index.add(point_id, chunk)
+    index.build()
+    index.save()
+
+    with open(os.path.join(index.path, "docs.jsonl"), encoding="utf-8") as f:
+        assert all("text" not in json.loads(line) for line in f)
+
+    # A later ingest run removes one chunk and adds another to the reloaded index
+    reloaded = BM25Index(index.path)
+    reloaded.remove(["b"])
+    reloaded.add("d", {"text": "Insulin for type 1 diabetes.", "source": "diabetes.pdf", "page": 4, "chunk_id": 0})
+    reloaded.build()
+
+    fresh = BM25Index(str(tmp_path / "fresh"))
+    for point_id in ("a", "c"):
+        fresh.add(point_id, CHUNKS[point_id])
+    fresh.add("d", {"text": "Insulin for type 1 diabetes.", "source": "diabetes.pdf", "page": 4, "chunk_id": 0})
+    fresh.build()
+
+    for query in ("diabetes diet", "metformin 500mg", "asthma inhalers"):
+        assert ranking(reloaded, query) == ranking(fresh, query)
+    assert ranking(reloaded, "metformin 500mg")[0][2] == ["metformin", "500mg"]
+    assert reloaded.document_fraction("asthma") == 1.0  # Gone with its only chunk
+
+
+def test_lexical_hits_take_their_text_from_the_vector_database(tmp_path):
+    index = BM25Index(str(tmp_path / "bm25"))
+    for point_id, chunk in CHUNKS.items():
+        index.add(point_id, chunk)
+    index.build()
+    # Chunk "c" was deleted from the store since the index was built
+    texts = {point_id: chunk["text"] for point_id, chunk in CHUNKS.items() if point_id != "c"}
+    vector_db = SimpleNamespace(get_texts=lambda point_ids: [texts.get(point_id) for point_id in point_ids])
+
+    results, _ = HybridRetriever(vector_db, index)._lexical_results("diabetes", limit=5)
+
+    assert [result["text"] for result in results] == [CHUNKS["a"]["text"]]
+    assert results[0]["lexical_score"] == 1.0
@@ -0,0 +1,68 @@
+import os
+from types import SimpleNamespace
+
+from utils.chunk_store import ChunkStore
+from utils.qdrant_db import VectorDatabase
+
+
+def test_chunk_store_on_empty_directory(tmp_path):
+    path = str(tmp_path / "chunks")
+    store = ChunkStore(path)
+
+    assert store.get_many(["a"]) == [None]
+    assert store.stats()["chunks"] == 0
+    # Deleting from a store that was never written must neither fail nor create files
+    store.delete(["a"])
+    store.delete_where("guide.pdf")
+    store.compact()
+    assert not os.path.exists(store.meta_path)
+
+    store.put_many(["a", "b"], ["first chunk", "second chunk"], ["guide.pdf", "other.pdf"])
+    store.delete_where("other.pdf")
+    assert ChunkStore(path).get_many(["a", "b"]) == ["first chunk", None]
+
+
+def test_chunk_store_reader_leaves_torn_tail_to_writer(tmp_path):
+    path = str(tmp_path / "chunks")
+    writer = ChunkStore(path)
+    writer.put_many(["a"], ["first chunk"], ["guide.pdf"])
+    size = os.path.getsize(writer.blocks_path)
+    with open(writer.blocks_path, "ab") as f:
+        f.write(b"half a block")
+
+    reader = ChunkStore(path)
+    assert reader.get_many(["a"]) == ["first chunk"]
+    assert os.path.getsize(writer.blocks_path) == size + len(b"half a block")
+
+    writer.put_many(["b"], ["second chunk"], ["guide.pdf"])
+    assert ChunkStore(path).get_many(["a", "b"]) == ["first chunk", "second chunk"]
+
+
+def test_reader_sees_chunks_written_after_it_loaded(tmp_path):
+    path = str(tmp_path / "chunks")
+    writer = ChunkStore(path)
+    writer.put_many(["a", "b"], ["first chunk", "second chunk"], ["guide.pdf", "other.pdf"])
+    reader = ChunkStore(path)
+    assert reader.get_many(["a"]) == ["first chunk"]
+
+    writer.put_many(["c"], ["third chunk"], ["guide.pdf"])
+    assert reader.get_many(["c"]) == ["third chunk"]
+
+    writer.delete_where("other.pdf")
+    writer.compact()
+    assert reader.get_many(["a", "b", "c"]) == ["first chunk", None, "third chunk"]
+    assert len(reader) == 2
+
+
+def test_hits_without_text_are_dropped(tmp_path):
+    store = ChunkStore(str(tmp_path / "chunks"))
+    store.put_many(["a"], ["stored chunk"], ["guide.pdf"])
+    vector_db = SimpleNamespace(chunk_store=store, format_result=VectorDatabase.format_result)
+    hits = [
+        ("a", 0.9, {"source": "guide.pdf"}),
+        ("b", 0.8, {"source": "guide.pdf", "text": "payload chunk"}),  # Ingested before the chunk store
+        ("c", 0.7, {"source": "guide.pdf"}),  # Not in the store this worker loaded
+    ]
+
+    results = VectorDatabase.format_results(vector_db, hits)
+    assert [result["text"] for result in results] == ["stored chunk", "payload chunk"]
@@ -0,0 +1,26 @@
+import pytest
+
+from utils.critic_agent import CriticAgent
+
+
+@pytest.fixture
+def critic(monkeypatch):
+    monkeypatch.setenv("SPECULATIVE_FOLLOW_UP", "true")
+    return CriticAgent()
+
+
+def test_follow_up_needs_weak_documents_and_few_web_results(critic):
+    weak, strong = [{"score": 0.2, "retrieval": "dense"}], [{"score": 0.8, "retrieval": "dense"}]
+    assert critic.predicts_follow_up(weak, [])
+    assert not critic.predicts_follow_up(weak, [{}, {}, {}])
+    assert not critic.predicts_follow_up(strong, [])
+
+
+def test_lexical_hits_are_judged_by_their_bm25_score(critic):
+    # Exact-term queries return lexical hits only; their cosine score is 0 by design
+    lexical = [{"score": 0.0, "lexical_score": 1.0, "retrieval": "lexical"}]
+    assert not critic.predicts_follow_up(lexical, [])
+
+    # In a fused list, the dense hits carry the cosine that decides
+    fused = [{"score": 0.0, "lexical_score": 1.0, "retrieval": "lexical"}, {"score": 0.2, "retrieval": "dense"}]
+    assert critic.predicts_follow_up(fused, [])
@@ -0,0 +1,96 @@
+import pytest
+
+import app as flask_module
+
+
+def answer(query, trace=None):
+    yield "token", "Rest and fluids."
+    yield "done", {
+        "query": query,
+        "final_response": "Rest and fluids.",
+        "critic_score": 8,
+        "critic_source": "local",
+        "processing_time": 0.1,
+        "time_to_first_token": 0.05,
+        "timed_out_sources": [],
+        "cache_hit": False,
+    }
+
+
+def regenerated_answer(query, trace=None):
+    #Deferred critique: "done" carries no score, then the critic asks for a better answer
+    yield "token", "Rest."
+    yield "done", {
+        "query": query,
+        "final_response": "Rest.",
+        "critic_score": None,
+        "critic_source": "pending",
+        "processing_time": 0.1,
+        "time_to_first_token": 0.05,
+        "timed_out_sources": [],
+        "cache_hit": False,
+    }
+    yield "replace", "Rest, fluids and paracetamol for the fever."
+    yield "critique", {"critic_score": 4, "needs_more_info": True, "regenerated": True}
+
+
+def asynchronous(pipeline):
+    async def stream(query, trace=None):
+        for event, data in pipeline(query, trace):
+            yield event, data
+    return stream
+
+
+def test_flask_stream_records_history(monkeypatch):
+    monkeypatch.setattr(flask_module, "stream_medical_query", answer)
+    client = flask_module.app.test_client()
+
+    for query in ("fever", "cough"):
+        body = client.get("/chat/stream", query_string={"query": query}).get_data(as_text=True)
+        assert "event: done" in body
+
+    entries = client.get("/history").get_json()["entries"]
+    assert [entry["query"] for entry in entries] == ["cough", "fever"]
+
+
+def test_flask_stream_records_deferred_critique(monkeypatch):
+    monkeypatch.setattr(flask_module, "stream_medical_query", regenerated_answer)
+    client = flask_module.app.test_client()
+
+    client.get("/chat/stream", query_string={"query": "fever"}).get_data(as_text=True)
+
+    entries = client.get("/history").get_json()["entries"]
+    assert [(entry["response"], entry["score"]) for entry in entries] == [
+        ("Rest, fluids and paracetamol for the fever.", 4)
+    ]
+
+
+def test_asgi_stream_records_history(monkeypatch):
+    asgi = pytest.importorskip("asgi")
+    from starlette.testclient import TestClient
+
+    monkeypatch.setattr(asgi, "stream_medical_query", asynchronous(answer))
+    client = TestClient(asgi.app)
+
+    for query in ("headache", "nausea"):
+        response = client.get("/chat/stream", params={"query": query})
+        assert "event: done" in response.text
+
+    # The history is read through the Flask app, from the cookie the async route issued
+    entries = client.get("/history").json()["entries"]
+    assert [entry["query"] for entry in entries] == ["nausea", "headache"]
+
+
+def test_asgi_stream_records_deferred_critique(monkeypatch):
+    asgi = pytest.importorskip("asgi")
+    from starlette.testclient import TestClient
+
+    monkeypatch.setattr(asgi, "stream_medical_query", asynchronous(regenerated_answer))
+    client = TestClient(asgi.app)
+
+    client.get("/chat/stream", params={"query": "fever"})
+
+    entries = client.get("/history").json()["entries"]
+    assert [(entry["response"], entry["score"]) for entry in entries] == [
+        ("Rest, fluids and paracetamol for the fever.", 4)
+    ]
@@ -0,0 +1,83 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from utils.local_index import LocalVectorIndex
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_local_index_on_empty_directory(tmp_path):
+    path = str(tmp_path / "index")
+    index = LocalVectorIndex(path, dim=4)
+
+    assert not index.exists()
+    assert index.count() == 0
+    assert index.search([1, 0, 0, 0]) == []
+    index.delete(["a"])
+    index.delete_where("guide.pdf")
+    assert not index.exists()
+
+    index.create()
+    index.upsert(["a", "b"], np.eye(4, dtype=np.float32)[:2], [{"source": "guide.pdf"}, {"source": "other.pdf"}])
+    index.delete_where("other.pdf")
+    reopened = LocalVectorIndex(path, dim=4)
+    assert reopened.count() == 1
+    assert [hit[0] for hit in reopened.search([0, 1, 0, 0], limit=2)] == ["a"]
+
+
+def test_local_index_reader_does_not_truncate(tmp_path):
+    path = str(tmp_path / "index")
+    writer = LocalVectorIndex(path, dim=4)
+    writer.create()
+    writer.upsert(["a"], [[1, 0, 0, 0]], [{"source": "guide.pdf"}])
+    size = os.path.getsize(writer.vectors_path)
+    with open(writer.vectors_path, "ab") as f:
+        f.write(b"\0" * 8)
+
+    reader = LocalVectorIndex(path, dim=4)
+    assert reader.count() == 1
+    assert os.path.getsize(writer.vectors_path) == size + 8
+
+    writer.upsert(["b"], [[0, 1, 0, 0]], [{"source": "guide.pdf"}])
+    assert [hit[0] for hit in LocalVectorIndex(path, dim=4).search([0, 1, 0, 0], limit=1)] == ["b"]
+
+
+READER = """
+import sys
+from utils.local_index import LocalVectorIndex
+
+index = LocalVectorIndex(sys.argv[1], dim=4)
+for line in sys.stdin:
+    hits = index.search([float(value) for value in line.split()], limit=4)
+    print(" ".join(hit[0] for hit in hits), flush=True)
+"""
+
+
+def test_reader_survives_compaction_in_another_process(tmp_path):
+    path = str(tmp_path / "index")
+    writer = LocalVectorIndex(path, dim=4)
+    writer.create()
+    writer.upsert(["a", "b", "c"], np.eye(4, dtype=np.float32)[:3], [{"source": "guide.pdf"}] * 3)
+
+    reader = subprocess.Popen(
+        [sys.executable, "-c", READER, path], cwd=ROOT,
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+    )
+    try:
+        reader.stdin.write("1 0 0 0\n")
+        reader.stdin.flush()
+        assert reader.stdout.readline().split()[0] == "a"
+
+        # Compaction replaces the files the reader has mapped; it then picks up the new version
+        writer.delete(["a", "b"])
+        writer.compact()
+        writer.upsert(["d"], [[0, 0, 0, 1]], [{"source": "guide.pdf"}])
+        reader.stdin.write("0 0 0 1\n")
+        reader.stdin.flush()
+        assert reader.stdout.readline().split() == ["d", "c"]
+    finally:
+        reader.stdin.close()
+        assert reader.wait(timeout=10) == 0
@@ -0,0 +1,25 @@
+import app as flask_module
+from utils.metrics import Registry
+
+
+def test_counter_callback_renders_as_counter():
+    registry = Registry()
+    registry.counter_callback("demo_hits_total", "Hits", lambda: 3)
+    registry.counter_callback("demo_outcomes_total", "Outcomes", lambda: {("used",): 2}, labelnames=("outcome",))
+
+    assert registry.render().splitlines() == [
+        "# HELP demo_hits_total Hits",
+        "# TYPE demo_hits_total counter",
+        "demo_hits_total 3.0",
+        "# HELP demo_outcomes_total Outcomes",
+        "# TYPE demo_outcomes_total counter",
+        'demo_outcomes_total{outcome="used"} 2.0',
+    ]
+
+
+def test_cache_totals_are_exported_as_counters():
+    body = flask_module.app.test_client().get("/metrics").get_data(as_text=True)
+
+    for name in ("medbot_answer_cache_hits_total", "medbot_answer_cache_misses_total",
+                 "medbot_web_cache_hits_total", "medbot_web_cache_misses_total"):
+        assert f"# TYPE {name} counter" in body
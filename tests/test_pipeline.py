@@ -0,0 +1,43 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from utils.embeddings import EmbeddingError
+from utils.pipeline import IngestionPipeline
+
+
+class FakeVectorDatabase:
+    #Odd pages fail to embed, pages divisible by four fail to upload
+    def __init__(self):
+        self.embedding_manager = SimpleNamespace(get_embeddings=self.get_embeddings)
+
+    @staticmethod
+    def get_embeddings(texts):
+        failed = [i for i, text in enumerate(texts) if int(text) % 2]
+        embeddings = np.ones((len(texts), 2), dtype=np.float32)
+        if failed:
+            raise EmbeddingError("rate limited", failed, embeddings)
+        return embeddings
+
+    @staticmethod
+    def point_id_for(chunk):
+        return chunk["text"]
+
+    def build_points(self, chunks, embeddings):
+        return [self.point_id_for(chunk) for chunk in chunks]
+
+    @staticmethod
+    def upsert_points(points):
+        return [point for point in points if int(point) % 4]
+
+
+def test_stage_counts_add_up():
+    chunker = SimpleNamespace(chunk_documents=lambda pages: [{"text": str(page)} for page in pages])
+    pipeline = IngestionPipeline(chunker, FakeVectorDatabase(), batch_chunks=2, queue_size=2)
+    committed, failed = [], []
+
+    stats = pipeline.run(range(400), lambda page, chunks, point_ids: committed.append(page), failed.append)
+
+    assert stats["pages"] == stats["chunks"] == 400
+    assert stats["committed_pages"] == len(committed) == 100
+    assert stats["failed_pages"] == len(failed) == 300
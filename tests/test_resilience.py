@@ -0,0 +1,103 @@
+import asyncio
+import time
+
+import pytest
+
+from utils.resilience import CircuitBreaker, CircuitOpenError, DeadlineExceeded, UpstreamPolicy, set_budget
+
+
+@pytest.fixture(autouse=True)
+def no_budget():
+    set_budget(None)
+    yield
+    set_budget(None)
+
+
+def fail():
+    raise ConnectionError("upstream down")
+
+
+def slow():
+    time.sleep(0.3)
+    return "late"
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.opened == 1
+    assert not breaker.allow()
+    # allow() only answers; rejections are counted by whoever turns the call away
+    assert breaker.rejected == 0
+
+
+def test_breaker_half_open_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()  # One trial call at a time
+    breaker.record_inconclusive()
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_policy_rejects_while_open():
+    policy = UpstreamPolicy("test-reject", timeout=1.0, failure_threshold=2, reset_timeout=60)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            policy.call(fail)
+    assert policy.breaker.state == "open"
+
+    calls = []
+    for _ in range(3):
+        with pytest.raises(CircuitOpenError):
+            policy.call(calls.append, "called")
+    assert calls == []
+    assert policy.stats()["rejected"] == 3
+    assert policy.stats()["circuit_opened"] == 1
+
+
+def test_async_policy_rejects_while_open():
+    policy = UpstreamPolicy("test-async-reject", timeout=1.0, failure_threshold=1, reset_timeout=60)
+    policy.breaker.trip(60)
+
+    async def answer():
+        return "ok"
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(policy.acall(answer))
+    assert policy.breaker.rejected == 1
+
+
+def test_full_timeout_counts_as_failure():
+    policy = UpstreamPolicy("test-timeout", timeout=0.05, failure_threshold=1, reset_timeout=60)
+    with pytest.raises(DeadlineExceeded):
+        policy.call(slow)
+    assert policy.breaker.state == "open"
+
+
+def test_budget_cut_call_does_not_open_the_circuit():
+    policy = UpstreamPolicy("test-budget", timeout=5.0, failure_threshold=1, reset_timeout=60)
+    set_budget(0.05)
+    with pytest.raises(DeadlineExceeded):
+        policy.call(slow)
+    assert policy.breaker.state == "closed"
+
+    # An exhausted budget skips the call altogether
+    time.sleep(0.06)
+    calls = []
+    with pytest.raises(DeadlineExceeded):
+        policy.call(calls.append, "called")
+    assert calls == []
+    assert policy.breaker.state == "closed"
+
+    set_budget(None)
+    assert policy.call(lambda: "ok") == "ok"
@@ -0,0 +1,59 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import app as flask_module
+from utils.critic_agent import CriticStats
+
+DOCUMENT = {"text": "Paracetamol lowers fever.", "score": 0.8, "source": "guide.pdf"}
+
+
+def stalled_search(query, max_results=3):
+    time.sleep(1.0)
+    return [{"url": "https://example.org/late"}]
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    #The app with local stand-ins for its components; the web search stalls past its deadline
+    monkeypatch.setattr(flask_module, "HYBRID_SEARCH", False)
+    monkeypatch.setattr(flask_module, "ANSWER_CACHE_ENABLED", False)
+    monkeypatch.setattr(flask_module, "VECTOR_SEARCH_TIMEOUT", 0.5)
+    monkeypatch.setattr(flask_module, "WEB_SEARCH_TIMEOUT", 0.1)
+    monkeypatch.setattr(flask_module, "vector_db", SimpleNamespace(search_similar=lambda query, limit: [DOCUMENT]))
+    monkeypatch.setattr(flask_module, "web_scraper", SimpleNamespace(search_web=stalled_search))
+    monkeypatch.setattr(flask_module, "llm_agent", SimpleNamespace(
+        stream_response=lambda query, vector_results, web_results: iter(["Take ", "paracetamol."]),
+    ))
+    gate = {"needs_critique": False, "evaluation": {"score": 8, "needs_more_info": False}}
+    monkeypatch.setattr(flask_module, "critic_agent", SimpleNamespace(
+        pre_gate=lambda *args: gate,
+        predicts_follow_up=lambda vector_results, web_results: False,
+        stats=CriticStats(),
+    ))
+
+
+def test_stalled_source_is_dropped_at_its_deadline(pipeline):
+    started = time.time()
+    vector_results, web_results, timed_out = flask_module.retrieve_context("fever")
+
+    # Both searches ran at once: the wait is the web search's deadline, not the sum of both
+    assert time.time() - started < 0.5
+    assert vector_results == [DOCUMENT]
+    assert web_results == []
+    assert timed_out == ["web_search"]
+
+
+def test_answer_completes_without_the_stalled_source(pipeline):
+    events = list(flask_module.stream_medical_query("fever"))
+
+    assert events[0] == ("sources", {
+        "vector_results": [DOCUMENT],
+        "web_results": [],
+        "timed_out_sources": ["web_search"],
+    })
+    event, result = events[-1]
+    assert event == "done"
+    assert result["final_response"] == "Take paracetamol."
+    assert result["timed_out_sources"] == ["web_search"]
@@ -0,0 +1,57 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from utils.retrieval_qa import FALLBACK_RESPONSE, AsyncLLMAgent, LLMAgent
+
+
+def chunk(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))], usage=None, x_groq=None)
+
+
+def broken_stream(pieces):
+    for piece in pieces:
+        yield chunk(piece)
+    raise ConnectionError("stream reset")
+
+
+def agent_with_stream(agent_class, pieces, fail_to_open=False):
+    agent = agent_class()
+    agent._build_messages = lambda query, vector_context, web_context: []
+
+    def create(**kwargs):
+        if fail_to_open:
+            raise ConnectionError("upstream down")
+        return broken_stream(pieces)
+
+    async def acreate(**kwargs):
+        stream = create(**kwargs)
+
+        async def pieces_async():
+            for item in stream:
+                yield item
+        return pieces_async()
+
+    create_fn = acreate if agent_class is AsyncLLMAgent else create
+    agent.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create_fn)))
+    return agent
+
+
+def collect(agent):
+    if isinstance(agent, AsyncLLMAgent):
+        async def run():
+            return [piece async for piece in agent.stream_response("what lowers a fever", [], [])]
+        return asyncio.run(run())
+    return list(agent.stream_response("what lowers a fever", [], []))
+
+
+@pytest.mark.parametrize("agent_class", [LLMAgent, AsyncLLMAgent])
+def test_stream_that_never_started_falls_back(agent_class):
+    assert collect(agent_with_stream(agent_class, [], fail_to_open=True)) == [FALLBACK_RESPONSE]
+
+
+@pytest.mark.parametrize("agent_class", [LLMAgent, AsyncLLMAgent])
+def test_stream_broken_midway_raises_instead_of_apologising(agent_class):
+    with pytest.raises(ConnectionError):
+        collect(agent_with_stream(agent_class, ["Paracetamol ", "lowers"]))
@@ -0,0 +1,56 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from utils.tavily import BoundedTavilyClient
+
+
+@pytest.fixture
+def tavily():
+    #A local Tavily that records each request body and answers after `delay` seconds
+    bodies = []
+
+    class Handler(BaseHTTPRequestHandler):
+        delay = 0.0
+
+        def do_POST(self):
+            bodies.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+            time.sleep(Handler.delay)
+            payload = json.dumps({"results": [{"url": "https://example.org"}]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = BoundedTavilyClient("test", timeout=0.2)
+    client.base_url = f"http://127.0.0.1:{server.server_port}/search"
+    yield client, Handler, bodies
+    server.shutdown()
+
+
+def test_search_keeps_the_sdk_defaults(tavily):
+    client, _, bodies = tavily
+    assert client.search("fever", max_results=2)["results"] == [{"url": "https://example.org"}]
+
+    assert bodies[0]["max_results"] == 2
+    assert bodies[0]["topic"] == "general"
+    assert bodies[0]["include_answer"] is False
+    assert json.loads(client.build_request("fever", max_results=2)["content"]) == bodies[0]
+
+
+def test_search_gives_up_at_the_timeout(tavily):
+    client, handler, _ = tavily
+    handler.delay = 1.0
+    started = time.time()
+    with pytest.raises(requests.exceptions.Timeout):
+        client.search("fever")
+    assert time.time() - started < 0.8
@@ -0,0 +1,101 @@
+import time
+import threading
+import numpy as np
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class SemanticAnswerCache:
+    """Caches final answers keyed by query embedding.
+
+    A lookup hits when the cosine similarity to a stored query clears the threshold and, given
+    key_terms, both questions have the same key terms: "500 mg" and "850 mg" embed almost alike.
+    Only answers whose critic score met min_score are stored; entries expire after the TTL, and
+    when the cache is full the expired or least recently used slot is reused.
+    """
+
+    def __init__(self, max_size: int = 1000, ttl: float = 3600.0,
+                 threshold: float = 0.95, min_score: float = 7.0,
+                 key_terms: Optional[Callable[[str], frozenset]] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self.min_score = min_score
+        self.key_terms = key_terms
+        self._vectors = None  # (max_size, dim) float32, allocated on first store
+        self._entries = [None] * max_size
+        self._expires = np.zeros(max_size, dtype=np.float64)
+        self._last_used = np.zeros(max_size, dtype=np.float64)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.key_term_mismatches = 0  # Lookups that cleared the threshold on a question with other key terms
+        self.stores = 0
+        self.similarity_sum = 0.0
+        self.saved_seconds = 0.0
+
+    def lookup(self, embedding: np.ndarray, query: Optional[str] = None) -> Optional[Tuple[Dict[str, Any], float]]:
+        started = time.time()
+        wanted = self.key_terms(query) if self.key_terms is not None and query is not None else None
+        with self._lock:
+            if self._vectors is None:
+                self.misses += 1
+                return None
+
+            scores = self._vectors @ np.asarray(embedding, dtype=np.float32)
+            scores[self._expires < time.monotonic()] = -np.inf  # Empty slots have expires == 0
+            candidates = np.flatnonzero(scores >= self.threshold)
+            candidates = candidates[np.argsort(-scores[candidates])]
+            if wanted is not None:
+                # The closest stored question that asks about the same numbers, units and rare terms
+                matching = [slot for slot in candidates
+                            if self.key_terms(self._entries[slot].get("query", "")) == wanted]
+                if len(matching) < len(candidates):
+                    self.key_term_mismatches += 1
+                candidates = matching
+            if len(candidates) == 0:
+                self.misses += 1
+                return None
+            best = int(candidates[0])
+            similarity = float(scores[best])
+
+            self._last_used[best] = time.monotonic()
+            result = self._entries[best]
+            self.hits += 1
+            self.similarity_sum += similarity
+            self.saved_seconds += max(0.0, result["processing_time"] - (time.time() - started))
+            return result, similarity
+
+    def store(self, embedding: np.ndarray, result: Dict[str, Any]) -> bool:
+        if result.get("critic_score", 0) < self.min_score:
+            return False
+
+        embedding = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_size, len(embedding)), dtype=np.float32)
+
+            now = time.monotonic()
+            expired = np.flatnonzero(self._expires < now)
+            slot = int(expired[0]) if len(expired) else int(np.argmin(self._last_used))
+            self._vectors[slot] = embedding
+            self._entries[slot] = result
+            self._expires[slot] = now + self.ttl
+            self._last_used[slot] = now
+            self.stores += 1
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": int((self._expires >= time.monotonic()).sum()),
+            "max_size": self.max_size,
+            "threshold": self.threshold,
+            "min_score": self.min_score,
+            "hits": self.hits,
+            "misses": self.misses,
+            "key_term_mismatches": self.key_term_mismatches,
+            "stores": self.stores,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "avg_hit_similarity": self.similarity_sum / self.hits if self.hits else 0.0,
+            "saved_seconds": self.saved_seconds,
+        }
@@ -0,0 +1,78 @@
+import time
+import threading
+from typing import Any, Callable, Dict, List
+from .metrics import Histogram
+
+
+class _Batch:
+    __slots__ = ("items", "sealed", "done", "results", "error")
+
+    def __init__(self):
+        self.items = []  # (item, submitted_at)
+        self.sealed = threading.Event()
+        self.done = threading.Event()
+        self.results = None
+        self.error = None
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-item calls into one batched call.
+
+    The first caller into an empty batch leads it: it waits up to `window` seconds (or until
+    `max_batch` items have joined), then runs fn over all items and hands every caller its own
+    result. fn must return one result per item, in order; an exception reaches every caller.
+    """
+
+    def __init__(self, fn: Callable[[List[Any]], List[Any]], max_batch: int = 32, window: float = 0.005):
+        self.fn = fn
+        self.max_batch = max_batch
+        self.window = window
+        self._open = None
+        self._lock = threading.Lock()
+        self.batch_sizes = Histogram([1, 2, 4, 8, 16, 32, 64, 96])
+        self.wait_ms = Histogram([0.5, 1, 2, 5, 10, 20, 50, 100])
+
+    def submit(self, item: Any) -> Any:
+        with self._lock:
+            batch = self._open
+            leader = batch is None
+            if leader:
+                batch = self._open = _Batch()
+            index = len(batch.items)
+            batch.items.append((item, time.monotonic()))
+            if len(batch.items) >= self.max_batch:
+                self._open = None
+                batch.sealed.set()
+
+        if leader:
+            batch.sealed.wait(self.window)
+            with self._lock:
+                if self._open is batch:
+                    self._open = None
+            self._run(batch)
+        else:
+            batch.done.wait()
+
+        if batch.error is not None:
+            raise batch.error
+        return batch.results[index]
+
+    def _run(self, batch: _Batch):
+        dispatched_at = time.monotonic()
+        self.batch_sizes.observe(len(batch.items))
+        for _, submitted_at in batch.items:
+            self.wait_ms.observe((dispatched_at - submitted_at) * 1000)
+        try:
+            batch.results = self.fn([item for item, _ in batch.items])
+        except Exception as e:
+            batch.error = e
+        finally:
+            batch.done.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+            "batch_size": self.batch_sizes.snapshot(),
+            "wait_ms": self.wait_ms.snapshot(),
+        }
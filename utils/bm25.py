@@ -0,0 +1,219 @@
+import os
+import re
+import json
+import threading
+import numpy as np
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+# Keeps dosages, decimals and codes together: "0.5", "mg/kg", "covid-19", "e11.9"
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[./\-][a-z0-9]+)*")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it me my of on or "
+    "should the to what when which who why with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def query_terms(query: str) -> List[str]:
+    #Distinct query tokens without stopwords
+    return [term for term in dict.fromkeys(tokenize(query)) if term not in STOPWORDS]
+
+
+class BM25Index:
+    """Okapi BM25 over chunk texts, with postings held in flat numpy arrays (CSR layout).
+
+    Documents are added and removed at ingest time; build() turns the document table into
+    term offsets, posting doc rows and term frequencies, and save()/load() persist both.
+    The index keeps no chunk text: docs only hold the fields hits are matched on, and callers
+    resolve the text of a hit by its point ID (VectorDatabase.get_texts). Documents added since
+    the last build wait in _pending as term counts; the others are rebuilt from the postings.
+    """
+
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.docs: Dict[str, Dict[str, Any]] = {}  # point_id -> {"source", "page", "chunk_id"}
+        self._pending: Dict[str, Counter] = {}  # point_id -> term counts, until the next build
+        self._lock = threading.Lock()
+        self._index = None  # (vocab, rows, row_docs, offsets, postings_docs, postings_tf, doc_len, idf, avgdl)
+        self.load()
+
+    # ---- ingest side ---------------------------------------------------------
+
+    def add(self, point_id: str, chunk: Dict[str, Any]):
+        counts = Counter(tokenize(chunk["text"]))
+        with self._lock:
+            self.docs[point_id] = {
+                "source": chunk.get("source", ""),
+                "page": chunk.get("page", 0),
+                "chunk_id": chunk.get("chunk_id", -1),
+            }
+            self._pending[point_id] = counts
+
+    def remove(self, point_ids: List[str]):
+        with self._lock:
+            for point_id in point_ids:
+                self.docs.pop(point_id, None)
+                self._pending.pop(point_id, None)
+
+    def remove_source(self, source: str):
+        with self._lock:
+            for point_id in [key for key, doc in self.docs.items() if doc["source"] == source]:
+                del self.docs[point_id]
+                self._pending.pop(point_id, None)
+
+    def _built_postings(self, row_of: Dict[str, int], pending) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]:
+        #(terms, term ids, new doc rows, tfs) of the last build, for the documents kept and not re-added
+        index = self._index
+        if index is None:
+            return [], np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        vocab, old_rows, _, offsets, postings_docs, postings_tf = index[:6]
+        new_row = np.array(
+            [-1 if point_id in pending else row_of.get(point_id, -1) for point_id in old_rows], dtype=np.int64
+        )
+        term_ids = np.repeat(np.arange(len(vocab), dtype=np.int64), np.diff(offsets))
+        doc_rows = new_row[postings_docs]
+        kept = doc_rows >= 0
+        return list(vocab), term_ids[kept], doc_rows[kept], postings_tf[kept].astype(np.int64)
+
+    def build(self):
+        with self._lock:
+            rows = list(self.docs)
+            row_docs = [self.docs[point_id] for point_id in rows]
+            pending = dict(self._pending)
+        row_of = {point_id: row for row, point_id in enumerate(rows)}
+
+        terms, built_terms, built_rows, built_tfs = self._built_postings(row_of, pending)
+        vocab = {term: term_id for term_id, term in enumerate(terms)}
+        term_ids, doc_rows, tfs = [built_terms], [built_rows], [built_tfs]
+        for point_id, counts in pending.items():
+            if point_id in row_of:
+                term_ids.append(np.fromiter((vocab.setdefault(term, len(vocab)) for term in counts), dtype=np.int64))
+                doc_rows.append(np.full(len(counts), row_of[point_id], dtype=np.int64))
+                tfs.append(np.fromiter(counts.values(), dtype=np.int64))
+        term_ids, doc_rows, tfs = np.concatenate(term_ids), np.concatenate(doc_rows), np.concatenate(tfs)
+
+        # Terms of removed documents drop out of the vocabulary
+        df = np.bincount(term_ids, minlength=len(vocab))
+        used = df > 0
+        terms = [term for term in vocab if used[vocab[term]]]
+        vocab = {term: term_id for term_id, term in enumerate(terms)}
+        term_ids = (np.cumsum(used) - 1)[term_ids]
+        doc_len = np.bincount(doc_rows, weights=tfs, minlength=len(rows)).astype(np.int32)
+
+        order = np.argsort(term_ids, kind="stable")
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(vocab)), out=offsets[1:])
+        postings_docs = doc_rows.astype(np.int32)[order]
+        postings_tf = np.minimum(tfs, np.iinfo(np.uint16).max).astype(np.uint16)[order]
+
+        df = np.diff(offsets).astype(np.float32)
+        idf = np.log1p((len(rows) - df + 0.5) / (df + 0.5)).astype(np.float32)
+        avgdl = float(doc_len.mean()) if len(rows) else 0.0
+        with self._lock:
+            self._index = (vocab, rows, row_docs, offsets, postings_docs, postings_tf, doc_len, idf, avgdl)
+            for point_id, counts in pending.items():
+                if self._pending.get(point_id) is counts:
+                    del self._pending[point_id]
+
+    def save(self):
+        index = self._index
+        if index is None:
+            return
+        vocab, rows, row_docs, offsets, postings_docs, postings_tf, doc_len, idf, avgdl = index
+        os.makedirs(self.path, exist_ok=True)
+
+        terms = [None] * len(vocab)
+        for term, term_id in vocab.items():
+            terms[term_id] = term
+        with open(os.path.join(self.path, "docs.jsonl.tmp"), "w", encoding="utf-8") as f:
+            for point_id, doc in zip(rows, row_docs):
+                f.write(json.dumps({"id": point_id, **doc}, ensure_ascii=False) + "\n")
+        with open(os.path.join(self.path, "vocab.json.tmp"), "w", encoding="utf-8") as f:
+            json.dump(terms, f, ensure_ascii=False)
+        np.savez(
+            os.path.join(self.path, "postings.tmp.npz"),
+            offsets=offsets, postings_docs=postings_docs, postings_tf=postings_tf,
+            doc_len=doc_len, idf=idf, avgdl=np.float64(avgdl)
+        )
+        for name, tmp_name in (("docs.jsonl", "docs.jsonl.tmp"), ("vocab.json", "vocab.json.tmp"),
+                               ("postings.npz", "postings.tmp.npz")):
+            os.replace(os.path.join(self.path, tmp_name), os.path.join(self.path, name))
+
+    def load(self):
+        postings_path = os.path.join(self.path, "postings.npz")
+        if not os.path.exists(postings_path):
+            return
+        try:
+            docs = {}
+            with open(os.path.join(self.path, "docs.jsonl"), "r", encoding="utf-8") as f:
+                for line in f:
+                    doc = json.loads(line)
+                    docs[doc["id"]] = {"source": doc["source"], "page": doc["page"], "chunk_id": doc["chunk_id"]}
+            with open(os.path.join(self.path, "vocab.json"), "r", encoding="utf-8") as f:
+                vocab = {term: term_id for term_id, term in enumerate(json.load(f))}
+            with np.load(postings_path, allow_pickle=False) as data:
+                self._index = (
+                    vocab, list(docs), list(docs.values()), data["offsets"], data["postings_docs"], data["postings_tf"],
+                    data["doc_len"], data["idf"], float(data["avgdl"])
+                )
+            self.docs = docs
+        except Exception as e:
+            print(f"Could not load lexical index, it will be rebuilt: {e}")
+            self.docs = {}
+            self._index = None
+
+    def __len__(self) -> int:
+        return len(self._index[1]) if self._index else 0
+
+    def document_fraction(self, term: str) -> float:
+        #Share of indexed chunks containing the term; 1.0 for unknown terms
+        index = self._index
+        if index is None or term not in index[0] or not index[1]:
+            return 1.0
+        term_id, offsets = index[0][term], index[3]
+        return float(offsets[term_id + 1] - offsets[term_id]) / len(index[1])
+
+    # ---- query side ----------------------------------------------------------
+
+    def search(self, query: str, limit: int = 5) -> List[Tuple[str, Dict[str, Any], float, List[str]]]:
+        #Returns (point_id, doc, score, matched query terms) for the top BM25 hits
+        index = self._index
+        if index is None:
+            return []
+        vocab, rows, row_docs, offsets, postings_docs, postings_tf, doc_len, idf, avgdl = index
+
+        terms = [term for term in query_terms(query) if term in vocab]
+        if not terms or not rows:
+            return []
+
+        scores = np.zeros(len(rows), dtype=np.float32)
+        norm = self.k1 * (1 - self.b + self.b * doc_len / (avgdl or 1.0))
+        for term in terms:
+            term_id = vocab[term]
+            start, end = offsets[term_id], offsets[term_id + 1]
+            docs = postings_docs[start:end]
+            tf = postings_tf[start:end].astype(np.float32)
+            scores[docs] += idf[term_id] * tf * (self.k1 + 1) / (tf + norm[docs])
+
+        candidates = np.flatnonzero(scores)
+        k = min(limit, len(candidates))
+        if k == 0:
+            return []
+        top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+
+        # A term matched a hit when the hit is in the term's postings
+        matched = [
+            np.isin(top, postings_docs[offsets[vocab[term]]:offsets[vocab[term] + 1]]) for term in terms
+        ]
+        return [
+            (rows[row], row_docs[row], float(scores[row]), [term for term, found in zip(terms, matched) if found[i]])
+            for i, row in enumerate(top)
+        ]
@@ -1,42 +1,150 @@
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from typing import List, Dict, Any
-
-class TextChunker:    
-    def __init__(self, chunk_size: int = 2000, chunk_overlap: int = 400):
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            length_function=len,
-            separators=["\n\n", "\n", "Section ", "SECTION ", "Sec. ", "CHAPTER ", "Chapter ", ". ", " ", ""]
-        )
-    
-    def chunk_documents(self, documents: List) -> List[Dict[str, Any]]:
+from typing import Any, List, Tuple
+
+# Same hierarchy as before, best first. The number is where the break falls inside the
+# separator: headings start the next chunk, a sentence keeps its full stop.
+SEPARATORS = [
+    ("\n\n", 0), ("\n", 0), ("Section ", 0), ("SECTION ", 0), ("Sec. ", 0),
+    ("CHAPTER ", 0), ("Chapter ", 0), (". ", 1), (" ", 0),
+]
+
+
+class Chunk:
+    """A chunk of page text with its (start, end) offsets into that text.
+
+    A chunk that runs over a page break starts on page and ends on end_page; end is then an
+    offset into end_page's text. Reads like the old chunk dicts: chunk["text"], chunk.get("page").
+    """
+    __slots__ = ("id", "text", "source", "page", "chunk_id", "start", "end", "end_page")
+
+    def __init__(self, text: str, source: str, page: int, chunk_id: int,
+                 start: int, end: int, end_page: int = None):
+        self.id = f"{source}_{page}_{chunk_id}"
+        self.text = text
+        self.source = source
+        self.page = page
+        self.chunk_id = chunk_id
+        self.start = start
+        self.end = end
+        self.end_page = page if end_page is None else end_page
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key) if key in self.__slots__ else default
+
+    def __repr__(self):
+        return f"Chunk({self.id!r}, {self.start}:{self.end}, {len(self.text)} chars)"
+
+
+class TextChunker:
+    """Splits page text into overlapping chunks of at most chunk_size characters.
+
+    Each window is cut at the last occurrence of the best separator in its back half, found
+    with str.rfind, so the text is scanned once from left to right and only offsets are kept
+    until the chunk text is sliced out. With span_pages, consecutive pages of one source are
+    chunked as one text and a chunk may cross a page break.
+    """
+
+    def __init__(self, chunk_size: int = 2000, chunk_overlap: int = 400, span_pages: bool = False):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.span_pages = span_pages
+        self.min_break = chunk_size // 2
+
+    def _break_at(self, text: str, start: int, limit: int) -> int:
+        for separator, offset in SEPARATORS:
+            at = text.rfind(separator, start + self.min_break, limit)
+            if at > start:
+                return at + offset
+        return limit  # No separator at all: hard cut
+
+    def split_offsets(self, text: str) -> List[Tuple[int, int]]:
+        #(start, end) offsets of the chunks of text, with surrounding whitespace left out
+        spans = []
+        length = len(text)
+        start = 0
+        while start < length and text[start].isspace():
+            start += 1
+
+        while start < length:
+            limit = start + self.chunk_size
+            end = length if limit >= length else self._break_at(text, start, limit)
+            stop = end
+            while stop > start and text[stop - 1].isspace():
+                stop -= 1
+            if stop > start:
+                spans.append((start, stop))
+            if end >= length:
+                break
+
+            # The next chunk repeats up to chunk_overlap characters, starting on a word
+            at = text.find(" ", max(end - self.chunk_overlap, start + 1), end)
+            start = end if at == -1 else at + 1
+            while start < length and text[start].isspace():
+                start += 1
+        return spans
+
+    def split_text(self, text: str) -> List[str]:
+        return [text[start:end] for start, end in self.split_offsets(text)]
+
+    @staticmethod
+    def _page_fields(doc) -> Tuple[str, str, int]:
+        # Handle both dict format and document objects
+        if hasattr(doc, 'page_content'):
+            return doc.page_content, doc.metadata.get("source", "unknown"), doc.metadata.get("page", 0)
+        return doc["text"], doc.get("source", "unknown"), doc.get("page", 0)
+
+    def chunk_documents(self, documents: List) -> List[Chunk]:
         #Chunk docs into smaller pieces
+        pages = [self._page_fields(doc) for doc in documents]
+        if self.span_pages:
+            return self._chunk_spanning(pages)
+
+        chunked_documents = []
+        for text, source, page in pages:
+            for i, (start, end) in enumerate(self.split_offsets(text)):
+                chunked_documents.append(Chunk(text[start:end], source, page, i, start, end))
+        return chunked_documents
+
+    def _chunk_spanning(self, pages: List[Tuple[str, str, int]]) -> List[Chunk]:
+        # Runs of consecutive pages from one source are joined with a paragraph break,
+        # which is also the preferred place to end a chunk
         chunked_documents = []
-        
-        for doc in documents:
-            # Handle both dict format and document objects
-            if hasattr(doc, 'page_content'):
-                text = doc.page_content
-                source = doc.metadata.get("source", "unknown")
-                page = doc.metadata.get("page", 0)
-                metadata = doc.metadata
-            else:
-                text = doc["text"]
-                source = doc.get("source", "unknown")
-                page = doc.get("page", 0)
-                metadata = doc
-            
-            chunks = self.text_splitter.split_text(text)
-            
-            for i, chunk in enumerate(chunks):
-                chunked_documents.append({
-                    "id": f"{source}_{page}_{i}",
-                    "text": chunk,
-                    "source": source,
-                    "page": page,
-                    "chunk_id": i,
-                    **metadata
-                })
-        
-        return chunked_documents
\ No newline at end of file
+        run: List[Tuple[str, str, int]] = []
+        for entry in pages + [None]:
+            if run and (entry is None or entry[1] != run[-1][1] or entry[2] != run[-1][2] + 1):
+                chunked_documents.extend(self._chunk_run(run))
+                run = []
+            if entry is not None:
+                run.append(entry)
+        return chunked_documents
+
+    def _chunk_run(self, run: List[Tuple[str, str, int]]) -> List[Chunk]:
+        offsets = []
+        position = 0
+        for text, _, _ in run:
+            offsets.append(position)
+            position += len(text) + 2
+        joined = "\n\n".join(text for text, _, _ in run)
+        source = run[0][1]
+
+        chunks = []
+        counters = {}
+        first = 0
+        for start, end in self.split_offsets(joined):
+            while first + 1 < len(run) and offsets[first + 1] <= start:
+                first += 1
+            last = first
+            while last + 1 < len(run) and offsets[last + 1] < end:
+                last += 1
+            page = run[first][2]
+            chunk_id = counters.get(page, 0)
+            counters[page] = chunk_id + 1
+            chunks.append(Chunk(
+                joined[start:end], source, page, chunk_id,
+                start - offsets[first], end - offsets[last], run[last][2]
+            ))
+        return chunks
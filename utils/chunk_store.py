@@ -0,0 +1,255 @@
+import os
+import mmap
+import zlib
+import threading
+import numpy as np
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from .file_lock import FileLock
+
+
+class ChunkStore:
+    """Chunk texts keyed by point ID, kept next to the app instead of in the vector payloads.
+
+    Texts are written in zlib-compressed blocks of about BLOCK_BYTES to blocks.dat; meta.npz maps
+    each ID to its block and its byte range inside the decompressed block. blocks.dat is
+    memory-mapped and blocks are decompressed straight from the map, with a small LRU of
+    decompressed blocks since neighbouring chunks of a page usually share one. Deletes only
+    retire index entries; compact() rewrites the file once enough dead text piles up.
+
+    Serving workers only read what meta.npz describes and reload it when another process saved a
+    new one. Writes take a file lock and first reload meta.npz too, so ingest.py can run next to
+    the servers.
+    """
+
+    BLOCK_BYTES = 64 * 1024
+    CACHED_BLOCKS = 32
+
+    def __init__(self, path: str):
+        self.path = path
+        self.blocks_path = os.path.join(path, "blocks.dat")
+        self.meta_path = os.path.join(path, "meta.npz")
+        self._lock = threading.RLock()
+        self._file_lock = FileLock(path.rstrip(os.sep) + ".lock")
+        self._cache: "OrderedDict[int, bytes]" = OrderedDict()
+        self._reset_state()
+        self._refresh()
+
+    def _reset_state(self):
+        self._ids: List[str] = []
+        self._row_of: Dict[str, int] = {}
+        self._live = np.zeros(0, dtype=bool)
+        self._block = np.zeros(0, dtype=np.int32)
+        self._start = np.zeros(0, dtype=np.int32)  # Byte range of the text inside its decompressed block
+        self._length = np.zeros(0, dtype=np.int32)
+        self._sources: List[str] = []
+        self._bounds = np.zeros(1, dtype=np.int64)  # Block i lives at [bounds[i], bounds[i + 1]) in blocks.dat
+        self._map = None
+        self._version = None  # meta.npz as last loaded or saved here
+        self._cache.clear()
+
+    # ---- storage -------------------------------------------------------------
+
+    def _load(self):
+        with np.load(self.meta_path, allow_pickle=False) as meta:
+            self._ids = [str(point_id) for point_id in meta["ids"]]
+            self._live = meta["live"].astype(bool)
+            self._block = meta["block"].astype(np.int32)
+            self._start = meta["start"].astype(np.int32)
+            self._length = meta["length"].astype(np.int32)
+            self._sources = [str(source) for source in meta["sources"]]
+            self._bounds = meta["bounds"].astype(np.int64)
+        self._row_of = {point_id: row for row, point_id in enumerate(self._ids) if self._live[row]}
+        self._version = self._meta_version()
+        self._remap()
+
+    def _meta_version(self):
+        try:
+            stat = os.stat(self.meta_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _refresh(self):
+        #Load meta.npz again if another process saved it; under the file lock, so a compaction
+        #is never seen between clearing the store and writing it back
+        if self._meta_version() == self._version:
+            return
+        with self._lock, self._file_lock:
+            if self._meta_version() != self._version:
+                self._reset_state()
+                if os.path.exists(self.meta_path):
+                    self._load()
+
+    @contextmanager
+    def _writing(self):
+        with self._lock, self._file_lock:
+            self._refresh()
+            # Blocks appended without a meta save were left by an interrupted writer
+            if os.path.exists(self.blocks_path) and os.path.getsize(self.blocks_path) > self._bounds[-1]:
+                with open(self.blocks_path, "r+b") as f:
+                    f.truncate(int(self._bounds[-1]))
+            yield
+
+    def _save_meta(self):
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = os.path.join(self.path, "meta.tmp.npz")
+        np.savez(
+            tmp_path,
+            ids=np.array(self._ids, dtype=str),
+            live=self._live,
+            block=self._block,
+            start=self._start,
+            length=self._length,
+            sources=np.array(self._sources, dtype=str),
+            bounds=self._bounds,
+        )
+        os.replace(tmp_path, self.meta_path)
+        self._version = self._meta_version()
+
+    def _remap(self):
+        # The old map is only dropped, not closed: a reader may still hold a view into it
+        size = int(self._bounds[-1])
+        if size:
+            with open(self.blocks_path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+        else:
+            self._map = None
+
+    def __len__(self) -> int:
+        self._refresh()
+        return len(self._row_of)
+
+    def put_many(self, ids: List[str], texts: List[str], sources: List[str]):
+        encoded = [text.encode("utf-8") for text in texts]
+        with self._writing():
+            os.makedirs(self.path, exist_ok=True)
+            first_block = len(self._bounds) - 1
+            blocks, rows = [], []
+            current, size = [], 0
+            for point_id, data, source in zip(ids, encoded, sources):
+                if size and size + len(data) > self.BLOCK_BYTES:
+                    blocks.append(b"".join(current))
+                    current, size = [], 0
+                rows.append((point_id, first_block + len(blocks), size, len(data), source))
+                current.append(data)
+                size += len(data)
+            if current:
+                blocks.append(b"".join(current))
+            if not blocks:
+                return
+
+            compressed = [zlib.compress(block, 6) for block in blocks]
+            with open(self.blocks_path, "ab") as f:
+                f.write(b"".join(compressed))
+
+            # An upserted ID retires its previous entry
+            start = len(self._ids)
+            self._live = np.concatenate([self._live, np.ones(len(rows), dtype=bool)])
+            for offset, (point_id, _, _, _, _) in enumerate(rows):
+                old_row = self._row_of.get(point_id)
+                if old_row is not None:
+                    self._live[old_row] = False
+                self._row_of[point_id] = start + offset
+            self._ids.extend(row[0] for row in rows)
+            self._block = np.concatenate([self._block, np.array([row[1] for row in rows], dtype=np.int32)])
+            self._start = np.concatenate([self._start, np.array([row[2] for row in rows], dtype=np.int32)])
+            self._length = np.concatenate([self._length, np.array([row[3] for row in rows], dtype=np.int32)])
+            self._sources.extend(row[4] for row in rows)
+            sizes = np.fromiter((len(block) for block in compressed), dtype=np.int64, count=len(compressed))
+            self._bounds = np.concatenate([self._bounds, self._bounds[-1] + np.cumsum(sizes)])
+            self._save_meta()
+            self._remap()
+
+    def _read_block(self, block: int) -> bytes:
+        data = self._cache.get(block)
+        if data is not None:
+            self._cache.move_to_end(block)
+            return data
+        start, end = int(self._bounds[block]), int(self._bounds[block + 1])
+        with memoryview(self._map) as view:
+            data = zlib.decompress(view[start:end])
+        self._cache[block] = data
+        if len(self._cache) > self.CACHED_BLOCKS:
+            self._cache.popitem(last=False)
+        return data
+
+    def get_many(self, ids: List[str]) -> List[Optional[str]]:
+        texts: List[Optional[str]] = []
+        self._refresh()
+        with self._lock:
+            for point_id in ids:
+                row = self._row_of.get(str(point_id))
+                if row is None:
+                    texts.append(None)
+                    continue
+                start = int(self._start[row])
+                data = self._read_block(int(self._block[row]))
+                texts.append(data[start:start + int(self._length[row])].decode("utf-8"))
+        return texts
+
+    def delete(self, ids: List[str]):
+        with self._writing():
+            changed = False
+            for point_id in ids:
+                row = self._row_of.pop(str(point_id), None)
+                if row is not None:
+                    self._live[row] = False
+                    changed = True
+            if changed:
+                self._save_meta()
+
+    def delete_where(self, source: str):
+        with self._writing():
+            changed = False
+            for row, row_source in enumerate(self._sources):
+                if row_source == source and self._live[row]:
+                    self._live[row] = False
+                    self._row_of.pop(self._ids[row], None)
+                    changed = True
+            if changed:
+                self._save_meta()
+
+    def clear(self):
+        with self._writing():
+            for path in (self.blocks_path, self.meta_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._reset_state()
+
+    def dead_fraction(self) -> float:
+        return 1.0 - len(self._row_of) / len(self._ids) if self._ids else 0.0
+
+    def compact(self):
+        #Rewrite the blocks without dead entries, keeping the live ones in their original order
+        with self._writing():
+            rows = np.flatnonzero(self._live)
+            if len(rows) == len(self._ids):
+                return
+            ids = [self._ids[row] for row in rows]
+            sources = [self._sources[row] for row in rows]
+            texts = self.get_many(ids)
+            self.clear()
+            if ids:
+                self.put_many(ids, texts, sources)
+
+    def stats(self) -> Dict[str, float]:
+        self._refresh()
+        with self._lock:
+            raw = int(self._length[self._live].sum()) if len(self._ids) else 0
+            stored = int(self._bounds[-1])
+            return {
+                "chunks": len(self._row_of),
+                "blocks": len(self._bounds) - 1,
+                "text_bytes": raw,
+                "file_bytes": stored,
+                "compression_ratio": raw / stored if stored else 0.0,
+            }
+
+
+def create_chunk_store(collection_name: str) -> Optional[ChunkStore]:
+    #None when CHUNK_STORE=false: chunk text then stays in the vector payloads
+    if os.getenv("CHUNK_STORE", "true").lower() != "true":
+        return None
+    return ChunkStore(os.path.join(os.getenv("CHUNK_STORE_DIR", os.path.join(".cache", "chunks")), collection_name))
@@ -0,0 +1,101 @@
+import os
+from typing import Any, Dict, Optional
+from qdrant_client.models import (
+    Distance, VectorParams, HnswConfigDiff, SearchParams, QuantizationSearchParams,
+    ScalarQuantization, ScalarQuantizationConfig, ScalarType,
+    BinaryQuantization, BinaryQuantizationConfig, PayloadSchemaType
+)
+
+# Filter fields of every chunk point; page is stored as an int, so it gets an integer index
+PAYLOAD_INDEXES = {"source": PayloadSchemaType.KEYWORD, "page": PayloadSchemaType.INTEGER}
+
+
+class CollectionProfile:
+    """How a Qdrant collection stores and searches its vectors.
+
+    quantization is None, "int8" or "binary". Quantized vectors are kept in RAM and searched
+    first; with rescore the top limit * oversampling candidates are re-ranked on the original
+    vectors, which can then live on disk (vectors_on_disk) at little cost to recall.
+    """
+
+    def __init__(self, name: str, quantization: Optional[str] = None, rescore: bool = True,
+                 oversampling: float = 2.0, m: int = 16, ef_construct: int = 100, search_ef: int = 128,
+                 vectors_on_disk: bool = False, hnsw_on_disk: bool = False, payload_on_disk: bool = False):
+        self.name = name
+        self.quantization = quantization
+        self.rescore = rescore
+        self.oversampling = oversampling
+        self.m = m
+        self.ef_construct = ef_construct
+        self.search_ef = search_ef
+        self.vectors_on_disk = vectors_on_disk
+        self.hnsw_on_disk = hnsw_on_disk
+        self.payload_on_disk = payload_on_disk
+
+    def quantization_config(self):
+        if self.quantization == "int8":
+            return ScalarQuantization(
+                scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+            )
+        if self.quantization == "binary":
+            return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+        return None
+
+    def collection_config(self, vector_size: int) -> Dict[str, Any]:
+        #Keyword arguments for QdrantClient.create_collection
+        return {
+            "vectors_config": VectorParams(
+                size=vector_size,
+                distance=Distance.COSINE,
+                on_disk=self.vectors_on_disk,
+            ),
+            "hnsw_config": HnswConfigDiff(m=self.m, ef_construct=self.ef_construct, on_disk=self.hnsw_on_disk),
+            "quantization_config": self.quantization_config(),
+            "on_disk_payload": self.payload_on_disk,
+        }
+
+    def search_params(self) -> SearchParams:
+        quantization = None
+        if self.quantization:
+            quantization = QuantizationSearchParams(rescore=self.rescore, oversampling=self.oversampling)
+        return SearchParams(hnsw_ef=self.search_ef, quantization=quantization)
+
+    def describe(self) -> Dict[str, Any]:
+        return dict(vars(self))
+
+
+COLLECTION_PROFILES = {
+    # Everything in RAM, full-precision vectors: the default
+    "in_memory": CollectionProfile("in_memory"),
+    # int8 vectors in RAM (a quarter of the float32 size), originals on disk for rescoring
+    "int8": CollectionProfile("int8", quantization="int8", oversampling=2.0, vectors_on_disk=True),
+    # 1 bit per dimension in RAM; coarse at 384 dimensions, so it oversamples more
+    "binary": CollectionProfile("binary", quantization="binary", oversampling=4.0, vectors_on_disk=True),
+    # Smallest RAM footprint: graph and payloads on disk too
+    "on_disk": CollectionProfile(
+        "on_disk", quantization="int8", oversampling=2.0,
+        vectors_on_disk=True, hnsw_on_disk=True, payload_on_disk=True
+    ),
+}
+
+
+def get_collection_profile(name: Optional[str] = None) -> CollectionProfile:
+    """The profile named by QDRANT_PROFILE, with QDRANT_HNSW_M, QDRANT_HNSW_EF_CONSTRUCT,
+    QDRANT_SEARCH_EF and QDRANT_OVERSAMPLING overriding its defaults"""
+    name = (name or os.getenv("QDRANT_PROFILE", "in_memory")).lower()
+    if name not in COLLECTION_PROFILES:
+        raise ValueError(f"Unknown QDRANT_PROFILE {name!r}; choose from {', '.join(COLLECTION_PROFILES)}")
+
+    base = COLLECTION_PROFILES[name]
+    return CollectionProfile(
+        base.name,
+        quantization=base.quantization,
+        rescore=base.rescore,
+        oversampling=float(os.getenv("QDRANT_OVERSAMPLING", base.oversampling)),
+        m=int(os.getenv("QDRANT_HNSW_M", base.m)),
+        ef_construct=int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", base.ef_construct)),
+        search_ef=int(os.getenv("QDRANT_SEARCH_EF", base.search_ef)),
+        vectors_on_disk=base.vectors_on_disk,
+        hnsw_on_disk=base.hnsw_on_disk,
+        payload_on_disk=base.payload_on_disk,
+    )
@@ -0,0 +1,206 @@
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional
+from .bm25 import query_terms, tokenize
+
+SENTENCE_END = re.compile(r"[.!?]\s")
+
+
+def estimate_tokens(text: str) -> int:
+    #Llama tokenizers average about four characters of English per token
+    return (len(text) + 3) // 4
+
+
+def _shingles(text: str, size: int = 3) -> frozenset:
+    words = tokenize(text)
+    if len(words) < size:
+        return frozenset(words)
+    return frozenset(tuple(words[i:i + size]) for i in range(len(words) - size + 1))
+
+
+def _overlap(a: frozenset, b: frozenset) -> float:
+    #Overlap coefficient, so a passage contained in a longer one counts as a duplicate
+    if not a or not b:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
+
+
+def merge_overlapping(first: str, second: str, probe: int = 60) -> str:
+    #Join two neighbouring chunks, dropping the text the chunker repeated at the seam
+    head = second[:probe]
+    at = first.rfind(head) if head else -1
+    if at >= 0 and second.startswith(first[at:]):
+        return first[:at] + second
+    return f"{first}\n{second}"
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    #Cut to the budget, preferring to end on a sentence
+    limit = max_tokens * 4
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    ends = [match.end() for match in SENTENCE_END.finditer(cut)]
+    if ends and ends[-1] > limit // 2:
+        return cut[:ends[-1]].rstrip()
+    return cut[:limit - 3].rsplit(" ", 1)[0] + "..."  # Room for the ellipsis
+
+
+class ContextPacker:
+    """Selects the passages that go into the LLM prompt under a token budget.
+
+    Vector hits from neighbouring chunks of the same page are merged back into one passage,
+    near-identical passages (document or web) are dropped, and the rest are picked by
+    maximal marginal relevance until the budget is spent.
+    """
+
+    def __init__(self, token_budget: int = 800, max_passage_tokens: int = 350,
+                 diversity: float = 0.3, duplicate_threshold: float = 0.8):
+        self.token_budget = token_budget
+        self.max_passage_tokens = max_passage_tokens
+        self.diversity = diversity
+        self.duplicate_threshold = duplicate_threshold
+        self._lock = threading.Lock()
+        self.packs = 0
+        self.merged_chunks = 0
+        self.duplicates_dropped = 0
+        self.context_tokens = 0
+        self.baseline_tokens = 0
+
+    @staticmethod
+    def baseline_tokens_for(vector_context: List[Dict], web_context: List[Dict]) -> int:
+        #What the previous fixed 3 + 3 hits of 800 characters would have cost
+        texts = [item["text"][:800] for item in vector_context[:3]]
+        texts += [item["content"][:800] for item in web_context[:3]]
+        return sum(estimate_tokens(text) for text in texts)
+
+    def _document_passages(self, vector_context: List[Dict]) -> List[Dict]:
+        # Group by page, then merge runs of consecutive chunk ids
+        pages: Dict[tuple, List[tuple]] = {}
+        for rank, item in enumerate(vector_context):
+            key = (item.get("source"), item.get("page"))
+            pages.setdefault(key, []).append((item.get("chunk_id"), rank, item))
+
+        passages = []
+        for (source, page), hits in pages.items():
+            hits.sort(key=lambda hit: (hit[0] is None, hit[0] if hit[0] is not None else 0))
+            run = None
+            for chunk_id, rank, item in hits:
+                if run is not None and run["last_chunk"] is not None and chunk_id == run["last_chunk"]:
+                    continue  # The same chunk from both retrievers
+                if (run is not None and chunk_id is not None and run["last_chunk"] is not None
+                        and chunk_id == run["last_chunk"] + 1):
+                    run["text"] = merge_overlapping(run["text"], item["text"])
+                    run["last_chunk"] = chunk_id
+                    if rank < run["rank"]:
+                        # Long runs are cut from the best-ranked chunk onwards
+                        run["rank"] = rank
+                        run["start"] = len(run["text"]) - len(item["text"])
+                    run["merged"] += 1
+                    continue
+                if run is not None:
+                    passages.append(run)
+                run = {
+                    "kind": "document",
+                    "label": f"Medical Document - {source} (Page {page if page is not None else 'Unknown'})",
+                    "text": item["text"],
+                    "rank": rank,
+                    "start": 0,
+                    "last_chunk": chunk_id,
+                    "merged": 0,
+                }
+            if run is not None:
+                passages.append(run)
+        return passages
+
+    @staticmethod
+    def _web_passages(web_context: List[Dict]) -> List[Dict]:
+        return [
+            {
+                "kind": "web",
+                "label": f"Web Source - {item.get('title', 'Untitled')}",
+                "text": item.get("content", ""),
+                "rank": rank,
+                "start": 0,
+                "merged": 0,
+            }
+            for rank, item in enumerate(web_context)
+            if item.get("content")
+        ]
+
+    def pack(self, query: str, vector_context: List[Dict], web_context: List[Dict]) -> Dict[str, Any]:
+        passages = self._document_passages(vector_context) + self._web_passages(web_context)
+        merged = sum(passage["merged"] for passage in passages)
+
+        terms = set(query_terms(query))
+        for passage in passages:
+            passage["shingles"] = _shingles(passage["text"])
+            coverage = len(terms & set(tokenize(passage["text"]))) / len(terms) if terms else 0.0
+            # Retrieval order is the main signal; query term coverage breaks ties across sources
+            passage["relevance"] = 0.7 / (1 + passage["rank"]) + 0.3 * coverage
+
+        # Near-identical passages: keep the more relevant one
+        unique: List[Dict] = []
+        for passage in sorted(passages, key=lambda p: p["relevance"], reverse=True):
+            if any(_overlap(passage["shingles"], kept["shingles"]) >= self.duplicate_threshold for kept in unique):
+                continue
+            unique.append(passage)
+        duplicates = len(passages) - len(unique)
+
+        selected: List[Dict] = []
+        remaining = self.token_budget
+        candidates = list(unique)
+        while candidates and remaining > 0:
+            def mmr(passage):
+                redundancy = max((_overlap(passage["shingles"], kept["shingles"]) for kept in selected), default=0.0)
+                return (1 - self.diversity) * passage["relevance"] - self.diversity * redundancy
+
+            best = max(candidates, key=mmr)
+            candidates.remove(best)
+            max_tokens = min(self.max_passage_tokens, remaining)
+            text = best["text"]
+            if estimate_tokens(text) > max_tokens:
+                text = _truncate(text[best["start"]:], max_tokens)
+            tokens = estimate_tokens(text)
+            if tokens < 20 and selected:
+                break  # Not enough budget left for a useful passage
+            selected.append({**best, "text": text, "tokens": tokens})
+            remaining -= tokens
+
+        used = sum(passage["tokens"] for passage in selected)
+        baseline = self.baseline_tokens_for(vector_context, web_context)
+        with self._lock:
+            self.packs += 1
+            self.merged_chunks += merged
+            self.duplicates_dropped += duplicates
+            self.context_tokens += used
+            self.baseline_tokens += baseline
+
+        return {
+            "documents": [p for p in selected if p["kind"] == "document"],
+            "web": [p for p in selected if p["kind"] == "web"],
+            "context_tokens": used,
+            "baseline_tokens": baseline,
+            "merged_chunks": merged,
+            "duplicates_dropped": duplicates,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "token_budget": self.token_budget,
+                "packs": self.packs,
+                "merged_chunks": self.merged_chunks,
+                "duplicates_dropped": self.duplicates_dropped,
+                "avg_context_tokens": self.context_tokens / self.packs if self.packs else 0.0,
+                "tokens_saved": self.baseline_tokens - self.context_tokens,
+            }
+
+
+def create_context_packer(token_budget: Optional[int] = None) -> ContextPacker:
+    return ContextPacker(
+        token_budget=token_budget or int(os.getenv("CONTEXT_TOKEN_BUDGET", "800")),
+        max_passage_tokens=int(os.getenv("CONTEXT_MAX_PASSAGE_TOKENS", "350")),
+        diversity=float(os.getenv("CONTEXT_DIVERSITY", "0.3")),
+    )
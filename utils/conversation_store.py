@@ -0,0 +1,189 @@
+import os
+import time
+import zlib
+import sqlite3
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+
+def _compress(text: str) -> bytes:
+    return zlib.compress(text.encode("utf-8"), 6)
+
+
+def _entry(query: str, response: bytes, score: Optional[float], created: float) -> Dict[str, Any]:
+    return {
+        "query": query,
+        "response": zlib.decompress(response).decode("utf-8"),
+        "score": score,
+        "timestamp": datetime.fromtimestamp(created).strftime("%H:%M:%S"),
+        "created": created,
+    }
+
+
+class MemoryConversationStore:
+    """Chat history per session ID, kept in this process.
+
+    Each session is a ring buffer of its last max_entries exchanges, with the response
+    zlib-compressed. Sessions idle for longer than the TTL expire, and past max_sessions the
+    least recently used one is dropped. History is lost on restart and is not shared between
+    worker processes; use the SQLite store for that.
+    """
+
+    def __init__(self, max_entries: int = 20, max_sessions: int = 10000, ttl: float = 7 * 86400.0):
+        self.max_entries = max_entries
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()  # session_id -> (last_used, deque)
+        self._lock = threading.Lock()
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+
+    def _get(self, session_id: str) -> Optional[deque]:
+        item = self._sessions.get(session_id)
+        if item is None:
+            return None
+        if item[0] + self.ttl < time.time():
+            del self._sessions[session_id]
+            return None
+        return item[1]
+
+    def append(self, session_id: str, query: str, response: str, score: Optional[float] = None):
+        packed = _compress(response)
+        now = time.time()
+        with self._lock:
+            entries = self._get(session_id)
+            if entries is None:
+                entries = deque(maxlen=self.max_entries)
+            entries.append((query, packed, score, now))
+            self._sessions[session_id] = (now, entries)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            self.raw_bytes += len(response.encode("utf-8"))
+            self.stored_bytes += len(packed)
+
+    def history(self, session_id: str, offset: int = 0, limit: int = 20) -> Dict[str, Any]:
+        #Newest first
+        with self._lock:
+            entries = self._get(session_id)
+            rows = list(entries)[::-1] if entries else []
+        return {
+            "entries": [_entry(*row) for row in rows[offset:offset + limit]],
+            "total": len(rows),
+            "offset": offset,
+            "limit": limit,
+        }
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "sessions": len(self._sessions),
+                "entries": sum(len(entries) for _, entries in self._sessions.values()),
+                "max_entries": self.max_entries,
+                "compression_ratio": self.raw_bytes / self.stored_bytes if self.stored_bytes else 0.0,
+            }
+
+
+class SQLiteConversationStore:
+    """Chat history per session ID in a SQLite file, shared by every worker on the host.
+
+    Responses are stored zlib-compressed; each session keeps its last max_entries exchanges and
+    sessions idle for longer than the TTL are pruned every PRUNE_EVERY appends.
+    """
+
+    PRUNE_EVERY = 500
+
+    def __init__(self, path: str, max_entries: int = 20, ttl: float = 7 * 86400.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._appends = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, query TEXT NOT NULL, "
+            "response BLOB NOT NULL, score REAL, created REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS messages_session ON messages (session_id, id)")
+
+    def append(self, session_id: str, query: str, response: str, score: Optional[float] = None):
+        packed = _compress(response)
+        with self._lock:
+            with self._db:
+                self._db.execute("BEGIN")
+                self._db.execute(
+                    "INSERT INTO messages (session_id, query, response, score, created) VALUES (?, ?, ?, ?, ?)",
+                    (session_id, query, packed, score, time.time()),
+                )
+                # Keep only the newest max_entries rows of this session
+                self._db.execute(
+                    "DELETE FROM messages WHERE session_id = ? AND id <= ("
+                    "SELECT id FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                    (session_id, session_id, self.max_entries),
+                )
+            self._appends += 1
+            if self._appends % self.PRUNE_EVERY == 0:
+                self.prune()
+
+    def prune(self):
+        #Drop sessions whose newest message is older than the TTL
+        self._db.execute(
+            "DELETE FROM messages WHERE session_id IN ("
+            "SELECT session_id FROM messages GROUP BY session_id HAVING MAX(created) < ?)",
+            (time.time() - self.ttl,),
+        )
+
+    def history(self, session_id: str, offset: int = 0, limit: int = 20) -> Dict[str, Any]:
+        #Newest first
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT query, response, score, created FROM messages WHERE session_id = ? "
+                "ORDER BY id DESC LIMIT ? OFFSET ?",
+                (session_id, limit, offset),
+            ).fetchall()
+            total = self._db.execute("SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)).fetchone()[0]
+        return {"entries": [_entry(*row) for row in rows], "total": total, "offset": offset, "limit": limit}
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._db.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sessions, entries, stored = self._db.execute(
+                "SELECT COUNT(DISTINCT session_id), COUNT(*), COALESCE(SUM(LENGTH(response)), 0) FROM messages"
+            ).fetchone()
+        return {
+            "backend": "sqlite",
+            "sessions": sessions,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "stored_bytes": stored,
+        }
+
+
+def create_conversation_store():
+    #CONVERSATION_STORE=memory (default) or sqlite
+    backend = os.getenv("CONVERSATION_STORE", "memory").lower()
+    max_entries = int(os.getenv("CHAT_HISTORY_SIZE", "20"))
+    ttl = float(os.getenv("CONVERSATION_TTL", str(7 * 86400)))
+    if backend == "sqlite":
+        return SQLiteConversationStore(
+            os.getenv("CONVERSATION_DB_PATH", os.path.join(".cache", "conversations.sqlite3")),
+            max_entries=max_entries,
+            ttl=ttl,
+        )
+    if backend != "memory":
+        raise ValueError(f"Unknown CONVERSATION_STORE {backend!r}; choose memory or sqlite")
+    return MemoryConversationStore(max_entries=max_entries, ttl=ttl)
@@ -1,20 +1,155 @@
 import os
+import re
 import json
-from typing import List, Dict
-from groq import Groq
+import time
+import threading
+from typing import List, Dict, Any
+from groq import Groq, AsyncGroq
+from .http_pool import get_async_client
+from .metrics import span
+from .retrieval_qa import llm_usage
+from .resilience import get_policy
+
+DISCLAIMER_PATTERN = re.compile(
+    r"consult|healthcare (?:provider|professional)|medical advice|doctor|physician|disclaimer", re.IGNORECASE
+)
+
+
+class CriticStats:
+    """Counts how often the LLM critique was skipped or deferred and what that saved"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.gate_passed = 0
+        self.llm_critiques = 0
+        self.deferred_critiques = 0
+        self.critique_seconds = 0.0
+        self.deferred_seconds = 0.0
+        self.speculations = 0
+        self.speculations_used = 0
+        self.speculations_wasted = 0
+        self.speculation_misses = 0
+        self.speculation_saved_seconds = 0.0
+
+    def record_gate_pass(self):
+        with self._lock:
+            self.gate_passed += 1
+
+    def record_critique(self, seconds: float):
+        with self._lock:
+            self.llm_critiques += 1
+            self.critique_seconds += seconds
+
+    def record_deferred(self, seconds: float):
+        with self._lock:
+            self.deferred_critiques += 1
+            self.deferred_seconds += seconds
+
+    def record_speculation(self):
+        with self._lock:
+            self.speculations += 1
+
+    def record_speculation_outcome(self, used: bool, saved_seconds: float = 0.0):
+        with self._lock:
+            if used:
+                self.speculations_used += 1
+                self.speculation_saved_seconds += saved_seconds
+            else:
+                self.speculations_wasted += 1
+
+    def record_speculation_miss(self):
+        #A follow-up search was needed but had not been predicted
+        with self._lock:
+            self.speculation_misses += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            avg_critique = self.critique_seconds / self.llm_critiques if self.llm_critiques else 0.0
+            resolved = self.speculations_used + self.speculations_wasted
+            needed = self.speculations_used + self.speculation_misses
+            return {
+                "gate_passed": self.gate_passed,
+                "llm_critiques": self.llm_critiques,
+                "deferred_critiques": self.deferred_critiques,
+                "avg_critique_seconds": avg_critique,
+                # Skipped critiques are estimated at the average critique time; deferred ones are measured
+                "saved_seconds": self.gate_passed * avg_critique + self.deferred_seconds,
+                "speculative_follow_up": {
+                    "started": self.speculations,
+                    "used": self.speculations_used,
+                    "wasted": self.speculations_wasted,
+                    "missed": self.speculation_misses,
+                    # Share of speculative searches that a regeneration used, and of regenerations that found one
+                    "hit_rate": self.speculations_used / resolved if resolved else 0.0,
+                    "coverage": self.speculations_used / needed if needed else 0.0,
+                    "saved_seconds": self.speculation_saved_seconds,
+                },
+            }
+
 
 class CriticAgent:
     """Evaluates response quality and decides if more information is needed"""
     
     def __init__(self):
-        self.client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+        self.policy = get_policy("groq")
+        self.client = Groq(api_key=os.getenv("GROQ_API_KEY"), timeout=self.policy.timeout)
         self.model = "llama-3.3-70b-versatile"
+        self.gate_threshold = float(os.getenv("CRITIC_GATE_THRESHOLD", "7"))
+        self.speculative_follow_up = os.getenv("SPECULATIVE_FOLLOW_UP", "false").lower() == "true"
+        self.speculate_below_score = float(os.getenv("SPECULATE_VECTOR_SCORE", "0.45"))
+        self.speculate_min_web_results = int(os.getenv("SPECULATE_MIN_WEB_RESULTS", "2"))
+        self.stats = CriticStats()
+
+    def pre_gate(self, query: str, response: str,
+                 vector_context: List[Dict], web_context: List[Dict]) -> Dict:
+        """Score the response locally from retrieval signals; the LLM critique is only needed below the threshold"""
+        top_vector = max((item.get("score", 0.0) for item in vector_context), default=0.0)
+        has_disclaimer = bool(DISCLAIMER_PATTERN.search(response))
+
+        score = 3.0 * min(1.0, max(0.0, (top_vector - 0.3) / 0.4))  # Relevance of the best document
+        score += 1.0 if len(vector_context) >= 3 else 0.0
+        score += min(2, len(web_context))
+        score += 2.0 if len(response) >= 600 else 1.0 if len(response) >= 250 else 0.0
+        score += 2.0 if has_disclaimer else 0.0
+
+        needs_critique = score < self.gate_threshold
+        if not needs_critique:
+            self.stats.record_gate_pass()
+        return {
+            "score": round(score, 1),
+            "needs_critique": needs_critique,
+            "signals": {
+                "top_vector_score": top_vector,
+                "vector_results": len(vector_context),
+                "web_results": len(web_context),
+                "answer_length": len(response),
+                "has_disclaimer": has_disclaimer,
+            },
+            "evaluation": {
+                "score": round(score, 1),
+                "reasoning": "Passed the local pre-check",
+                "needs_more_info": False,
+                "suggestions": ""
+            },
+        }
     
-    def evaluate_response(self, query: str, response: str, 
-                         vector_context: List[Dict], web_context: List[Dict]) -> Dict:
-        """Evaluate response quality and provide score"""
-        try:
-            critic_prompt = f"""You are a medical response critic. Evaluate the quality of this medical response on a scale of 1-10.
+    def predicts_follow_up(self, vector_context: List[Dict], web_context: List[Dict]) -> bool:
+        """Guess from retrieval alone whether the critique will ask for more information.
+
+        A weak best document together with few web results is what sends the critic after more
+        information, so the follow-up search can be started before generation. Either signal alone
+        is common on answers that stand.
+        """
+        if not self.speculative_follow_up:
+            return False
+        dense = [item.get("score", 0.0) for item in vector_context if item.get("retrieval") != "lexical"]
+        # Lexical-only hits (exact-term queries) have no cosine; their BM25 score relative to the best stands in
+        top = max(dense) if dense else max((item.get("lexical_score", 0.0) for item in vector_context), default=0.0)
+        return top < self.speculate_below_score and len(web_context) < self.speculate_min_web_results
+
+    def _build_prompt(self, query: str, response: str,
+                      vector_context: List[Dict], web_context: List[Dict]) -> str:
+        return f"""You are a medical response critic. Evaluate the quality of this medical response on a scale of 1-10.
 
 USER QUERY: {query}
 
@@ -40,29 +175,85 @@ Provide your evaluation as a JSON object:
 }}
 """
 
-            response_eval = self.client.chat.completions.create(
-                messages=[{"role": "user", "content": critic_prompt}],
-                model=self.model,
-                max_tokens=500,
-                temperature=0.1
-            )
-            
-            try:
-                eval_result = json.loads(response_eval.choices[0].message.content)
-                return eval_result
-            except:
-                return {
-                    "score": 7.0,
-                    "reasoning": "Could not parse evaluation",
-                    "needs_more_info": False,
-                    "suggestions": "Response appears adequate"
-                }
-                
-        except Exception as e:
-            print(f"Error in critic evaluation: {str(e)}")
+    @staticmethod
+    def _parse_evaluation(content: str) -> Dict:
+        try:
+            eval_result = json.loads(content)
+            return eval_result
+        except:
             return {
-                "score": 5.0,
-                "reasoning": "Evaluation failed",
+                "score": 7.0,
+                "reasoning": "Could not parse evaluation",
                 "needs_more_info": False,
-                "suggestions": "Unable to evaluate"
-            }
\ No newline at end of file
+                "suggestions": "Response appears adequate"
+            }
+
+    @staticmethod
+    def _failed_evaluation() -> Dict:
+        return {
+            "score": 5.0,
+            "reasoning": "Evaluation failed",
+            "needs_more_info": False,
+            "suggestions": "Unable to evaluate"
+        }
+
+    def evaluate_response(self, query: str, response: str, 
+                         vector_context: List[Dict], web_context: List[Dict]) -> Dict:
+        """Evaluate response quality and provide score"""
+        started = time.time()
+        with span("critic") as current:
+            try:
+                critic_prompt = self._build_prompt(query, response, vector_context, web_context)
+
+                response_eval = self.policy.call(
+                    self.client.chat.completions.create,
+                    messages=[{"role": "user", "content": critic_prompt}],
+                    model=self.model,
+                    max_tokens=500,
+                    temperature=0.1
+                )
+                current.set(**llm_usage(response_eval))
+                
+                return self._parse_evaluation(response_eval.choices[0].message.content)
+                    
+            except Exception as e:
+                print(f"Error in critic evaluation: {str(e)}")
+                current.set(failed=True)
+                return self._failed_evaluation()
+
+            finally:
+                self.stats.record_critique(time.time() - started)
+
+
+class AsyncCriticAgent(CriticAgent):
+    """CriticAgent for the async serving mode, on the shared connection pool"""
+
+    def __init__(self):
+        super().__init__()
+        self.client = AsyncGroq(api_key=os.getenv("GROQ_API_KEY"), http_client=get_async_client(),
+                                timeout=self.policy.timeout)
+
+    async def evaluate_response(self, query: str, response: str,
+                                vector_context: List[Dict], web_context: List[Dict]) -> Dict:
+        started = time.time()
+        with span("critic") as current:
+            try:
+                critic_prompt = self._build_prompt(query, response, vector_context, web_context)
+
+                response_eval = await self.policy.acall(lambda: self.client.chat.completions.create(
+                    messages=[{"role": "user", "content": critic_prompt}],
+                    model=self.model,
+                    max_tokens=500,
+                    temperature=0.1
+                ))
+                current.set(**llm_usage(response_eval))
+                
+                return self._parse_evaluation(response_eval.choices[0].message.content)
+                    
+            except Exception as e:
+                print(f"Error in critic evaluation: {str(e)}")
+                current.set(failed=True)
+                return self._failed_evaluation()
+
+            finally:
+                self.stats.record_critique(time.time() - started)
\ No newline at end of file
@@ -0,0 +1,103 @@
+import os
+import hashlib
+import threading
+import numpy as np
+from typing import List, Optional
+from .file_lock import FileLock
+
+
+class EmbeddingDiskCache:
+    """Content-addressed embedding cache: a memory-mapped float32 matrix plus a digest index.
+
+    Row i of vectors.f32 belongs to the i-th 16-byte digest in index.bin. Both files are
+    append-only, so a re-index with unchanged text reads every vector straight from disk.
+    Readers ignore rows that are not in both files yet; writers append under a file lock and
+    first pick up rows other processes added, so several ingest runs can share the cache.
+    """
+
+    DIGEST_SIZE = 16
+
+    def __init__(self, cache_dir: str, dim: int):
+        self.cache_dir = cache_dir
+        self.dim = dim
+        self.vectors_path = os.path.join(cache_dir, "vectors.f32")
+        self.index_path = os.path.join(cache_dir, "index.bin")
+        self._lock = threading.Lock()
+        self._file_lock = FileLock(cache_dir.rstrip(os.sep) + ".lock")
+        self._rows = {}
+        self._size = 0  # Rows in the files, duplicates included
+        self._matrix = None
+        self._load()
+
+    @classmethod
+    def make_key(cls, text: str, model: str) -> bytes:
+        return hashlib.blake2b(f"{model}\0{text}".encode("utf-8"), digest_size=cls.DIGEST_SIZE).digest()
+
+    def _load(self, repair: bool = False):
+        #Read rows appended since the last load; the files only ever grow, so known rows stay valid
+        known = self._size
+        index = b""
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "rb") as f:
+                f.seek(known * self.DIGEST_SIZE)
+                index = f.read()
+        row_bytes = self.dim * 4
+        vector_rows = os.path.getsize(self.vectors_path) // row_bytes if os.path.exists(self.vectors_path) else 0
+        rows = max(known, min(known + len(index) // self.DIGEST_SIZE, vector_rows))
+
+        # A tail that is not in both files is a write in progress, or one that was interrupted.
+        # Only a writer holding the file lock knows it is the latter and cuts it off
+        if repair:
+            for path, size in ((self.index_path, rows * self.DIGEST_SIZE), (self.vectors_path, rows * row_bytes)):
+                if os.path.exists(path) and os.path.getsize(path) != size:
+                    with open(path, "r+b") as f:
+                        f.truncate(size)
+
+        for i in range(rows - known):
+            self._rows.setdefault(index[i * self.DIGEST_SIZE:(i + 1) * self.DIGEST_SIZE], known + i)
+        self._size = rows
+        self._remap(rows)
+
+    def _remap(self, rows: int):
+        if rows:
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        else:
+            self._matrix = None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get_many(self, keys: List[bytes]) -> List[Optional[np.ndarray]]:
+        with self._lock:
+            matrix = self._matrix
+            rows = [self._rows.get(key) for key in keys]
+        return [matrix[row] if row is not None else None for row in rows]
+
+    def put_many(self, keys: List[bytes], vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock, self._file_lock:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._load(repair=True)
+            new_keys = []
+            new_rows = []
+            seen = set()
+            for key, vector in zip(keys, vectors):
+                if key in self._rows or key in seen:
+                    continue
+                seen.add(key)
+                new_keys.append(key)
+                new_rows.append(vector)
+            if not new_keys:
+                return
+
+            # Vectors first, then the index: a crash in between leaves only unindexed rows
+            with open(self.vectors_path, "ab") as f:
+                f.write(np.ascontiguousarray(new_rows, dtype=np.float32).tobytes())
+            with open(self.index_path, "ab") as f:
+                f.write(b"".join(new_keys))
+
+            start = self._size
+            for offset, key in enumerate(new_keys):
+                self._rows[key] = start + offset
+            self._size += len(new_keys)
+            self._remap(self._size)
@@ -1,9 +1,46 @@
 import os
+import random
 import numpy as np
-from typing import List
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Dict, List, Optional
 from tqdm import tqdm
 import cohere
 import time
+from .cache import TTLCache, AsyncSingleFlight
+from .embedding_store import EmbeddingDiskCache
+from .lazy import Lazy
+from .rate_limit import TokenBucket
+from .batching import MicroBatcher
+from .http_pool import get_async_client
+from .metrics import span
+from .resilience import get_policy
+
+
+class EmbeddingError(Exception):
+    """Raised when some texts could not be embedded after all retries.
+
+    failed_indices are positions in the input; embeddings holds the rows that did succeed.
+    """
+
+    def __init__(self, message: str, failed_indices: List[int], embeddings: np.ndarray):
+        super().__init__(message)
+        self.failed_indices = failed_indices
+        self.embeddings = embeddings
+
+
+def is_rate_limited(error: Exception) -> bool:
+    return getattr(error, "http_status", None) == 429 or "rate limit" in str(error).lower()
+
+
+def retry_after(error: Exception, default: float = 10.0) -> float:
+    #Seconds to back off, from the Retry-After header when the API sent one
+    headers = getattr(error, "headers", None) or {}
+    try:
+        return max(0.0, float(headers.get("Retry-After") or headers.get("retry-after")))
+    except (TypeError, ValueError):
+        return default
+
 
 class EmbeddingManager:
     #Embeddings via cohere api
@@ -12,94 +49,213 @@ class EmbeddingManager:
         if not api_key:
             raise ValueError("COHERE_API_KEY required")
         
-        self.client = cohere.Client(api_key)
+        # Query embeddings go through the shared Cohere call policy; ingestion has its own retries,
+        # so the SDK's own (120 s, 3 retries) would only hold a policy slot after the deadline
+        self.policy = get_policy("cohere")
+        self.client = cohere.Client(api_key, max_retries=0, timeout=self.policy.timeout)
+        self.model = "embed-english-light-v3.0"
         self.embedding_dim = 384
+        
+        # Chunks that were embedded before are read back from disk; only document embedding
+        # opens the cache, so query-serving workers never touch it
+        self.disk_cache = Lazy(lambda: EmbeddingDiskCache(
+            os.getenv("EMBEDDING_CACHE_DIR", os.path.join(".cache", "embeddings")),
+            self.embedding_dim
+        ))
+        
+        # Repeat questions skip the embed call entirely
+        self.query_cache = TTLCache(
+            max_size=int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "10000")),
+            ttl=float(os.getenv("QUERY_EMBEDDING_CACHE_TTL", "86400"))
+        )
+        
+        # Document embedding follows the provider's limits: up to 96 texts per call
+        # and COHERE_EMBED_RPM calls per minute, a few calls in flight at once
+        self.batch_size = min(96, int(os.getenv("EMBED_BATCH_SIZE", "96")))
+        self.concurrency = int(os.getenv("EMBED_CONCURRENCY", "4"))
+        self.max_retries = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+        calls_per_second = float(os.getenv("COHERE_EMBED_RPM", "100")) / 60
+        self.limiter = TokenBucket(calls_per_second, capacity=max(1.0, float(self.concurrency)))
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="embed")
+        
+        # Concurrent query embeddings arriving within the window share one embed call
+        self.query_batcher = MicroBatcher(
+            self._embed_queries,
+            max_batch=min(96, int(os.getenv("QUERY_BATCH_MAX", "32"))),
+            window=float(os.getenv("QUERY_BATCH_WINDOW_MS", "5")) / 1000
+        )
+        # In the async mode, concurrent awaits of the same query share one call instead
+        self.async_in_flight = AsyncSingleFlight()
 
     def get_embeddings(self, texts: List[str]) -> np.ndarray:
-        #Generate embeddings for multiple texts
+        #Generate embeddings for multiple texts; raises EmbeddingError if some could not be created
         if isinstance(texts, str):
             texts = [texts]
         
-        print(f"Processing {len(texts)} texts...")
+        clean_texts = [text.strip()[:1500] if text.strip() else "empty" for text in texts]  # Reduced text length
+        cache_keys = [self.disk_cache.make_key(text, self.model) for text in clean_texts]
+        cached = self.disk_cache.get_many(cache_keys)
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        print(f"Embedding {len(texts)} texts: {len(texts) - len(missing)} cached, {len(missing)} to create")
         
-        all_embeddings = []
-        batch_size = 10  # Reduced batch size to avoid rate limits
+        embeddings = np.empty((len(texts), self.embedding_dim), dtype=np.float32)
+        for i, vector in enumerate(cached):
+            if vector is not None:
+                embeddings[i] = vector
         
-        for i in tqdm(range(0, len(texts), batch_size), desc="Creating embeddings"):
-            batch = texts[i:i + batch_size]
-            clean_batch = [text.strip()[:1500] if text.strip() else "empty" for text in batch]  # Reduced text length
-            
-            retry_count = 0
-            max_retries = 3
-            
-            while retry_count < max_retries:
-                try:
-                    response = self.client.embed(
-                        texts=clean_batch,
-                        model="embed-english-light-v3.0",
-                        input_type="search_document"
+        # Full-size batches run a few at a time; the token bucket keeps them within the quota
+        # and failed batches go back on the queue with backoff instead of becoming dummy vectors
+        queue = deque((missing[i:i + self.batch_size], 0) for i in range(0, len(missing), self.batch_size))
+        failed = []
+        
+        with tqdm(total=len(missing), desc="Creating embeddings", disable=len(missing) <= self.batch_size) as progress:
+            running = {}
+            while queue or running:
+                while queue and len(running) < self.concurrency:
+                    batch_indices, attempt = queue.popleft()
+                    future = self.executor.submit(
+                        self._embed_batch, [clean_texts[j] for j in batch_indices], attempt
                     )
-                    batch_embeddings = response.embeddings
-                    all_embeddings.extend(batch_embeddings)
-                    break  # Success, exit retry loop
+                    running[future] = (batch_indices, attempt)
+                
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch_indices, attempt = running.pop(future)
+                    try:
+                        batch_embeddings = future.result()
+                    except Exception as e:
+                        if attempt + 1 < self.max_retries:
+                            print(f"Embedding batch failed (attempt {attempt + 1}/{self.max_retries}), requeued: {e}")
+                            queue.append((batch_indices, attempt + 1))
+                        else:
+                            print(f"Embedding batch failed after {self.max_retries} attempts: {e}")
+                            failed.extend(batch_indices)
+                        continue
                     
-                except Exception as e:
-                    error_str = str(e)
-                    if "rate limit" in error_str.lower():
-                        wait_time = 60  # Wait 1 minute for rate limit
-                        print(f"\nRate limit hit. Waiting {wait_time} seconds...")
-                        time.sleep(wait_time)
-                        retry_count += 1
-                    else:
-                        print(f"Batch error: {e}")
-                        dummy_embeddings = [[0.0] * self.embedding_dim for _ in batch]
-                        all_embeddings.extend(dummy_embeddings)
-                        break
-            
-            if retry_count >= max_retries:
-                print(f"Max retries reached for batch {i}. Using dummy embeddings.")
-                dummy_embeddings = [[0.0] * self.embedding_dim for _ in batch]
-                all_embeddings.extend(dummy_embeddings)
-            
-            # Rate limiting between batches
-            time.sleep(2)  # Wait 2 seconds between batches
-        
-        embeddings = np.array(all_embeddings, dtype=np.float32)
+                    embeddings[batch_indices] = batch_embeddings
+                    self.disk_cache.put_many([cache_keys[j] for j in batch_indices], batch_embeddings)
+                    progress.update(len(batch_indices))
         
         # Normalize
         norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
         norms[norms == 0] = 1
         embeddings = embeddings / norms
         
-        print(f"Generated {len(embeddings)} embeddings with shape {embeddings.shape}")
+        if failed:
+            raise EmbeddingError(f"{len(failed)}/{len(texts)} texts could not be embedded", sorted(failed), embeddings)
         return embeddings
 
-    def get_query_embedding(self, query: str) -> np.ndarray:
-        #Generate embedding for a single query
+    def _embed_batch(self, texts: List[str], attempt: int) -> np.ndarray:
+        if attempt:
+            # Exponential backoff with jitter for requeued batches
+            time.sleep(min(30.0, 2 ** attempt) * (0.5 + random.random() / 2))
+        self.limiter.acquire()
         try:
             response = self.client.embed(
-                texts=[query.strip()[:1500]],
-                model="embed-english-light-v3.0",
-                input_type="search_query"
+                texts=texts,
+                model=self.model,
+                input_type="search_document"
             )
-            embedding = np.array(response.embeddings[0], dtype=np.float32)
-            return embedding / np.linalg.norm(embedding)
-            
         except Exception as e:
-            if "rate limit" in str(e).lower():
-                print("Rate limit hit for query. Waiting 30 seconds...")
-                time.sleep(30)
-                try:
-                    response = self.client.embed(
-                        texts=[query.strip()[:1500]],
-                        model="embed-english-light-v3.0",
-                        input_type="search_query"
-                    )
-                    embedding = np.array(response.embeddings[0], dtype=np.float32)
-                    return embedding / np.linalg.norm(embedding)
-                except:
-                    pass
+            if is_rate_limited(e):
+                # Everyone waits out the provider's retry-after, not just this batch
+                self.limiter.pause(retry_after(e))
+            raise
+        return np.array(response.embeddings, dtype=np.float32)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batch_size": self.batch_size,
+            "concurrency": self.concurrency,
+            "max_retries": self.max_retries,
+            **self.limiter.stats(),
+        }
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        #Cache key: case-folded, whitespace-collapsed, truncated like the embed input
+        return " ".join(query.split()).casefold()[:1500]
+
+    def _cache_query_embedding(self, key: str, embedding: np.ndarray) -> np.ndarray:
+        embedding = np.ascontiguousarray(embedding, dtype=np.float32)
+        embedding.setflags(write=False)  # Shared between requests
+        self.query_cache.put(key, embedding)
+        return embedding
+
+    def _embed_query(self, text: str) -> np.ndarray:
+        if self.query_batcher.window <= 0:
+            return self._embed_queries([text])[0]
+        return self.query_batcher.submit(text)
+
+    def _embed_queries(self, texts: List[str]) -> List[np.ndarray]:
+        #One embed call for a batch of query texts; duplicates are sent once
+        unique = list(dict.fromkeys(texts))
+        response = self.policy.call(
+            self.client.embed,
+            texts=unique,
+            model=self.model,
+            input_type="search_query",
+            hedge=True
+        )
+        vectors = np.array(response.embeddings, dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        rows = {text: row for row, text in enumerate(unique)}
+        return [vectors[rows[text]] for text in texts]
+
+    def try_query_embedding(self, query: str) -> Optional[np.ndarray]:
+        #Embedding for a single query, or None when the API call failed
+        with span("query_embedding") as current:
+            cache_key = self.normalize_query(query)
+            cached = self.query_cache.get(cache_key)
+            current.set(cache_hit=cached is not None)
+            if cached is not None:
+                return cached
+        
+            try:
+                embedding = self._embed_query(query.strip()[:1500])
+                return self._cache_query_embedding(cache_key, embedding)
+            
+            except Exception as e:
+                if is_rate_limited(e):
+                    # Instead of waiting inside the request, later queries skip Cohere until the retry-after passes
+                    self.policy.breaker.trip(retry_after(e))
             
-            print(f"Query embedding error: {e}")
-            dummy = np.random.rand(self.embedding_dim).astype(np.float32)
-            return dummy / np.linalg.norm(dummy)
\ No newline at end of file
+                print(f"Query embedding error: {e}")
+                current.set(failed=True)
+                return None
+
+    async def aquery_embedding(self, query: str) -> Optional[np.ndarray]:
+        #try_query_embedding for the async serving mode, on the shared connection pool
+        with span("query_embedding") as current:
+            cache_key = self.normalize_query(query)
+            cached = self.query_cache.get(cache_key)
+            current.set(cache_hit=cached is not None)
+            if cached is not None:
+                return cached
+        
+            async def embed():
+                response = await get_async_client().post(
+                    f"{os.getenv('CO_API_URL', cohere.COHERE_API_URL)}/v1/embed",
+                    headers={"Authorization": f"BEARER {self.client.api_key}"},
+                    json={"texts": [query.strip()[:1500]], "model": self.model, "input_type": "search_query"}
+                )
+                response.raise_for_status()
+                return response.json()
+        
+            try:
+                # The answer cache and the vector search ask for the same query at once
+                data = await self.async_in_flight.do(cache_key, lambda: self.policy.acall(embed, hedge=True))
+                embedding = np.array(data["embeddings"][0], dtype=np.float32)
+                return self._cache_query_embedding(cache_key, embedding / np.linalg.norm(embedding))
+            
+            except Exception as e:
+                print(f"Query embedding error: {e}")
+                current.set(failed=True)
+                return None
+
+    def get_query_embedding(self, query: str) -> np.ndarray:
+        #Generate embedding for a single query; raises EmbeddingError rather than searching with a made-up vector
+        embedding = self.try_query_embedding(query)
+        if embedding is None:
+            raise EmbeddingError("The query could not be embedded", [0], np.zeros((0, self.embedding_dim), dtype=np.float32))
+        return embedding
\ No newline at end of file
@@ -0,0 +1,35 @@
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock; a single writing process is assumed there
+    fcntl = None
+
+
+class FileLock:
+    """Exclusive flock on a lock file, keeping writers in different processes apart.
+
+    Re-entrant for its holder, so a locked method may call another; threads are expected to
+    serialise on the store's own lock first. The lock file sits next to the store, not inside
+    it, so dropping the store's directory does not remove it.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+        self._depth = 0
+
+    def __enter__(self):
+        if self._depth == 0 and fcntl is not None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
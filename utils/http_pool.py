@@ -0,0 +1,23 @@
+import os
+import httpx
+
+_async_client = None
+
+
+def get_async_client() -> httpx.AsyncClient:
+    #Keep-alive connection pool shared by every async upstream client in the process
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        pool_size = int(os.getenv("HTTP_POOL_SIZE", "200"))
+        _async_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            timeout=httpx.Timeout(float(os.getenv("HTTP_TIMEOUT", "60")), connect=5.0),
+        )
+    return _async_client
+
+
+async def close_async_client():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
@@ -0,0 +1,131 @@
+import os
+import re
+import asyncio
+from typing import Dict, List
+from .bm25 import BM25Index, query_terms
+from .metrics import span
+
+# Dosages, strengths and ICD-style codes: "500mg", "0.5", "e11.9", "j45"
+EXACT_TERM_PATTERN = re.compile(r"^(?:\d+(?:[./]\d+)*[a-z%]*|[a-z]\d{2}(?:\.\d+)?)$")
+# Units written apart from their number: "500 mg", "dose in mg/kg"
+UNIT_TERMS = frozenset("mg mcg ug g kg ml l iu units mmol mmhg mg/kg mg/ml mcg/kg".split())
+
+
+def exact_terms(query: str) -> frozenset:
+    #Numbers, codes and units in the query: two questions that differ in one ask for different answers
+    return frozenset(term for term in query_terms(query) if EXACT_TERM_PATTERN.match(term) or term in UNIT_TERMS)
+
+
+class HybridRetriever:
+    """Fuses BM25 lexical hits with dense vector hits using reciprocal-rank fusion"""
+
+    def __init__(self, vector_db, lexical_index: BM25Index, rrf_k: int = 60, rare_term_fraction: float = None):
+        self.vector_db = vector_db
+        self.lexical_index = lexical_index
+        self.rrf_k = rrf_k
+        # Terms in at most this share of the chunks (drug names, rare conditions) count as exact terms
+        self.rare_term_fraction = (rare_term_fraction if rare_term_fraction is not None
+                                   else float(os.getenv("LEXICAL_RARE_TERM_FRACTION", "0.002")))
+        self.lexical_only_queries = 0
+        self.fused_queries = 0
+
+    @staticmethod
+    def _key(result: Dict):
+        return (result.get("source"), result.get("page"), result.get("chunk_id"))
+
+    def is_rare_term(self, term: str) -> bool:
+        return self.lexical_index.document_fraction(term) <= self.rare_term_fraction
+
+    def key_terms(self, query: str) -> frozenset:
+        #exact_terms plus rare terms such as drug names
+        return exact_terms(query) | frozenset(term for term in query_terms(query) if self.is_rare_term(term))
+
+    def _is_exact_term_query(self, terms: List[str], lexical_hits: List) -> bool:
+        #Queries naming a code, dosage or rare term, with every term in the best lexical hit.
+        #Short queries of common words ("asthma treatment") still go to dense search
+        if not terms or not lexical_hits:
+            return False
+        _, _, _, matched = lexical_hits[0]
+        if len(matched) < len(terms):
+            return False
+        return any(
+            EXACT_TERM_PATTERN.match(term) or self.is_rare_term(term)
+            for term in terms
+        )
+
+    def _lexical_results(self, query: str, limit: int):
+        #Lexical hits shaped like vector results, and whether they answer the query on their own
+        terms = query_terms(query)
+        with span("lexical_search") as current:
+            lexical_hits = self.lexical_index.search(query, limit=limit * 2)
+            # The index keeps no text; hits whose chunk is gone are dropped like dense ones
+            texts = self.vector_db.get_texts([point_id for point_id, _, _, _ in lexical_hits]) if lexical_hits else []
+            lexical_hits = [hit for hit, text in zip(lexical_hits, texts) if text]
+            texts = [text for text in texts if text]
+            current.set(results=len(lexical_hits))
+        top_lexical = lexical_hits[0][2] if lexical_hits else 1.0
+        lexical_results = [
+            {
+                "text": text,
+                "source": doc["source"],
+                # score stays a cosine similarity for the critic's checks; BM25 has none to offer
+                "score": 0.0,
+                "lexical_score": score / top_lexical,  # Relative to the best hit
+                "page": doc["page"],
+                "chunk_id": doc["chunk_id"],
+                "retrieval": "lexical",
+            }
+            for (_, doc, score, _), text in zip(lexical_hits, texts)
+        ]
+
+        # Drug names, dosages and codes are answered from the local index alone
+        exact = self._is_exact_term_query(terms, lexical_hits)
+        if exact:
+            self.lexical_only_queries += 1
+        else:
+            self.fused_queries += 1
+        return lexical_results, exact
+
+    def _fuse(self, dense_results: List[Dict], lexical_results: List[Dict], limit: int) -> List[Dict]:
+        fused = {}
+        for retrieval, results in (("dense", dense_results), ("lexical", lexical_results)):
+            for rank, result in enumerate(results):
+                key = self._key(result)
+                entry = fused.get(key)
+                if entry is None:
+                    entry = fused[key] = {**result, "retrieval": retrieval, "rrf_score": 0.0}
+                else:
+                    entry["retrieval"] = "both"
+                entry["rrf_score"] += 1.0 / (self.rrf_k + rank + 1)
+
+        ranked = sorted(fused.values(), key=lambda entry: entry["rrf_score"], reverse=True)
+        return ranked[:limit]
+
+    def search(self, query: str, limit: int = 5) -> List[Dict]:
+        lexical_results, exact = self._lexical_results(query, limit)
+        if exact:
+            return lexical_results[:limit]
+
+        dense_results = self.vector_db.search_similar(query, limit=limit * 2)
+        return self._fuse(dense_results, lexical_results, limit)
+
+    async def asearch(self, query: str, async_vector_db, limit: int = 5) -> List[Dict]:
+        #Same as search, with the dense half awaited on an AsyncVectorDatabase. BM25 scoring and
+        #the chunk store reads block, so the lexical half runs in a worker thread
+        lexical_results, exact = await asyncio.to_thread(self._lexical_results, query, limit)
+        if exact:
+            return lexical_results[:limit]
+
+        dense_results = await async_vector_db.search_similar(query, limit=limit * 2)
+        return self._fuse(dense_results, lexical_results, limit)
+
+    def stats(self) -> Dict:
+        return {
+            "documents": len(self.lexical_index),
+            "lexical_only_queries": self.lexical_only_queries,
+            "fused_queries": self.fused_queries,
+        }
+
+
+def create_lexical_index(collection_name: str) -> BM25Index:
+    return BM25Index(os.path.join(os.getenv("LEXICAL_INDEX_DIR", os.path.join(".cache", "bm25")), collection_name))
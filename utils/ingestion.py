@@ -0,0 +1,225 @@
+import os
+import json
+import hashlib
+import threading
+from typing import Dict, Any, List
+from .pipeline import IngestionPipeline
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def page_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class IngestionManifest:
+    """Records what has been ingested: file hashes, per-page content hashes and point IDs"""
+
+    def __init__(self, path: str, collection_name: str):
+        self.path = path
+        self.collection_name = collection_name
+        self.files = {}
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            # A manifest written for another collection says nothing about this one
+            if data.get("collection") == self.collection_name:
+                self.files = data.get("files", {})
+        except Exception as e:
+            print(f"Could not read ingestion manifest, starting fresh: {e}")
+            self.files = {}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"collection": self.collection_name, "files": self.files}, f)
+        os.replace(tmp_path, self.path)
+
+    def reset(self):
+        self.files = {}
+
+    def file_entry(self, source: str) -> Dict[str, Any]:
+        return self.files.setdefault(source, {"sha256": None, "pages": {}})
+
+
+class IncrementalIngestor:
+    """Brings the vector collection in line with the PDFs, touching only added, changed or removed pages.
+
+    Changed pages stream through an IngestionPipeline. The manifest doubles as the checkpoint:
+    a page is recorded as soon as its points are stored, so an interrupted run resumes where it
+    stopped instead of starting over.
+    """
+
+    def __init__(self, doc_processor, text_chunker, vector_db, manifest_path: str = None,
+                 checkpoint_every: int = 25, lexical_index=None):
+        self.doc_processor = doc_processor
+        self.text_chunker = text_chunker
+        self.vector_db = vector_db
+        self.lexical_index = lexical_index
+        self.manifest = IngestionManifest(
+            manifest_path or os.getenv("INGEST_MANIFEST_PATH", os.path.join(".cache", "ingest_manifest.json")),
+            vector_db.collection_name
+        )
+        self.pipeline = IngestionPipeline(text_chunker, vector_db)
+        self.checkpoint_every = checkpoint_every
+        self.pipeline_stats = None  # Stage timings of the last sync
+        self._lock = threading.Lock()
+
+    def sync(self) -> Dict[str, int]:
+        stats = {"unchanged_pages": 0, "updated_pages": 0, "removed_pages": 0, "failed_pages": 0}
+
+        if not self.vector_db.create_collection():
+            raise RuntimeError("Vector collection is not available")
+
+        # An emptied or recreated collection invalidates everything the manifest remembers
+        if self.manifest.files and self.vector_db.get_collection_count() == 0:
+            print("Collection is empty; ignoring the previous ingestion manifest")
+            self.manifest.reset()
+
+        # The lexical index is built from chunk text, so it needs one full pass to catch up
+        if self.lexical_index is not None and self.manifest.files and len(self.lexical_index) == 0:
+            print("Lexical index is missing; re-ingesting all pages (embeddings come from the cache)")
+            self.manifest.reset()
+
+        # Points only carry chunk IDs once the chunk store is on, so a missing store means re-ingesting
+        chunk_store = self.vector_db.chunk_store
+        if chunk_store is not None and self.manifest.files and len(chunk_store) == 0:
+            print("Chunk store is missing; re-ingesting all pages (embeddings come from the cache)")
+            self.manifest.reset()
+
+        # Per-file state of this run: file hash, hashes of the pages seen, and whether all went well
+        self._runs = {}
+        self._stats = stats
+        self._since_checkpoint = 0
+
+        self.pipeline_stats = self.pipeline.run(self._changed_pages(), self._commit_page, self._fail_page)
+
+        for pdf_file, run in self._runs.items():
+            self._finish_file(pdf_file, run)
+        self.manifest.save()
+        self.vector_db.optimize()
+        if self.lexical_index is not None:
+            self.lexical_index.build()
+            self.lexical_index.save()
+
+        print(
+            f"Ingestion done: {stats['updated_pages']} pages updated, {stats['removed_pages']} removed, "
+            f"{stats['unchanged_pages']} unchanged, {stats['failed_pages']} failed"
+        )
+        return stats
+
+    def _changed_pages(self):
+        #Yield the pages that are new or whose text changed since the last run
+        for pdf_file in self.doc_processor.pdf_files:
+            pdf_path = os.path.join(self.doc_processor.data_folder, pdf_file)
+            if not os.path.exists(pdf_path):
+                if pdf_file in self.manifest.files:
+                    print(f"{pdf_file} was removed, deleting its points...")
+                    self._remove_file(pdf_file)
+                else:
+                    print(f"File not found: {pdf_path}")
+                continue
+
+            digest = file_sha256(pdf_path)
+            with self._lock:
+                entry = self.manifest.files.get(pdf_file)
+                if entry and entry["sha256"] == digest:
+                    self._stats["unchanged_pages"] += len(entry["pages"])
+                    print(f"{pdf_file} unchanged, skipping")
+                    continue
+                known_pages = self.manifest.file_entry(pdf_file)["pages"]
+
+            if entry is None:
+                # Points stored before the manifest existed have random IDs and cannot be matched
+                self.vector_db.delete_source(pdf_file)
+                if self.lexical_index is not None:
+                    self.lexical_index.remove_source(pdf_file)
+
+            print(f"Processing {pdf_file}...")
+            run = {"sha256": digest, "pages": {}, "complete": True}
+            self._runs[pdf_file] = run
+            try:
+                for doc in self.doc_processor.iter_pdf_pages(pdf_file):
+                    page_key = str(doc.metadata["page"])
+                    run["pages"][page_key] = page_hash(doc.page_content)
+                    with self._lock:
+                        known = known_pages.get(page_key)
+                    if known and known["hash"] == run["pages"][page_key]:
+                        self._stats["unchanged_pages"] += 1
+                    else:
+                        yield doc
+            except Exception as e:
+                print(f"Error processing {pdf_file}: {str(e)}")
+                run["complete"] = False
+
+    def _commit_page(self, doc, chunks: List[Dict], point_ids: List[str]):
+        #Called from the pipeline's upload stage once every chunk of the page is stored
+        pdf_file = doc.metadata["source"]
+        page_key = str(doc.metadata["page"])
+        with self._lock:
+            known_pages = self.manifest.file_entry(pdf_file)["pages"]
+            old_ids = set(known_pages.get(page_key, {}).get("point_ids", []))
+
+        # Chunks whose text changed got new IDs; drop the ones they replace
+        stale = list(old_ids - set(point_ids))
+        if self.lexical_index is not None:
+            self.lexical_index.remove(stale)
+            for point_id, chunk in zip(point_ids, chunks):
+                self.lexical_index.add(point_id, chunk)
+        if not self.vector_db.delete_points(stale):
+            # Keep tracking them so a later change or removal of the page cleans them up
+            point_ids = point_ids + stale
+            self._runs[pdf_file]["complete"] = False
+
+        with self._lock:
+            known_pages[page_key] = {"hash": page_hash(doc.page_content), "point_ids": point_ids}
+            self._stats["updated_pages"] += 1
+            self._since_checkpoint += 1
+            if self._since_checkpoint >= self.checkpoint_every:
+                self.manifest.save()
+                self._since_checkpoint = 0
+
+    def _fail_page(self, doc):
+        with self._lock:
+            self._runs[doc.metadata["source"]]["complete"] = False
+            self._stats["failed_pages"] += 1
+
+    def _finish_file(self, pdf_file: str, run: Dict[str, Any]):
+        known_pages = self.manifest.file_entry(pdf_file)["pages"]
+
+        # Pages that no longer exist (or are now empty); skipped if extraction did not finish
+        if run["complete"]:
+            for page_key in [key for key in known_pages if key not in run["pages"]]:
+                if self.vector_db.delete_points(known_pages[page_key]["point_ids"]):
+                    if self.lexical_index is not None:
+                        self.lexical_index.remove(known_pages[page_key]["point_ids"])
+                    del known_pages[page_key]
+                    self._stats["removed_pages"] += 1
+
+        # Only a fully ingested file is marked as done; otherwise the next run retries what is missing
+        done = run["complete"] and set(known_pages) == set(run["pages"])
+        self.manifest.files[pdf_file]["sha256"] = run["sha256"] if done else None
+
+    def _remove_file(self, pdf_file: str):
+        with self._lock:
+            pages = self.manifest.files[pdf_file]["pages"]
+            point_ids = [point_id for page in pages.values() for point_id in page["point_ids"]]
+        if self.vector_db.delete_points(point_ids):
+            if self.lexical_index is not None:
+                self.lexical_index.remove(point_ids)
+            with self._lock:
+                self._stats["removed_pages"] += len(pages)
+                del self.manifest.files[pdf_file]
+                self.manifest.save()
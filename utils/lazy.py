@@ -0,0 +1,53 @@
+import threading
+from typing import Any, Callable
+
+_UNBUILT = object()
+
+
+class Lazy:
+    """Stands in for a component and builds it on first use, exactly once.
+
+    Attribute reads and writes, len() and bool() go to the built object, so module-level
+    names like vector_db work as before. Threads that hit an unbuilt component at the same
+    time wait on its lock instead of building it twice.
+    """
+    __slots__ = ("_factory", "_target", "_lock")
+
+    def __init__(self, factory: Callable[[], Any]):
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_target", _UNBUILT)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def _resolve(self) -> Any:
+        target = self._target
+        if target is _UNBUILT:
+            with self._lock:
+                target = self._target
+                if target is _UNBUILT:
+                    target = self._factory()
+                    object.__setattr__(self, "_target", target)
+        return target
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._resolve(), name)
+
+    def __setattr__(self, name: str, value: Any):
+        setattr(self._resolve(), name, value)
+
+    def __len__(self) -> int:
+        return len(self._resolve())
+
+    def __bool__(self) -> bool:
+        return bool(self._resolve())
+
+    def __repr__(self):
+        return f"Lazy({self._target!r})" if self._target is not _UNBUILT else f"Lazy(unbuilt {self._factory!r})"
+
+
+def is_built(component: Any) -> bool:
+    return not isinstance(component, Lazy) or component._target is not _UNBUILT
+
+
+def build(component: Any) -> Any:
+    #The component itself, built now if it was still pending
+    return component._resolve() if isinstance(component, Lazy) else component
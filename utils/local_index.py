@@ -0,0 +1,457 @@
+import os
+import json
+import shutil
+import threading
+import numpy as np
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+from .embeddings import EmbeddingManager
+from .qdrant_db import VectorDatabase
+from .chunk_store import create_chunk_store
+from .file_lock import FileLock
+
+
+class LocalVectorIndex:
+    """In-process cosine index: a memory-mapped float32 matrix plus a JSON-lines payload side store.
+
+    Rows are append-only; upserting an existing ID or deleting it only clears its live flag,
+    and compact() rewrites the files once enough dead rows pile up. Search is exact top-k over
+    the whole matrix, or an IVF (k-means coarse quantizer) probe when mode="ivf".
+
+    Readers only see the rows meta.npz describes and reload it when another process saved a new
+    one. Writes take a file lock and first reload meta.npz too, so ingest.py can run next to the
+    servers. Data files are appended to or replaced by a rename, never rewritten in place: a
+    reader keeps its map and file handle of the version it loaded.
+    """
+
+    SCORE_BLOCK = 65536  # Rows scored per matrix product, to bound temporary memory
+
+    def __init__(self, path: str, dim: int, mode: str = "exact", nlist: int = None, nprobe: int = 8):
+        self.path = path
+        self.dim = dim
+        self.mode = mode
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.vectors_path = os.path.join(path, "vectors.f32")
+        self.payloads_path = os.path.join(path, "payloads.jsonl")
+        self.meta_path = os.path.join(path, "meta.npz")
+        self.ivf_path = os.path.join(path, "ivf.npz")
+        self._lock = threading.RLock()
+        self._file_lock = FileLock(path.rstrip(os.sep) + ".lock")
+        self._reset_state()
+        self._refresh()
+
+    def _reset_state(self):
+        self._ids: List[str] = []
+        self._row_of: Dict[str, int] = {}
+        self._live = np.zeros(0, dtype=bool)
+        self._offsets = np.zeros(1, dtype=np.int64)  # Payload i lives at [offsets[i], offsets[i + 1])
+        self._sources: List[str] = []
+        self._pages = np.zeros(0, dtype=np.int32)
+        self._matrix = None
+        self._payloads = None  # Open handle of payloads.jsonl, of the same version as the map
+        self._ivf = None
+        self._version = None  # meta.npz as last loaded or saved here
+
+    # ---- storage -------------------------------------------------------------
+
+    def exists(self) -> bool:
+        return os.path.exists(self.meta_path)
+
+    def create(self):
+        with self._writing():
+            self._replace_files(np.zeros((0, self.dim), dtype=np.float32), [])
+            self._reset_state()
+            self._save_meta()
+            self._remap()
+
+    def drop(self):
+        with self._writing():
+            shutil.rmtree(self.path, ignore_errors=True)
+            self._reset_state()
+
+    def _load(self):
+        with np.load(self.meta_path, allow_pickle=False) as meta:
+            self._ids = [str(point_id) for point_id in meta["ids"]]
+            self._live = meta["live"].astype(bool)
+            self._offsets = meta["offsets"].astype(np.int64)
+            self._sources = [str(source) for source in meta["sources"]]
+            self._pages = meta["pages"].astype(np.int32)
+        self._row_of = {point_id: row for row, point_id in enumerate(self._ids) if self._live[row]}
+        self._version = self._meta_version()
+        self._remap()
+
+        if os.path.exists(self.ivf_path):
+            with np.load(self.ivf_path, allow_pickle=False) as ivf:
+                self._ivf = {key: ivf[key] for key in ivf.files}
+
+    def _meta_version(self):
+        try:
+            stat = os.stat(self.meta_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _refresh(self):
+        #Load meta.npz again if another process saved it; under the file lock, so a writer is
+        #never caught between replacing the data files and saving their meta
+        if self._meta_version() == self._version:
+            return
+        with self._lock, self._file_lock:
+            if self._meta_version() != self._version:
+                self._reset_state()
+                if self.exists():
+                    self._load()
+
+    @contextmanager
+    def _writing(self):
+        with self._lock, self._file_lock:
+            self._refresh()
+            # Appends that were not followed by a meta save were left by an interrupted writer
+            for path, size in ((self.vectors_path, len(self._ids) * self.dim * 4),
+                               (self.payloads_path, int(self._offsets[-1]))):
+                if os.path.exists(path) and os.path.getsize(path) > size:
+                    with open(path, "r+b") as f:
+                        f.truncate(size)
+            yield
+
+    def _save_meta(self):
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = os.path.join(self.path, "meta.tmp.npz")
+        np.savez(
+            tmp_path,
+            ids=np.array(self._ids, dtype=str),
+            live=self._live,
+            offsets=self._offsets,
+            sources=np.array(self._sources, dtype=str),
+            pages=self._pages,
+        )
+        os.replace(tmp_path, self.meta_path)
+        self._version = self._meta_version()
+
+    def _replace_files(self, vectors: np.ndarray, encoded: List[bytes]):
+        #New data files are renamed over the old ones; truncating a file another process has
+        #mapped would crash that process with SIGBUS
+        os.makedirs(self.path, exist_ok=True)
+        for path, data in ((self.vectors_path, vectors.tobytes()), (self.payloads_path, b"".join(encoded))):
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+    def _remap(self):
+        rows = len(self._ids)
+        if rows:
+            # Plain ndarray view over the map: skips memmap subclass overhead on every slice
+            self._matrix = np.asarray(
+                np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+            )
+        else:
+            self._matrix = None
+        # The previous handle is only dropped, not closed: a search may still be reading from it
+        self._payloads = open(self.payloads_path, "rb") if os.path.exists(self.payloads_path) else None
+
+    def count(self) -> int:
+        self._refresh()
+        return int(self._live.sum())
+
+    def upsert(self, ids: List[str], vectors, payloads: List[Dict[str, Any]]):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        vectors = vectors / norms
+
+        with self._writing():
+            encoded = [json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n" for payload in payloads]
+            with open(self.vectors_path, "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self.payloads_path, "ab") as f:
+                f.write(b"".join(encoded))
+
+            start = len(self._ids)
+            self._ids.extend(ids)
+            self._live = np.concatenate([self._live, np.ones(len(ids), dtype=bool)])
+            for offset, point_id in enumerate(ids):
+                # The previous row of an upserted ID (possibly earlier in this batch) is retired
+                old_row = self._row_of.get(point_id)
+                if old_row is not None:
+                    self._live[old_row] = False
+                self._row_of[point_id] = start + offset
+            lengths = np.fromiter((len(line) for line in encoded), dtype=np.int64, count=len(encoded))
+            self._offsets = np.concatenate([self._offsets, self._offsets[-1] + np.cumsum(lengths)])
+            self._sources.extend(str(payload.get("source", "")) for payload in payloads)
+            self._pages = np.concatenate([
+                self._pages, np.array([int(payload.get("page", 0)) for payload in payloads], dtype=np.int32)
+            ])
+            self._save_meta()
+            self._remap()
+
+    def delete(self, ids: List[str]):
+        with self._writing():
+            changed = False
+            for point_id in ids:
+                row = self._row_of.pop(point_id, None)
+                if row is not None:
+                    self._live[row] = False
+                    changed = True
+            if changed:
+                self._save_meta()
+
+    def delete_where(self, source: str):
+        with self._writing():
+            changed = False
+            for row, row_source in enumerate(self._sources):
+                if row_source == source and self._live[row]:
+                    self._live[row] = False
+                    self._row_of.pop(self._ids[row], None)
+                    changed = True
+            if changed:
+                self._save_meta()
+
+    def _payload_line(self, row: int) -> bytes:
+        start, end = int(self._offsets[row]), int(self._offsets[row + 1])
+        return os.pread(self._payloads.fileno(), end - start, start)
+
+    def payload(self, row: int) -> Dict[str, Any]:
+        return json.loads(self._payload_line(row))
+
+    def compact(self):
+        #Write the live rows to new files and rename them into place
+        with self._writing():
+            rows = np.flatnonzero(self._live)
+            if len(rows) == len(self._ids):
+                return
+            vectors = np.array(self._matrix[rows]) if len(rows) else np.zeros((0, self.dim), dtype=np.float32)
+            encoded = [self._payload_line(row) for row in rows]
+            ids = [self._ids[row] for row in rows]
+            sources = [self._sources[row] for row in rows]
+            pages = self._pages[rows]
+
+            self._replace_files(vectors, encoded)
+            if os.path.exists(self.ivf_path):
+                os.remove(self.ivf_path)
+            self._reset_state()
+            self._ids = ids
+            self._row_of = {point_id: row for row, point_id in enumerate(ids)}
+            self._live = np.ones(len(ids), dtype=bool)
+            lengths = np.fromiter((len(line) for line in encoded), dtype=np.int64, count=len(encoded))
+            self._offsets = np.concatenate([np.zeros(1, dtype=np.int64), np.cumsum(lengths)])
+            self._sources = sources
+            self._pages = pages
+            self._save_meta()
+            self._remap()
+
+    # ---- search --------------------------------------------------------------
+
+    def _mask(self, source: Optional[str], page: Optional[int]) -> np.ndarray:
+        mask = self._live.copy()
+        if source is not None:
+            mask &= np.array([row_source == source for row_source in self._sources], dtype=bool)
+        if page is not None:
+            mask &= self._pages == page
+        return mask
+
+    def _top_k(self, rows: np.ndarray, scores: np.ndarray, limit: int) -> List[Tuple[int, float]]:
+        if len(rows) == 0:
+            return []
+        k = min(limit, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(rows[i]), float(scores[i])) for i in top]
+
+    def _exact(self, query: np.ndarray, mask: np.ndarray, limit: int) -> List[Tuple[int, float]]:
+        matrix = self._matrix
+        scores = np.empty(len(mask), dtype=np.float32)
+        for start in range(0, len(mask), self.SCORE_BLOCK):
+            scores[start:start + self.SCORE_BLOCK] = matrix[start:start + self.SCORE_BLOCK] @ query
+        rows = np.flatnonzero(mask)
+        return self._top_k(rows, scores[rows], limit)
+
+    def _probe(self, query: np.ndarray, mask: np.ndarray, limit: int) -> List[Tuple[int, float]]:
+        ivf = self._ivf
+        centroids, order, bounds = ivf["centroids"], ivf["order"], ivf["bounds"]
+        nprobe = min(self.nprobe, len(centroids))
+        probe = np.argpartition(-(centroids @ query), nprobe - 1)[:nprobe]
+        candidates = [order[bounds[c]:bounds[c + 1]] for c in probe]
+        # Rows appended since the last build are not in any list yet; score them exactly
+        candidates.append(np.arange(int(ivf["built_rows"]), len(mask)))
+        rows = np.concatenate(candidates)
+        rows = np.sort(rows[mask[rows]])  # Sorted rows read the memory map sequentially
+        scores = np.asarray(self._matrix[rows] @ query, dtype=np.float32)
+        return self._top_k(rows, scores, limit)
+
+    def build_ivf(self, nlist: int = None, iterations: int = 10):
+        #Spherical k-means over the live vectors; inverted lists are stored as one sorted row array
+        with self._writing():
+            rows = np.flatnonzero(self._live)
+            if len(rows) == 0:
+                return
+            vectors = np.asarray(self._matrix[rows])
+            nlist = min(nlist or self.nlist or max(1, int(np.sqrt(len(rows)))), len(rows))
+            rng = np.random.default_rng(0)
+            centroids = vectors[rng.choice(len(rows), nlist, replace=False)].copy()
+            for _ in range(iterations):
+                assign = np.argmax(vectors @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, assign, vectors)
+                norms = np.linalg.norm(sums, axis=1, keepdims=True)
+                filled = norms[:, 0] > 0
+                centroids[filled] = sums[filled] / norms[filled]
+
+            assign = np.argmax(vectors @ centroids.T, axis=1)
+            by_list = np.argsort(assign, kind="stable")
+            self._ivf = {
+                "centroids": centroids.astype(np.float32),
+                "order": rows[by_list],
+                "bounds": np.searchsorted(assign[by_list], np.arange(nlist + 1)),
+                "built_rows": np.int64(len(self._ids)),
+            }
+            tmp_path = os.path.join(self.path, "ivf.tmp.npz")
+            np.savez(tmp_path, **self._ivf)
+            os.replace(tmp_path, self.ivf_path)
+
+    def _ivf_is_stale(self) -> bool:
+        if self._ivf is None:
+            return True
+        # Rebuild once a tenth of the rows were added after the last build
+        return len(self._ids) - int(self._ivf["built_rows"]) > max(1000, len(self._ids) // 10)
+
+    def get_payloads(self, ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+        self._refresh()
+        with self._lock:
+            rows = [self._row_of.get(str(point_id)) for point_id in ids]
+            return [None if row is None else self.payload(row) for row in rows]
+
+    def search(self, vector, limit: int = 5, source: Optional[str] = None,
+               page: Optional[int] = None) -> List[Tuple[str, float, Dict[str, Any]]]:
+        query = np.asarray(vector, dtype=np.float32).reshape(self.dim)
+        query = query / (np.linalg.norm(query) or 1.0)
+        self._refresh()
+        if self._matrix is None:
+            return []
+        if self.mode == "ivf" and self._ivf_is_stale():
+            self.build_ivf()
+
+        with self._lock:
+            mask = self._mask(source, page)
+            if self.mode == "ivf" and self._ivf is not None:
+                hits = self._probe(query, mask, limit)
+            else:
+                hits = self._exact(query, mask, limit)
+            # Rows and payloads of the same version: a reload may follow right after the lock
+            return [(self._ids[row], score, self.payload(row)) for row, score in hits]
+
+    def search_batch(self, vectors, limit: int = 5) -> List[List[Tuple[str, float, Dict[str, Any]]]]:
+        #Score several queries with one matrix-matrix product per block (exact mode)
+        queries = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        queries = queries / norms
+        self._refresh()
+        if self._matrix is None:
+            return [[] for _ in queries]
+
+        with self._lock:
+            rows = np.flatnonzero(self._live)
+            matrix = self._matrix
+            scores = np.empty((len(queries), len(self._ids)), dtype=np.float32)
+            for start in range(0, len(self._ids), self.SCORE_BLOCK):
+                scores[:, start:start + self.SCORE_BLOCK] = queries @ matrix[start:start + self.SCORE_BLOCK].T
+            hits = [self._top_k(rows, query_scores[rows], limit) for query_scores in scores]
+            return [[(self._ids[row], score, self.payload(row)) for row, score in query_hits] for query_hits in hits]
+
+
+class LocalVectorDatabase(VectorDatabase):
+    """VectorDatabase backed by an in-process LocalVectorIndex instead of a remote Qdrant"""
+
+    def __init__(self):
+        self.client = None
+        self.collection_name = os.getenv("QDRANT_COLLECTION_NAME", "Medical")
+        self.embedding_manager = EmbeddingManager()
+        self.vector_size = 384
+        self.index = LocalVectorIndex(
+            os.path.join(os.getenv("LOCAL_INDEX_DIR", os.path.join(".cache", "local_index")), self.collection_name),
+            self.vector_size,
+            mode=os.getenv("LOCAL_INDEX_MODE", "exact").lower(),
+            nlist=int(os.getenv("LOCAL_INDEX_NLIST", "0")) or None,
+            nprobe=int(os.getenv("LOCAL_INDEX_NPROBE", "8"))
+        )
+        self.chunk_store = create_chunk_store(self.collection_name)
+
+    def check_collection_exists(self) -> bool:
+        return self.index.exists()
+
+    def get_collection_count(self) -> int:
+        return self.index.count()
+
+    def reset_collection(self):
+        print(f"Resetting local index '{self.collection_name}'...")
+        self.index.drop()
+        if self.chunk_store is not None:
+            self.chunk_store.clear()
+        return self.create_collection()
+
+    def create_collection(self):
+        try:
+            if not self.index.exists():
+                self.index.create()
+                print(f"Local index '{self.collection_name}' created with {self.vector_size} dimensions")
+            return True
+        except Exception as e:
+            print(f"Error creating local index: {e}")
+            return False
+
+    def upsert_points(self, points, batch_size: int = 100) -> List[str]:
+        try:
+            self.index.upsert(
+                [str(point.id) for point in points],
+                [point.vector for point in points],
+                [point.payload for point in points]
+            )
+            return [point.id for point in points]
+        except Exception as e:
+            print(f"Local index upsert error: {e}")
+            return []
+
+    def delete_points(self, point_ids: List[str]) -> bool:
+        if not point_ids:
+            return True
+        try:
+            self.index.delete([str(point_id) for point_id in point_ids])
+            if self.chunk_store is not None:
+                self.chunk_store.delete(point_ids)
+            return True
+        except Exception as e:
+            print(f"Error deleting points: {e}")
+            return False
+
+    def delete_source(self, source: str) -> bool:
+        #Delete every point that came from one source file
+        try:
+            self.index.delete_where(source)
+            if self.chunk_store is not None:
+                self.chunk_store.delete_where(source)
+            return True
+        except Exception as e:
+            print(f"Error deleting points for {source}: {e}")
+            return False
+
+    def optimize(self):
+        #Drop dead rows once they are a third of the file, and refresh the IVF lists
+        dead = len(self.index._ids) - self.index.count()
+        if dead and dead * 3 >= len(self.index._ids):
+            self.index.compact()
+        if self.index.mode == "ivf":
+            self.index.build_ivf()
+        self.compact_chunk_store()
+
+    def get_payloads(self, point_ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+        return self.index.get_payloads(point_ids)
+
+    def search_by_vector(self, query_embedding, limit: int = 5, source: str = None, page: int = None) -> List[Dict]:
+        try:
+            hits = self.index.search(query_embedding, limit, source=source, page=page)
+            return self.format_results(hits)
+        except Exception as e:
+            print(f"Search error: {e}")
+            return []
@@ -0,0 +1,253 @@
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+SIZE_BUCKETS = [0, 1, 2, 3, 5, 10, 20, 50]
+
+
+class Histogram:
+    """Thread-safe histogram with fixed upper bounds; counts are cumulative like Prometheus buckets"""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self._counts[i] += 1
+                    break
+            else:
+                self._counts[-1] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            cumulative, running = {}, 0
+            for bound, count in zip(self.buckets + ["+Inf"], self._counts):
+                running += count
+                cumulative[str(bound)] = running
+            return {
+                "buckets": cumulative,
+                "count": self._count,
+                "sum": self._sum,
+                "mean": self._sum / self._count if self._count else 0.0,
+            }
+
+
+class Counter:
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+
+class MetricFamily:
+    """A named metric with one child per combination of label values"""
+
+    def __init__(self, name: str, help: str, kind: str, labelnames: Sequence[str], factory: Callable[[], Any]):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self._factory = factory
+        self._children: Dict[tuple, Any] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **labels) -> Any:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._factory())
+        return child
+
+    def children(self):
+        return list(self._children.items())
+
+
+def _label_text(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Registry:
+    """Holds metric families and renders them in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self._families: Dict[str, MetricFamily] = {}
+        self._gauges: Dict[str, tuple] = {}  # name -> (help, callback, labelnames, kind)
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> MetricFamily:
+        return self._families.setdefault(name, MetricFamily(name, help, "counter", labelnames, Counter))
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS,
+                  labelnames: Sequence[str] = ()) -> MetricFamily:
+        return self._families.setdefault(
+            name, MetricFamily(name, help, "histogram", labelnames, lambda: Histogram(buckets))
+        )
+
+    def register_histogram(self, name: str, help: str, histogram: Histogram):
+        #Export a histogram that is owned elsewhere (e.g. a component's internal stats)
+        family = MetricFamily(name, help, "histogram", (), lambda: histogram)
+        family.labels()
+        self._families[name] = family
+
+    def gauge(self, name: str, help: str, callback: Callable[[], Any], labelnames: Sequence[str] = ()):
+        #A value read at scrape time; with labelnames the callback returns {label values tuple: value}
+        self._gauges[name] = (help, callback, tuple(labelnames), "gauge")
+
+    def counter_callback(self, name: str, help: str, callback: Callable[[], Any], labelnames: Sequence[str] = ()):
+        #Like gauge(), for running totals a component already keeps; name them with a _total suffix
+        self._gauges[name] = (help, callback, tuple(labelnames), "counter")
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for family in list(self._families.values()):
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            for values, child in family.children():
+                if family.kind == "counter":
+                    lines.append(f"{family.name}{_label_text(family.labelnames, values)} {child.value}")
+                    continue
+                snapshot = child.snapshot()
+                for bound, count in snapshot["buckets"].items():
+                    labels = _label_text(family.labelnames, values, f'le="{bound}"')
+                    lines.append(f"{family.name}_bucket{labels} {count}")
+                labels = _label_text(family.labelnames, values)
+                lines.append(f"{family.name}_sum{labels} {snapshot['sum']}")
+                lines.append(f"{family.name}_count{labels} {snapshot['count']}")
+
+        for name, (help, callback, labelnames, kind) in list(self._gauges.items()):
+            try:
+                values = callback() if labelnames else {(): callback()}
+                samples = [(_label_text(labelnames, key), float(value)) for key, value in values.items()]
+            except Exception:
+                continue
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{name}{labels} {value}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.histogram(
+    "medbot_stage_seconds", "Time spent in each pipeline stage", labelnames=("stage",)
+)
+STAGE_ERRORS = REGISTRY.counter(
+    "medbot_stage_errors_total", "Pipeline stage calls that raised", labelnames=("stage",)
+)
+STAGE_RESULTS = REGISTRY.histogram(
+    "medbot_stage_results", "Number of results returned by each stage", SIZE_BUCKETS, labelnames=("stage",)
+)
+LLM_TOKENS = REGISTRY.counter(
+    "medbot_llm_tokens_total", "Prompt and completion tokens reported by the LLM", labelnames=("stage", "kind")
+)
+
+
+# ---- spans ------------------------------------------------------------------
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("trace", default=None)
+SPAN_LISTENERS: List[Callable] = []
+
+
+class Trace:
+    """Per-request waterfall: every span finished while the trace is current, with its offset from the start"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._spans = []
+        self._lock = threading.Lock()
+
+    def add(self, name: str, started: float, seconds: float, attrs: Dict[str, Any], error: bool):
+        with self._lock:
+            self._spans.append({
+                "stage": name,
+                "start_ms": round((started - self.started) * 1000, 1),
+                "duration_ms": round(seconds * 1000, 1),
+                "error": error,
+                **attrs,
+            })
+
+    def waterfall(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return sorted(self._spans, key=lambda item: item["start_ms"])
+
+
+class Span:
+    __slots__ = ("name", "attrs")
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+def set_trace(trace: Optional[Trace]):
+    #Make trace current for this thread or task; pass None to stop collecting
+    _current_trace.set(trace)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time a pipeline stage into the stage metrics and the current request's trace.
+
+    Known attributes are also exported: results (a size histogram), prompt_tokens and
+    completion_tokens (token counters) and failed (the error counter). Everything else
+    only appears in the waterfall.
+    """
+    current = Span(name, dict(attrs))
+    started = time.perf_counter()
+    error = False
+    try:
+        yield current
+    except Exception:
+        error = True
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        error = error or bool(current.attrs.pop("failed", False))  # Stages that swallow their errors set failed=True
+        STAGE_SECONDS.labels(stage=name).observe(seconds)
+        if error:
+            STAGE_ERRORS.labels(stage=name).inc()
+        if "results" in current.attrs:
+            STAGE_RESULTS.labels(stage=name).observe(current.attrs["results"])
+        for kind in ("prompt", "completion"):
+            tokens = current.attrs.get(f"{kind}_tokens")
+            if tokens:
+                LLM_TOKENS.labels(stage=name, kind=kind).inc(tokens)
+
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(name, started, seconds, current.attrs, error)
+        for listener in SPAN_LISTENERS:
+            listener(name, seconds, current.attrs, error)
+
+
+def add_span_listener(listener: Callable[[str, float, Dict[str, Any], bool], None]):
+    #Called with (stage, seconds, attrs, error) for every finished span, e.g. to keep raw samples
+    SPAN_LISTENERS.append(listener)
+
+
+def submit_in_context(executor, fn, *args):
+    #executor.submit that carries the caller's trace into the worker thread
+    return executor.submit(contextvars.copy_context().run, fn, *args)
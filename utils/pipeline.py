@@ -0,0 +1,169 @@
+import os
+import time
+import queue
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+from .embeddings import EmbeddingError
+
+_DONE = object()
+
+
+class IngestionPipeline:
+    """Streams pages through chunking, embedding and upload, with bounded queues between the stages.
+
+    Stage 1 (caller's thread) pulls pages from the extractor and chunks them, stage 2 embeds
+    batches of whole pages and stage 3 upserts them. Each page is reported through on_commit
+    only once all of its points are stored, which is what makes interrupted runs resumable.
+    The stages share one stats dict and update it through _count() and _timed(), under a lock.
+    """
+
+    def __init__(self, text_chunker, vector_db, batch_chunks: int = None, queue_size: int = None):
+        self.text_chunker = text_chunker
+        self.vector_db = vector_db
+        self.batch_chunks = batch_chunks or int(os.getenv("INGEST_BATCH_CHUNKS", "96"))
+        self.queue_size = queue_size or int(os.getenv("INGEST_QUEUE_SIZE", "4"))
+        self._stats_lock = threading.Lock()
+
+    def _count(self, stats: Dict[str, Any], **amounts: int):
+        with self._stats_lock:
+            for key, amount in amounts.items():
+                stats[key] += amount
+
+    def _timed(self, stats: Dict[str, Any], stage: str, started: float):
+        with self._stats_lock:
+            stats["stage_seconds"][stage] += time.time() - started
+
+    def run(self, pages: Iterable, on_commit: Callable[[Any, List[Dict], List[str]], None],
+            on_failure: Callable[[Any], None]) -> Dict[str, Any]:
+        stats = {
+            "pages": 0, "chunks": 0, "committed_pages": 0, "failed_pages": 0,
+            "stage_seconds": {"extract_chunk": 0.0, "embed": 0.0, "upload": 0.0},
+        }
+        embed_queue = queue.Queue(maxsize=self.queue_size)
+        upload_queue = queue.Queue(maxsize=self.queue_size)
+
+        workers = [
+            threading.Thread(target=self._embed_stage, args=(embed_queue, upload_queue, on_failure, stats),
+                             name="ingest-embed", daemon=True),
+            threading.Thread(target=self._upload_stage, args=(upload_queue, on_commit, on_failure, stats),
+                             name="ingest-upload", daemon=True),
+        ]
+        for worker in workers:
+            worker.start()
+
+        start_time = time.time()
+        try:
+            self._chunk_stage(pages, embed_queue, stats)
+        finally:
+            embed_queue.put(_DONE)
+            for worker in workers:
+                worker.join()
+
+        stats["wall_seconds"] = time.time() - start_time
+        stage_seconds = stats["stage_seconds"]
+        print(
+            f"Pipeline: {stats['committed_pages']}/{stats['pages']} pages, {stats['chunks']} chunks in "
+            f"{stats['wall_seconds']:.1f}s (extract+chunk {stage_seconds['extract_chunk']:.1f}s, "
+            f"embed {stage_seconds['embed']:.1f}s, upload {stage_seconds['upload']:.1f}s)"
+        )
+        return stats
+
+    def _chunk_stage(self, pages: Iterable, embed_queue: queue.Queue, stats: Dict[str, Any]):
+        batch: List[Tuple[Any, List[Dict]]] = []
+        batch_size = 0
+        pages = iter(pages)
+
+        while True:
+            started = time.time()
+            page = next(pages, _DONE)
+            if page is _DONE:
+                break
+            chunks = self.text_chunker.chunk_documents([page])
+            self._timed(stats, "extract_chunk", started)
+            self._count(stats, pages=1, chunks=len(chunks))
+
+            batch.append((page, chunks))
+            batch_size += len(chunks)
+            if batch_size >= self.batch_chunks:
+                embed_queue.put(batch)  # Blocks while the embedder is behind
+                batch, batch_size = [], 0
+
+        if batch:
+            embed_queue.put(batch)
+
+    def _embed_stage(self, embed_queue: queue.Queue, upload_queue: queue.Queue,
+                     on_failure: Callable, stats: Dict[str, Any]):
+        while True:
+            batch = embed_queue.get()
+            if batch is _DONE:
+                upload_queue.put(_DONE)
+                return
+
+            started = time.time()
+            try:
+                chunks = [chunk for _, page_chunks in batch for chunk in page_chunks]
+                try:
+                    embeddings = self.vector_db.embedding_manager.get_embeddings([chunk["text"] for chunk in chunks])
+                except EmbeddingError as e:
+                    print(f"Embedding stage: {e}")
+                    batch, chunks, embeddings = self._drop_failed(batch, e, on_failure, stats)
+                if batch:
+                    points = self.vector_db.build_points(chunks, embeddings)
+                    upload_queue.put((batch, points))
+            except Exception as e:
+                print(f"Embedding stage error: {e}")
+                self._fail(batch, on_failure, stats)
+            finally:
+                self._timed(stats, "embed", started)
+
+    def _upload_stage(self, upload_queue: queue.Queue, on_commit: Callable,
+                      on_failure: Callable, stats: Dict[str, Any]):
+        while True:
+            item = upload_queue.get()
+            if item is _DONE:
+                return
+
+            batch, points = item
+            started = time.time()
+            try:
+                stored = set(self.vector_db.upsert_points(points))
+            except Exception as e:
+                print(f"Upload stage error: {e}")
+                stored = set()
+
+            for page, chunks in batch:
+                point_ids = [self.vector_db.point_id_for(chunk) for chunk in chunks]
+                if not all(point_id in stored for point_id in point_ids):
+                    self._fail([(page, chunks)], on_failure, stats)
+                    continue
+                try:
+                    on_commit(page, chunks, point_ids)
+                    self._count(stats, committed_pages=1)
+                except Exception as e:
+                    print(f"Commit callback error: {e}")
+                    self._count(stats, failed_pages=1)
+            self._timed(stats, "upload", started)
+
+    def _drop_failed(self, batch, error: EmbeddingError, on_failure: Callable, stats: Dict[str, Any]):
+        #Fails the pages that have an unembedded chunk and keeps the rest of the batch going
+        failed = set(error.failed_indices)
+        kept, rows, offset = [], [], 0
+        for page, chunks in batch:
+            page_rows = range(offset, offset + len(chunks))
+            offset += len(chunks)
+            if failed.intersection(page_rows):
+                self._fail([(page, chunks)], on_failure, stats)
+            else:
+                kept.append((page, chunks))
+                rows.extend(page_rows)
+
+        chunks = [chunk for _, page_chunks in kept for chunk in page_chunks]
+        return kept, chunks, error.embeddings[rows]
+
+    def _fail(self, batch, on_failure: Callable, stats: Dict[str, Any]):
+        for page, _ in batch:
+            try:
+                on_failure(page)
+            except Exception as e:
+                print(f"Failure callback error: {e}")
+            self._count(stats, failed_pages=1)
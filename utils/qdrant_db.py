@@ -1,35 +1,80 @@
 import os
 import time
+import asyncio
 import uuid
-from typing import List, Dict, Any
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
+import hashlib
+from typing import List, Dict, Any, Optional
+from qdrant_client import QdrantClient, AsyncQdrantClient
+from qdrant_client.http.exceptions import UnexpectedResponse
+from qdrant_client.models import (
+    PointStruct, PointIdsList, FilterSelector,
+    Filter, FieldCondition, MatchValue
+)
 from .embeddings import EmbeddingManager
+from .metrics import span
+from .resilience import get_policy
+from .collection_profiles import PAYLOAD_INDEXES, get_collection_profile
+from .chunk_store import create_chunk_store
+
+
+def make_point_id(source: str, page: int, chunk_id: int, text: str) -> str:
+    #Deterministic point ID: the same chunk text at the same position always maps to the same point
+    text_hash = hashlib.sha1(text.encode("utf-8")).hexdigest()
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{source}/{page}/{chunk_id}/{text_hash}"))
+
+
+def qdrant_connection() -> Dict[str, Any]:
+    #QdrantClient arguments: QDRANT_URL=":memory:" or QDRANT_PATH select Qdrant's local mode
+    if os.getenv("QDRANT_PATH"):
+        return {"path": os.getenv("QDRANT_PATH")}
+    if os.getenv("QDRANT_URL") == ":memory:":
+        return {"location": ":memory:"}
+    # Remote calls give up with the call policy's deadline instead of holding its slot
+    return {"url": os.getenv("QDRANT_URL"), "api_key": os.getenv("QDRANT_API_KEY"),
+            "timeout": get_policy("qdrant").timeout}
+
+
+def search_filter(source: str = None, page: int = None):
+    conditions = []
+    if source is not None:
+        conditions.append(FieldCondition(key="source", match=MatchValue(value=source)))
+    if page is not None:
+        conditions.append(FieldCondition(key="page", match=MatchValue(value=page)))
+    return Filter(must=conditions) if conditions else None
+
 
 class VectorDatabase:
     def __init__(self):
-        self.client = QdrantClient(
-            url=os.getenv("QDRANT_URL"),
-            api_key=os.getenv("QDRANT_API_KEY")
-        )
+        self.client = QdrantClient(**qdrant_connection())
         self.collection_name = os.getenv("QDRANT_COLLECTION_NAME", "Medical")
         self.embedding_manager = EmbeddingManager()
         self.vector_size = 384 
+        self.profile = get_collection_profile()
+        self.chunk_store = create_chunk_store(self.collection_name)
+
+    def _collection_info(self):
+        #One round trip: the collection's info, or None when it does not exist
+        try:
+            return self.client.get_collection(self.collection_name)
+        except UnexpectedResponse as e:
+            if e.status_code == 404:
+                return None
+            raise
+        except ValueError:
+            # Local mode raises ValueError for a missing collection
+            return None
 
     def check_collection_exists(self) -> bool:
         try:
-            collections = self.client.get_collections().collections
-            return any(col.name == self.collection_name for col in collections)
+            return self._collection_info() is not None
         except Exception as e:
             print(f"Error checking collection: {e}")
             return False
 
     def get_collection_count(self) -> int:
         try:
-            if self.check_collection_exists():
-                info = self.client.get_collection(self.collection_name)
-                return info.points_count
-            return 0
+            info = self._collection_info()
+            return info.points_count if info is not None else 0
         except Exception as e:
             print(f"Error getting collection count: {e}")
             return 0
@@ -41,6 +86,8 @@ class VectorDatabase:
                 print(f"Deleting existing collection '{self.collection_name}'...")
                 self.client.delete_collection(self.collection_name)
                 time.sleep(2)
+            if self.chunk_store is not None:
+                self.chunk_store.clear()
             
             print(f"Creating new collection with {self.vector_size} dimensions...")
             return self.create_collection()
@@ -51,118 +98,311 @@ class VectorDatabase:
     def create_collection(self):
         #Create collection if missing
         try:
-            if self.check_collection_exists():
-                try:
-                    info = self.client.get_collection(self.collection_name)
-                    if info.points_count > 0:
-                        print(f"Collection '{self.collection_name}' already exists with {info.points_count} documents")
-                        return True
-                    else:
-                        print(f"Collection '{self.collection_name}' exists but is empty")
-                except Exception as e:
-                    print(f"Error checking collection details: {e}")
-                    print("Deleting existing collection...")
-                    self.client.delete_collection(self.collection_name)
-                    time.sleep(2)
+            try:
+                info = self._collection_info()
+            except Exception as e:
+                print(f"Error checking collection details: {e}")
+                print("Deleting existing collection...")
+                self.client.delete_collection(self.collection_name)
+                time.sleep(2)
+                info = None
+            if info is not None:
+                if info.points_count > 0:
+                    print(f"Collection '{self.collection_name}' already exists with {info.points_count} documents")
+                else:
+                    print(f"Collection '{self.collection_name}' exists but is empty")
+                # Collections created before the payload indexes existed get them now
+                self.create_payload_indexes()
+                return True
             
-            print(f"Creating collection with {self.vector_size} dimensions...")
+            print(f"Creating collection with {self.vector_size} dimensions ({self.profile.name} profile)...")
             self.client.create_collection(
                 collection_name=self.collection_name,
-                vectors_config=VectorParams(
-                    size=self.vector_size,
-                    distance=Distance.COSINE
-                )
+                **self.profile.collection_config(self.vector_size)
             )
+            self.create_payload_indexes()
             print(f"Collection '{self.collection_name}' created with {self.vector_size} dimensions")
             return True
         except Exception as e:
             print(f"Error creating collection: {e}")
             return False
 
+    def create_payload_indexes(self):
+        #Indexes on the filter fields, so filtered searches and deletes by source skip the full scan
+        for field_name, field_schema in PAYLOAD_INDEXES.items():
+            try:
+                self.client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name=field_name,
+                    field_schema=field_schema
+                )
+            except Exception as e:
+                print(f"Error creating payload index on {field_name}: {e}")
+
     def store_documents(self, documents: List[Dict[str, Any]]) -> bool:
         try:
-            print(f"Storing {len(documents)} documents...")
-            
-            # Get embeddings
-            texts = [doc["text"] for doc in documents]
-            embeddings = self.embedding_manager.get_embeddings(texts)
-
-            # Prepare points
-            points = []
-            for i, (doc, embedding) in enumerate(zip(documents, embeddings)):
-                point_id = str(uuid.uuid4())
-                
-                # Ensure embedding is the right format
-                if hasattr(embedding, 'tolist'):
-                    vector = embedding.tolist()
-                else:
-                    vector = list(embedding)
-                
-                point = PointStruct(
-                    id=point_id,
-                    vector=vector,
-                    payload={
-                        "text": doc["text"],
-                        "source": doc.get("source", ""),
-                        "page": doc.get("page", 0),
-                        "chunk_id": doc.get("chunk_id", i),
-                        "doc_id": doc.get("id", i)
-                    }
-                )
-                points.append(point)
+            return len(self.upsert_documents(documents)) > 0
+        except Exception as e:
+            print(f"Error storing documents: {e}")
+            return False
 
-            # Upload in batches
-            batch_size = 100
-            successful = 0
-            
-            for i in range(0, len(points), batch_size):
-                batch = points[i:i + batch_size]
-                try:
-                    self.client.upsert(
-                        collection_name=self.collection_name,
-                        points=batch
-                    )
-                    successful += len(batch)
-                    print(f"Uploaded batch {i//batch_size + 1}: {successful}/{len(points)} points")
-                    time.sleep(0.1)
-                except Exception as e:
-                    print(f"Batch upload error: {e}")
-                    continue
+    @staticmethod
+    def point_id_for(doc: Dict[str, Any], index: int = 0) -> str:
+        return make_point_id(doc.get("source", ""), doc.get("page", 0), doc.get("chunk_id", index), doc["text"])
+
+    def upsert_documents(self, documents: List[Dict[str, Any]]) -> List[str]:
+        #Embed and upsert documents; returns the IDs of the points that were stored
+        print(f"Storing {len(documents)} documents...")
+        
+        # Get embeddings
+        texts = [doc["text"] for doc in documents]
+        embeddings = self.embedding_manager.get_embeddings(texts)
+
+        points = self.build_points(documents, embeddings)
+        stored_ids = self.upsert_points(points)
+        
+        print(f"Successfully stored {len(stored_ids)}/{len(points)} documents")
+        return stored_ids
+
+    def build_points(self, documents: List[Dict[str, Any]], embeddings) -> List[PointStruct]:
+        point_ids = [self.point_id_for(doc, i) for i, doc in enumerate(documents)]
+
+        # Chunk text goes to the local chunk store; points then carry only IDs and filter fields
+        if self.chunk_store is not None:
+            self.chunk_store.put_many(
+                point_ids, [doc["text"] for doc in documents], [doc.get("source", "") for doc in documents]
+            )
+
+        points = []
+        for i, (doc, embedding) in enumerate(zip(documents, embeddings)):
+            chunk_id = doc.get("chunk_id", i)
             
-            print(f"Successfully stored {successful}/{len(points)} documents")
-            return successful > 0
+            # Ensure embedding is the right format
+            if hasattr(embedding, 'tolist'):
+                vector = embedding.tolist()
+            else:
+                vector = list(embedding)
             
+            payload = {
+                "source": doc.get("source", ""),
+                "page": doc.get("page", 0),
+                "chunk_id": chunk_id,
+                "doc_id": doc.get("id", i)
+            }
+            if self.chunk_store is None:
+                payload["text"] = doc["text"]
+            points.append(PointStruct(id=point_ids[i], vector=vector, payload=payload))
+        return points
+
+    def upsert_points(self, points: List[PointStruct], batch_size: int = 100) -> List[str]:
+        #Upload in batches; returns the IDs of the points that were stored
+        stored_ids = []
+        
+        for i in range(0, len(points), batch_size):
+            batch = points[i:i + batch_size]
+            try:
+                self.client.upsert(
+                    collection_name=self.collection_name,
+                    points=batch
+                )
+                stored_ids.extend(point.id for point in batch)
+            except Exception as e:
+                print(f"Batch upload error: {e}")
+                continue
+        
+        return stored_ids
+
+    def delete_points(self, point_ids: List[str]) -> bool:
+        if not point_ids:
+            return True
+        try:
+            self.client.delete(
+                collection_name=self.collection_name,
+                points_selector=PointIdsList(points=list(point_ids))
+            )
+            if self.chunk_store is not None:
+                self.chunk_store.delete(point_ids)
+            return True
         except Exception as e:
-            print(f"Error storing documents: {e}")
+            print(f"Error deleting points: {e}")
             return False
 
-    def search_similar(self, query: str, limit: int = 5) -> List[Dict]:
+    def delete_source(self, source: str) -> bool:
+        #Delete every point that came from one source file
+        try:
+            self.client.delete(
+                collection_name=self.collection_name,
+                points_selector=FilterSelector(
+                    filter=search_filter(source=source)
+                )
+            )
+            if self.chunk_store is not None:
+                self.chunk_store.delete_where(source)
+            return True
+        except Exception as e:
+            print(f"Error deleting points for {source}: {e}")
+            return False
+
+    def optimize(self):
+        #Backend housekeeping after ingestion; Qdrant optimizes segments on its own
+        self.compact_chunk_store()
+
+    def compact_chunk_store(self):
+        #Rewrite the chunk store once a third of its entries are deleted or replaced
+        if self.chunk_store is not None and self.chunk_store.dead_fraction() >= 1 / 3:
+            self.chunk_store.compact()
+
+    def search_similar(self, query: str, limit: int = 5, source: str = None, page: int = None) -> List[Dict]:
+        try:
+            query_embedding = self.embedding_manager.try_query_embedding(query)
+            if query_embedding is None:
+                return []
+            with span("vector_search") as current:
+                results = self.search_by_vector(query_embedding, limit, source=source, page=page)
+                current.set(results=len(results))
+            return results
+        except Exception as e:
+            print(f"Search error: {e}")
+            return []
+
+    def search_by_vector(self, query_embedding, limit: int = 5, source: str = None, page: int = None) -> List[Dict]:
         try:
-            query_embedding = self.embedding_manager.get_query_embedding(query)
-            
             if hasattr(query_embedding, 'tolist'):
                 query_vector = query_embedding.tolist()
             else:
                 query_vector = list(query_embedding)
             
-            results = self.client.search(
+            # Searches are idempotent, so slow ones may be hedged (QDRANT_HEDGE_MS)
+            results = get_policy("qdrant").call(
+                self.client.search,
                 collection_name=self.collection_name,
                 query_vector=query_vector,
+                query_filter=search_filter(source, page),
+                search_params=self.profile.search_params(),
                 limit=limit,
-                with_payload=True
+                with_payload=True,
+                hedge=True
             )
             
-            return [
-                {
-                    "text": r.payload.get("text", ""),
-                    "source": r.payload.get("source", ""),
-                    "score": float(r.score),
-                    "page": r.payload.get("page", 0),
-                    "chunk_id": r.payload.get("chunk_id", -1)
-                }
-                for r in results
-            ]
+            return self.format_results([(r.id, float(r.score), r.payload) for r in results])
             
         except Exception as e:
             print(f"Search error: {e}")
-            return []
\ No newline at end of file
+            return []
+
+    def get_payloads(self, point_ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+        #Stored payloads by point ID, None for points that are gone
+        records = get_policy("qdrant").call(
+            self.client.retrieve,
+            collection_name=self.collection_name,
+            ids=list(point_ids),
+            with_payload=True,
+            with_vectors=False,
+            hedge=True
+        )
+        payloads = {str(record.id): record.payload for record in records}
+        return [payloads.get(str(point_id)) for point_id in point_ids]
+
+    def get_texts(self, point_ids: List[str]) -> List[Optional[str]]:
+        #Chunk texts by point ID: from the chunk store, or the payload of older points; None if in neither
+        if self.chunk_store is not None:
+            texts = self.chunk_store.get_many([str(point_id) for point_id in point_ids])
+        else:
+            texts = [None] * len(point_ids)
+        missing = [i for i, text in enumerate(texts) if text is None]
+        if missing:
+            try:
+                payloads = self.get_payloads([point_ids[i] for i in missing])
+            except Exception as e:
+                print(f"Could not read payloads: {e}")
+                payloads = [None] * len(missing)
+            for i, payload in zip(missing, payloads):
+                texts[i] = (payload or {}).get("text") or None
+        return texts
+
+    def format_results(self, hits) -> List[Dict]:
+        #hits are (point_id, score, payload); the text comes from the chunk store, or the payload of older points.
+        #A hit whose text is in neither is dropped rather than sent to the LLM empty
+        if self.chunk_store is not None:
+            texts = self.chunk_store.get_many([str(point_id) for point_id, _, _ in hits])
+        else:
+            texts = [None] * len(hits)
+        results = []
+        for (point_id, score, payload), text in zip(hits, texts):
+            if text is None:
+                text = payload.get("text")
+            if not text:
+                print(f"No text for point {point_id}, skipping it")
+                continue
+            results.append(self.format_result(score, payload, text))
+        return results
+
+    @staticmethod
+    def format_result(score: float, payload: Dict[str, Any], text: str) -> Dict:
+        return {
+            "text": text,
+            "source": payload.get("source", ""),
+            "score": score,
+            "page": payload.get("page", 0),
+            "chunk_id": payload.get("chunk_id", -1)
+        }
+
+
+class AsyncVectorDatabase:
+    """Async search over a VectorDatabase's collection for the async serving mode.
+
+    Ingestion and collection management stay on the sync instance; this only serves queries.
+    """
+
+    def __init__(self, vector_db: VectorDatabase):
+        self.vector_db = vector_db
+        self.collection_name = vector_db.collection_name
+        self.embedding_manager = vector_db.embedding_manager
+        self.client = None
+        connection = qdrant_connection()
+        # A local-mode Qdrant lives inside the sync client, so it is searched through it like the local backend
+        if vector_db.client is not None and "url" in connection:
+            self.client = AsyncQdrantClient(**connection)
+
+    async def search_similar(self, query: str, limit: int = 5, source: str = None, page: int = None) -> List[Dict]:
+        try:
+            query_embedding = await self.embedding_manager.aquery_embedding(query)
+            if query_embedding is None:
+                return []
+            with span("vector_search") as current:
+                results = await self.search_by_vector(query_embedding, limit, source=source, page=page)
+                current.set(results=len(results))
+            return results
+        except Exception as e:
+            print(f"Search error: {e}")
+            return []
+
+    async def search_by_vector(self, query_embedding, limit: int = 5, source: str = None,
+                               page: int = None) -> List[Dict]:
+        if self.client is None:
+            # In-process index: plain numpy work, kept off the event loop
+            return await asyncio.to_thread(self.vector_db.search_by_vector, query_embedding, limit, source, page)
+
+        try:
+            results = await get_policy("qdrant").acall(lambda: self.client.search(
+                collection_name=self.collection_name,
+                query_vector=query_embedding.tolist() if hasattr(query_embedding, 'tolist') else list(query_embedding),
+                query_filter=search_filter(source, page),
+                search_params=self.vector_db.profile.search_params(),
+                limit=limit,
+                with_payload=True
+            ), hedge=True)
+            
+            return self.vector_db.format_results([(r.id, float(r.score), r.payload) for r in results])
+            
+        except Exception as e:
+            print(f"Search error: {e}")
+            return []
+
+
+def create_vector_database() -> VectorDatabase:
+    #Pick the vector backend: hosted Qdrant (default) or the in-process local index
+    if os.getenv("VECTOR_BACKEND", "qdrant").lower() == "local":
+        from .local_index import LocalVectorDatabase
+        return LocalVectorDatabase()
+    return VectorDatabase()
@@ -0,0 +1,63 @@
+import time
+import threading
+from typing import Any, Dict, Optional
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at `rate` tokens per second, holding at most `capacity`.
+
+    pause() empties the bucket and holds every caller back until the given delay has passed,
+    which is how a provider's retry-after is honoured by all workers at once.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.pauses = 0
+        self.waited_seconds = 0.0
+
+    def _reserve(self, tokens: float) -> float:
+        #Takes the tokens and returns 0, or returns how long to wait before trying again
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return 0.0
+        return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1.0, timeout: Optional[float] = None) -> bool:
+        started = time.monotonic()
+        deadline = None if timeout is None else started + timeout
+        while True:
+            with self._lock:
+                wait = self._reserve(tokens)
+                if wait == 0.0:
+                    self.acquired += 1
+                    self.waited_seconds += time.monotonic() - started
+                    return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+            self.pauses += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rate_per_second": self.rate,
+            "capacity": self.capacity,
+            "acquired": self.acquired,
+            "pauses": self.pauses,
+            "waited_seconds": self.waited_seconds,
+        }
@@ -1,63 +1,103 @@
 import os
 import re
-import fitz  
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import fitz
+
+# Page markers and "n / m" counters are dropped, runs of dots become "..."; whitespace is collapsed afterwards
+CLEAN_PATTERN = re.compile(r'(?i:\bPage\s*\d+\b)|\b\d+\s*/\s*\d+\b|\.{3,}')
+
+
+def clean_page_text(text):
+    #Clean and normalize text in one regex pass plus a whitespace collapse
+    text = CLEAN_PATTERN.sub(lambda m: '...' if m.group()[0] == '.' else '', text)
+    return ' '.join(text.split())
+
+
+def extract_page_range(pdf_path, start, end):
+    #Extract and clean pages [start, end) of a PDF; runs inside worker processes
+    pages = []
+    with fitz.open(pdf_path) as doc:
+        for page_num in range(start, end):
+            text = doc.load_page(page_num).get_text()
+            if text.strip():  # Only add non-empty pages
+                cleaned_text = clean_page_text(text)
+                if cleaned_text:
+                    pages.append((page_num + 1, cleaned_text))
+    return pages
+
+
+class SimpleDoc:
+    # Create a document-like object
+    __slots__ = ("page_content", "metadata")
+
+    def __init__(self, content, metadata):
+        self.page_content = content
+        self.metadata = metadata
+
 
 class DocumentProcessor:
-    def __init__(self, data_folder: str = "data"):
+    def __init__(self, data_folder: str = "data", workers: int = None, pages_per_task: int = 32):
         self.data_folder = data_folder
         self.pdf_files = [
             "Standard_Treatment_Guidelines.pdf",
             "The_Gale_Encyclopedia_Of_Medicine.pdf"
         ]
+        self.workers = workers or int(os.getenv("PDF_EXTRACT_WORKERS", os.cpu_count() or 1))
+        self.pages_per_task = pages_per_task
 
     def clean_text(self, text):
         #Clean and normalize text
-        text = re.sub(r'\s+', ' ', text).strip()
-        text = re.sub(r'\bPage\s*\d+\b', '', text, flags=re.IGNORECASE)
-        text = re.sub(r'\b\d+\s*/\s*\d+\b', '', text)
-        text = re.sub(r'\f', ' ', text)
-        text = re.sub(r'\.{3,}', '...', text)
-        return re.sub(r'\s+', ' ', text).strip()
+        return clean_page_text(text)
+
+    def iter_pdf_pages(self, pdf_file):
+        #Yield the cleaned, non-empty pages of one PDF in page order
+        pdf_path = os.path.join(self.data_folder, pdf_file)
+        with fitz.open(pdf_path) as doc:
+            page_count = len(doc)
+
+        ranges = [
+            (start, min(start + self.pages_per_task, page_count))
+            for start in range(0, page_count, self.pages_per_task)
+        ]
+
+        if self.workers <= 1 or len(ranges) <= 1:
+            for start, end in ranges:
+                for page_num, text in extract_page_range(pdf_path, start, end):
+                    yield SimpleDoc(text, {'source': pdf_file, 'page': page_num})
+            return
+
+        # Page ranges are spread over a process pool; a bounded window of
+        # in-flight ranges keeps memory flat regardless of the PDF's size
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            pending = deque()
+            for start, end in ranges:
+                pending.append(pool.submit(extract_page_range, pdf_path, start, end))
+                if len(pending) >= self.workers * 2:
+                    for page_num, text in pending.popleft().result():
+                        yield SimpleDoc(text, {'source': pdf_file, 'page': page_num})
+            while pending:
+                for page_num, text in pending.popleft().result():
+                    yield SimpleDoc(text, {'source': pdf_file, 'page': page_num})
+
+    def get_pdf_pages(self, pdf_file):
+        #Get the cleaned, non-empty pages of one PDF
+        return list(self.iter_pdf_pages(pdf_file))
 
     def get_all_documents(self):
-        #Get all document texts
-        documents = []
-        
+        #Yield the pages of every PDF in the data folder
         for pdf_file in self.pdf_files:
             pdf_path = os.path.join(self.data_folder, pdf_file)
             if os.path.exists(pdf_path):
                 print(f"Processing {pdf_file}...")
                 try:
-                    doc = fitz.open(pdf_path)
-                    
-                    for page_num in range(len(doc)):
-                        page = doc.load_page(page_num)
-                        text = page.get_text()
-                        
-                        if text.strip():  # Only add non-empty pages
-                            # Create a document-like object
-                            class SimpleDoc:
-                                def __init__(self, content, metadata):
-                                    self.page_content = content
-                                    self.metadata = metadata
-                            
-                            cleaned_text = self.clean_text(text)
-                            if cleaned_text:
-                                simple_doc = SimpleDoc(
-                                    cleaned_text,
-                                    {
-                                        'source': pdf_file,
-                                        'page': page_num + 1
-                                    }
-                                )
-                                documents.append(simple_doc)
-                    
-                    doc.close()
-                    print(f"Loaded {pdf_file}: {len([d for d in documents if d.metadata['source'] == pdf_file])} pages")
-                    
+                    page_count = 0
+                    for page in self.iter_pdf_pages(pdf_file):
+                        page_count += 1
+                        yield page
+                    print(f"Loaded {pdf_file}: {page_count} pages")
+
                 except Exception as e:
                     print(f"Error processing {pdf_file}: {str(e)}")
             else:
                 print(f"File not found: {pdf_path}")
-        
-        return documents
\ No newline at end of file
@@ -0,0 +1,406 @@
+import os
+import time
+import asyncio
+import threading
+import contextvars
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Awaitable, Callable, Dict, Optional
+from .metrics import REGISTRY, submit_in_context
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open"""
+
+
+class DeadlineExceeded(TimeoutError):
+    """The upstream did not answer within its timeout or the request's remaining budget"""
+
+
+# ---- request budget -----------------------------------------------------------
+
+_deadline: contextvars.ContextVar = contextvars.ContextVar("deadline", default=None)
+
+
+def set_budget(seconds: Optional[float]):
+    #Give the current request this many seconds for all its upstream calls; None lifts the limit
+    _deadline.set(time.monotonic() + seconds if seconds else None)
+
+
+def remaining_budget() -> Optional[float]:
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def detached(fn: Callable) -> Callable:
+    """fn without the request budget, for work that finishes after the response.
+
+    Meant for functions run in a copied context (submit_in_context, asyncio tasks), so clearing
+    the budget there leaves the request's own context alone.
+    """
+    if asyncio.iscoroutinefunction(fn):
+        async def run_async(*args, **kwargs):
+            _deadline.set(None)
+            return await fn(*args, **kwargs)
+        return run_async
+
+    def run(*args, **kwargs):
+        _deadline.set(None)
+        return fn(*args, **kwargs)
+    return run
+
+
+# ---- circuit breaker ----------------------------------------------------------
+
+class CircuitBreaker:
+    """Opens after failure_threshold consecutive failures and rejects calls for reset_timeout seconds.
+
+    After that one trial call is let through (half-open): its success closes the circuit, its
+    failure opens it again. trip() opens it straight away, e.g. for a provider's retry-after.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._open_until = 0.0  # 0 while closed
+        self._probing = False
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if not self._open_until:
+            return "closed"
+        return "open" if time.monotonic() < self._open_until else "half_open"
+
+    def is_open(self) -> bool:
+        return self.state == "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if not self._open_until:
+                return True
+            if time.monotonic() < self._open_until or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_rejection(self):
+        with self._lock:
+            self.rejected += 1
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._open_until = 0.0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._open(self.reset_timeout)
+
+    def record_inconclusive(self):
+        #The call ended without saying anything about the upstream; a trial call may be retried
+        with self._lock:
+            self._probing = False
+
+    def trip(self, seconds: float):
+        with self._lock:
+            self._open(seconds)
+
+    def _open(self, seconds: float):
+        now = time.monotonic()
+        if self._open_until <= now:
+            self.opened += 1
+        self._open_until = max(self._open_until, now + seconds)
+        self._probing = False
+
+
+# ---- call policy --------------------------------------------------------------
+
+UPSTREAM_CALLS = REGISTRY.counter(
+    "medbot_upstream_calls_total",
+    "Upstream calls by outcome: ok, error, timeout, rejected (circuit open), queue_timeout, no_budget",
+    labelnames=("upstream", "outcome"),
+)
+UPSTREAM_SECONDS = REGISTRY.histogram(
+    "medbot_upstream_seconds", "Time waited for an upstream call, hedges included", labelnames=("upstream",)
+)
+UPSTREAM_QUEUE_SECONDS = REGISTRY.histogram(
+    "medbot_upstream_queue_seconds", "Time a call waited for a concurrency slot", labelnames=("upstream",)
+)
+UPSTREAM_HEDGES = REGISTRY.counter(
+    "medbot_upstream_hedges_total", "Hedged second attempts sent", labelnames=("upstream",)
+)
+UPSTREAM_HEDGE_WINS = REGISTRY.counter(
+    "medbot_upstream_hedge_wins_total", "Hedged attempts that answered first", labelnames=("upstream",)
+)
+
+
+class UpstreamPolicy:
+    """Deadline, circuit breaker, bounded concurrency and optional hedging for one upstream.
+
+    Each call gets the smaller of the policy's timeout and the request's remaining budget. Calls
+    run on the policy's threads so the caller can stop waiting at the deadline; an abandoned call
+    keeps its concurrency slot until it returns, which the client's own timeout bounds. With
+    hedge_after set, a hedge=True call that has not answered by then is sent once more if a slot
+    is free, and the first answer wins. Only idempotent reads should hedge.
+    """
+
+    def __init__(self, name: str, timeout: float = 10.0, max_concurrency: int = 16, hedge_after: float = 0.0,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.hedge_after = hedge_after
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._async_slots = None  # asyncio.Semaphore, made on the serving loop
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix=f"upstream-{name}")
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.in_flight = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def _count(self, outcome: str):
+        UPSTREAM_CALLS.labels(upstream=self.name, outcome=outcome).inc()
+
+    def call_timeout(self) -> float:
+        budget = remaining_budget()
+        timeout = self.timeout if budget is None else min(self.timeout, budget)
+        if timeout <= 0:
+            self._count("no_budget")
+            raise DeadlineExceeded(f"{self.name}: request budget exhausted")
+        return timeout
+
+    def _reject(self):
+        # Both the fast is_open() check and a refused allow() end here
+        self.breaker.record_rejection()
+        self._count("rejected")
+        raise CircuitOpenError(f"{self.name}: circuit open, skipping the call")
+
+    def _queued(self, waited: float, acquired: bool):
+        UPSTREAM_QUEUE_SECONDS.labels(upstream=self.name).observe(waited)
+        if not acquired:
+            self._count("queue_timeout")
+            raise DeadlineExceeded(f"{self.name}: no free slot before the deadline")
+        with self._lock:
+            self.in_flight += 1
+
+    def _release(self, slots, _=None):
+        with self._lock:
+            self.in_flight -= 1
+        slots.release()
+
+    def _finish(self, started: float, timeout: float, error: Optional[BaseException], hedged_win: bool):
+        UPSTREAM_SECONDS.labels(upstream=self.name).observe(time.monotonic() - started)
+        if error is None:
+            self.breaker.record_success()
+            self._count("ok")
+        elif isinstance(error, DeadlineExceeded) and timeout < self.timeout:
+            # Cut short by the request's budget, not by the upstream: no evidence it is unhealthy
+            self.breaker.record_inconclusive()
+            self._count("no_budget")
+        else:
+            self.breaker.record_failure()
+            self._count("timeout" if isinstance(error, (DeadlineExceeded, asyncio.TimeoutError)) else "error")
+        if hedged_win:
+            with self._lock:
+                self.hedge_wins += 1
+            UPSTREAM_HEDGE_WINS.labels(upstream=self.name).inc()
+
+    def _hedged(self):
+        with self._lock:
+            self.in_flight += 1
+            self.hedges += 1
+        UPSTREAM_HEDGES.labels(upstream=self.name).inc()
+
+    def call(self, fn: Callable, *args, hedge: bool = False, **kwargs) -> Any:
+        """fn(*args, **kwargs) under this policy.
+
+        Raises CircuitOpenError without calling while the circuit is open, and DeadlineExceeded
+        when no slot or no answer came before the deadline.
+        """
+        timeout = self.call_timeout()
+        deadline = time.monotonic() + timeout
+        if self.breaker.is_open():
+            self._reject()
+
+        with self._lock:
+            self.waiting += 1
+        started = time.monotonic()
+        try:
+            acquired = self._slots.acquire(timeout=timeout)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        self._queued(time.monotonic() - started, acquired)
+        if not self.breaker.allow():
+            self._release(self._slots)
+            self._reject()
+
+        attempt = partial(fn, *args, **kwargs)
+        futures = [self._submit(attempt)]
+        error, winner = None, None
+        try:
+            if hedge and self.hedge_after > 0:
+                done, _ = wait(futures, timeout=min(self.hedge_after, max(0.0, deadline - time.monotonic())))
+                # A hedge only goes out when it does not have to queue for a slot
+                if not done and self._slots.acquire(blocking=False):
+                    self._hedged()
+                    futures.append(self._submit(attempt))
+
+            pending = set(futures)
+            while pending and winner is None:
+                done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()),
+                                     return_when=FIRST_COMPLETED)
+                if not done:
+                    # The attempts keep running on the policy's threads; their results are dropped
+                    error = DeadlineExceeded(f"{self.name}: no answer within {timeout:.1f}s")
+                    break
+                for future in done:
+                    if future.exception() is None:
+                        winner = future
+                        break
+                    error = future.exception()
+        finally:
+            self._finish(started, timeout, None if winner is not None else error,
+                         winner is not None and winner is not futures[0])
+        if winner is None:
+            raise error
+        return winner.result()
+
+    def _submit(self, attempt: Callable):
+        future = submit_in_context(self._executor, attempt)
+        future.add_done_callback(partial(self._release, self._slots))
+        return future
+
+    async def acall(self, factory: Callable[[], Awaitable], hedge: bool = False) -> Any:
+        #call() for the async serving mode; factory() makes a fresh coroutine for each attempt
+        timeout = self.call_timeout()
+        deadline = time.monotonic() + timeout
+        if self.breaker.is_open():
+            self._reject()
+
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.max_concurrency)
+        slots = self._async_slots
+        with self._lock:
+            self.waiting += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(slots.acquire(), timeout)
+            acquired = True
+        except asyncio.TimeoutError:
+            acquired = False
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        self._queued(time.monotonic() - started, acquired)
+        if not self.breaker.allow():
+            self._release(slots)
+            self._reject()
+
+        tasks = [self._start(factory, slots)]
+        error, winner = None, None
+        try:
+            if hedge and self.hedge_after > 0:
+                done, _ = await asyncio.wait(tasks, timeout=min(self.hedge_after, max(0.0, deadline - time.monotonic())))
+                if not done and not slots.locked():
+                    await slots.acquire()  # Free, so this does not wait
+                    self._hedged()
+                    tasks.append(self._start(factory, slots))
+
+            pending = set(tasks)
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, timeout=max(0.0, deadline - time.monotonic()),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    error = DeadlineExceeded(f"{self.name}: no answer within {timeout:.1f}s")
+                    break
+                for task in done:
+                    if task.exception() is None:
+                        winner = task
+                        break
+                    error = task.exception()
+        finally:
+            # Unlike threads, losing and late attempts can be cancelled
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            self._finish(started, timeout, None if winner is not None else error,
+                         winner is not None and winner is not tasks[0])
+        if winner is None:
+            raise error
+        return winner.result()
+
+    def _start(self, factory: Callable[[], Awaitable], slots) -> asyncio.Task:
+        task = asyncio.ensure_future(factory())
+        task.add_done_callback(partial(self._release, slots))
+        return task
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.breaker.state,
+            "timeout": self.timeout,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "hedge_after_ms": self.hedge_after * 1000,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "circuit_opened": self.breaker.opened,
+            "rejected": self.breaker.rejected,
+        }
+
+
+# Per-call timeout (s) and concurrent calls per process; Groq's timeout covers a full completion
+UPSTREAM_DEFAULTS = {
+    "cohere": {"timeout": 5.0, "max_concurrency": 16},
+    "qdrant": {"timeout": 5.0, "max_concurrency": 32},
+    "tavily": {"timeout": 10.0, "max_concurrency": 16},
+    "groq": {"timeout": 30.0, "max_concurrency": 32},
+}
+_policies: Dict[str, UpstreamPolicy] = {}
+_policies_lock = threading.Lock()
+
+
+def get_policy(name: str) -> UpstreamPolicy:
+    """The process-wide policy of one upstream, shared by its sync and async clients.
+
+    <NAME>_TIMEOUT, <NAME>_MAX_CONCURRENCY, <NAME>_HEDGE_MS (0 = no hedging), <NAME>_BREAKER_FAILURES
+    and <NAME>_BREAKER_RESET override the defaults, e.g. TAVILY_HEDGE_MS=1500.
+    """
+    policy = _policies.get(name)
+    if policy is None:
+        with _policies_lock:
+            policy = _policies.get(name)
+            if policy is None:
+                prefix, defaults = name.upper(), UPSTREAM_DEFAULTS.get(name, {})
+                policy = _policies[name] = UpstreamPolicy(
+                    name,
+                    timeout=float(os.getenv(f"{prefix}_TIMEOUT", defaults.get("timeout", 10.0))),
+                    max_concurrency=int(os.getenv(f"{prefix}_MAX_CONCURRENCY", defaults.get("max_concurrency", 16))),
+                    hedge_after=float(os.getenv(f"{prefix}_HEDGE_MS", "0")) / 1000,
+                    failure_threshold=int(os.getenv(f"{prefix}_BREAKER_FAILURES", "5")),
+                    reset_timeout=float(os.getenv(f"{prefix}_BREAKER_RESET", "30")),
+                )
+    return policy
+
+
+def upstream_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: policy.stats() for name, policy in list(_policies.items())}
+
+
+REGISTRY.gauge("medbot_upstream_queue_depth", "Calls waiting for an upstream concurrency slot",
+               lambda: {(name,): policy.waiting for name, policy in list(_policies.items())}, labelnames=("upstream",))
+REGISTRY.gauge("medbot_upstream_in_flight", "Upstream calls running, abandoned ones included",
+               lambda: {(name,): policy.in_flight for name, policy in list(_policies.items())}, labelnames=("upstream",))
+REGISTRY.gauge("medbot_upstream_circuit_open", "1 while an upstream's circuit is open or half-open",
+               lambda: {(name,): float(policy.breaker.state != "closed") for name, policy in list(_policies.items())},
+               labelnames=("upstream",))
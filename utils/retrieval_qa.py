@@ -1,42 +1,68 @@
 import os
-from typing import List, Dict
-from groq import Groq
+from typing import List, Dict, Iterator, AsyncIterator, Optional
+from groq import Groq, AsyncGroq
+from .http_pool import get_async_client
+from .metrics import span
+from .context_packing import create_context_packer
+from .resilience import get_policy
+
+
+def llm_usage(response) -> Dict[str, int]:
+    #Token counts from a completion, or from the last stream chunk where Groq reports them under x_groq
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        x_groq = getattr(response, "x_groq", None)
+        usage = x_groq.get("usage") if isinstance(x_groq, dict) else getattr(x_groq, "usage", None)
+    if not usage:
+        return {}
+    if not isinstance(usage, dict):
+        usage = {"prompt_tokens": usage.prompt_tokens, "completion_tokens": usage.completion_tokens}
+    return {"prompt_tokens": usage.get("prompt_tokens") or 0, "completion_tokens": usage.get("completion_tokens") or 0}
+
+
+FALLBACK_RESPONSE = "I apologize, but I'm unable to generate a response at this time. Please try again later, or consult with a healthcare professional for medical advice."
+
 
 class LLMAgent:
     
     def __init__(self):
-        self.client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+        self.policy = get_policy("groq")
+        self.client = Groq(api_key=os.getenv("GROQ_API_KEY"), timeout=self.policy.timeout)
         self.model = "llama-3.3-70b-versatile"
+        self.context_packer = create_context_packer()
     
-    def generate_response(self, query: str, vector_context: List[Dict], 
-                         web_context: List[Dict]) -> str:
-        try:
-            # Handle simple greetings
-            q_lower = query.strip().lower()
-            if q_lower in ["hi", "hello", "hey", "good morning", "good afternoon", "good evening"]:
-                return "Hello! I'm here to help you with medical questions. How can I assist you today?"
-            
-            if q_lower in ["how are you", "how is it going", "what's up", "how do you do"]:
-                return "I'm ready to help you with medical information. What would you like to know?"
-            
-            # Prepare context from vector database
-            vector_text = ""
-            if vector_context:
-                vector_text = "\n\n".join([
-                    f"Medical Document - {item['source']} (Page {item.get('page', 'Unknown')}):\n{item['text'][:800]}..."
-                    for item in vector_context[:3]
-                ])
-            
-            # Prepare context from web search
-            web_text = ""
-            if web_context:
-                web_text = "\n\n".join([
-                    f"Web Source - {item['title']}:\n{item['content'][:800]}..."
-                    for item in web_context[:3]
-                ])
-            
-            # System prompt for plain text without markdown/dashes
-            system_prompt = """You are a medical AI assistant that provides accurate, helpful medical information. 
+    def _canned_reply(self, query: str) -> Optional[str]:
+        # Handle simple greetings
+        q_lower = query.strip().lower()
+        if q_lower in ["hi", "hello", "hey", "good morning", "good afternoon", "good evening"]:
+            return "Hello! I'm here to help you with medical questions. How can I assist you today?"
+        
+        if q_lower in ["how are you", "how is it going", "what's up", "how do you do"]:
+            return "I'm ready to help you with medical information. What would you like to know?"
+        
+        return None
+
+    def _build_messages(self, query: str, vector_context: List[Dict], 
+                        web_context: List[Dict]) -> List[Dict]:
+        # Merge overlapping chunks, drop near-duplicates and fill the token budget by MMR
+        with span("context_packing") as current:
+            packed = self.context_packer.pack(query, vector_context, web_context)
+            current.set(
+                results=len(packed["documents"]) + len(packed["web"]),
+                context_tokens=packed["context_tokens"],
+                baseline_tokens=packed["baseline_tokens"],
+                merged_chunks=packed["merged_chunks"],
+                duplicates_dropped=packed["duplicates_dropped"],
+            )
+
+        # Prepare context from vector database
+        vector_text = "\n\n".join(f"{passage['label']}:\n{passage['text']}" for passage in packed["documents"])
+        
+        # Prepare context from web search
+        web_text = "\n\n".join(f"{passage['label']}:\n{passage['text']}" for passage in packed["web"])
+        
+        # System prompt for plain text without markdown/dashes
+        system_prompt = """You are a medical AI assistant that provides accurate, helpful medical information. 
 You have access to medical literature and current web information.
 
 FORMATTING RULES:
@@ -54,17 +80,17 @@ CONTENT RULES:
 5. Be empathetic and professional
 """
 
-            # Combine contexts
-            context_section = ""
-            if vector_text:
-                context_section += f"MEDICAL LITERATURE:\n{vector_text}\n\n"
-            if web_text:
-                context_section += f"CURRENT WEB INFORMATION:\n{web_text}\n\n"
-            
-            if not context_section:
-                context_section = "No specific context found. Providing general medical knowledge response.\n\n"
+        # Combine contexts
+        context_section = ""
+        if vector_text:
+            context_section += f"MEDICAL LITERATURE:\n{vector_text}\n\n"
+        if web_text:
+            context_section += f"CURRENT WEB INFORMATION:\n{web_text}\n\n"
+        
+        if not context_section:
+            context_section = "No specific context found. Providing general medical knowledge response.\n\n"
 
-            user_prompt = f"""Medical Query: {query}
+        user_prompt = f"""Medical Query: {query}
 
 AVAILABLE CONTEXT:
 {context_section}
@@ -78,18 +104,134 @@ Please provide a comprehensive plain-text response that:
 
 Response:"""
 
-            response = self.client.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                model=self.model,
-                max_tokens=1200,
-                temperature=0.3
-            )
-            
-            return response.choices[0].message.content.strip()
-            
-        except Exception as e:
-            print(f"Error generating LLM response: {str(e)}")
-            return "I apologize, but I'm unable to generate a response at this time. Please try again later, or consult with a healthcare professional for medical advice."
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+
+    def generate_response(self, query: str, vector_context: List[Dict], 
+                         web_context: List[Dict]) -> str:
+        with span("generation", streamed=False) as current:
+            try:
+                canned = self._canned_reply(query)
+                if canned:
+                    return canned
+
+                response = self.policy.call(
+                    self.client.chat.completions.create,
+                    messages=self._build_messages(query, vector_context, web_context),
+                    model=self.model,
+                    max_tokens=1200,
+                    temperature=0.3
+                )
+                current.set(**llm_usage(response))
+                
+                return response.choices[0].message.content.strip()
+                
+            except Exception as e:
+                print(f"Error generating LLM response: {str(e)}")
+                current.set(failed=True)
+                return FALLBACK_RESPONSE
+
+    def stream_response(self, query: str, vector_context: List[Dict],
+                        web_context: List[Dict]) -> Iterator[str]:
+        """Yield the response text piece by piece as Groq produces it.
+
+        Falls back to an apology only if nothing was yielded yet; a stream that breaks later raises.
+        """
+        canned = self._canned_reply(query)
+        if canned:
+            yield canned
+            return
+
+        with span("generation", streamed=True) as current:
+            streamed = False
+            try:
+                # The deadline covers the wait for the stream to open, not the tokens after it
+                stream = self.policy.call(
+                    self.client.chat.completions.create,
+                    messages=self._build_messages(query, vector_context, web_context),
+                    model=self.model,
+                    max_tokens=1200,
+                    temperature=0.3,
+                    stream=True
+                )
+                
+                for chunk in stream:
+                    current.set(**llm_usage(chunk))  # Only the final chunk carries usage
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        streamed = True
+                        yield chunk.choices[0].delta.content
+                
+            except Exception as e:
+                print(f"Error streaming LLM response: {str(e)}")
+                current.set(failed=True)
+                # Part of the answer is out already; an apology after it would read as its end
+                if streamed:
+                    raise
+                yield FALLBACK_RESPONSE
+
+
+class AsyncLLMAgent(LLMAgent):
+    """LLMAgent for the async serving mode, on the shared connection pool"""
+
+    def __init__(self):
+        super().__init__()
+        self.client = AsyncGroq(api_key=os.getenv("GROQ_API_KEY"), http_client=get_async_client(),
+                                timeout=self.policy.timeout)
+
+    async def generate_response(self, query: str, vector_context: List[Dict],
+                                web_context: List[Dict]) -> str:
+        with span("generation", streamed=False) as current:
+            try:
+                canned = self._canned_reply(query)
+                if canned:
+                    return canned
+
+                messages = self._build_messages(query, vector_context, web_context)
+                response = await self.policy.acall(lambda: self.client.chat.completions.create(
+                    messages=messages,
+                    model=self.model,
+                    max_tokens=1200,
+                    temperature=0.3
+                ))
+                current.set(**llm_usage(response))
+                
+                return response.choices[0].message.content.strip()
+                
+            except Exception as e:
+                print(f"Error generating LLM response: {str(e)}")
+                current.set(failed=True)
+                return FALLBACK_RESPONSE
+
+    async def stream_response(self, query: str, vector_context: List[Dict],
+                              web_context: List[Dict]) -> AsyncIterator[str]:
+        canned = self._canned_reply(query)
+        if canned:
+            yield canned
+            return
+
+        with span("generation", streamed=True) as current:
+            streamed = False
+            try:
+                messages = self._build_messages(query, vector_context, web_context)
+                stream = await self.policy.acall(lambda: self.client.chat.completions.create(
+                    messages=messages,
+                    model=self.model,
+                    max_tokens=1200,
+                    temperature=0.3,
+                    stream=True
+                ))
+                
+                async for chunk in stream:
+                    current.set(**llm_usage(chunk))
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        streamed = True
+                        yield chunk.choices[0].delta.content
+                
+            except Exception as e:
+                print(f"Error streaming LLM response: {str(e)}")
+                current.set(failed=True)
+                if streamed:
+                    raise
+                yield FALLBACK_RESPONSE
\ No newline at end of file
@@ -1,10 +1,72 @@
 import os
-from typing import List, Dict
+import types
+import requests
+from requests.adapters import HTTPAdapter
+from typing import List, Dict, Any
 from tavily import TavilyClient
+from .cache import TTLCache, SingleFlight, AsyncSingleFlight
+from .http_pool import get_async_client
+from .metrics import span
+from .resilience import get_policy
+
+class TimeoutAdapter(HTTPAdapter):
+    """HTTPAdapter that gives up after its own timeout, whatever the caller asked for"""
+
+    def __init__(self, timeout: float, **kwargs):
+        super().__init__(**kwargs)
+        self.timeout = timeout
+
+    def send(self, request, timeout=None, **kwargs):
+        return super().send(request, timeout=self.timeout, **kwargs)
+
+
+class _CapturedRequest:
+    #Stands in for the requests module: keeps the SDK's POST instead of sending it
+    status_code = 200
+
+    def post(self, url, data=None, headers=None, timeout=None):
+        self.request = {"url": url, "content": data, "headers": headers}
+        return self
+
+    def json(self):
+        return self.request
+
+
+def _sdk_search(transport):
+    #TavilyClient._search as shipped, with its requests.post going to transport
+    search = TavilyClient._search
+    return types.FunctionType(
+        search.__code__, {**search.__globals__, "requests": transport}, search.__name__, search.__defaults__
+    )
+
+
+class BoundedTavilyClient(TavilyClient):
+    """TavilyClient whose searches give up after the call policy's timeout; the SDK waits up to 100 s.
+
+    The SDK builds and sends every request itself, through a keep-alive session whose adapter sets the timeout.
+    """
+
+    def __init__(self, api_key: str, timeout: float):
+        super().__init__(api_key)
+        self.session = requests.Session()
+        adapter = TimeoutAdapter(timeout)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._send = _sdk_search(self.session)
+
+    def _search(self, query, **kwargs):
+        return self._send(self, query, **kwargs)
+
+    def build_request(self, query, **kwargs) -> Dict[str, Any]:
+        """The url, JSON body and headers search() would post, SDK defaults included"""
+        return _sdk_search(_CapturedRequest())(self, query, **kwargs)
+
 
 class WebScraper:    
     def __init__(self):
-        self.client = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
+        self.policy = get_policy("tavily")
+        self.client = BoundedTavilyClient(os.getenv("TAVILY_API_KEY"), self.policy.timeout)
+        self.client.base_url = os.getenv("TAVILY_API_URL", self.client.base_url)
         self.medical_sites = [
             "mayoclinic.org",
             "webmd.com", 
@@ -15,31 +77,119 @@ class WebScraper:
             "nih.gov",
             "pubmed.ncbi.nlm.nih.gov"
         ]
+        # Medical reference pages change slowly, so results are kept for half a day by default
+        self.cache = TTLCache(
+            max_size=int(os.getenv("WEB_SEARCH_CACHE_SIZE", "2048")),
+            ttl=float(os.getenv("WEB_SEARCH_CACHE_TTL", "43200"))
+        )
+        self.in_flight = SingleFlight()
     
+    @staticmethod
+    def medical_query(query: str) -> str:
+        # Add medical context to query; case and spacing don't change the search
+        query = " ".join(query.split()).casefold()
+        return f"medical health {query} symptoms treatment diagnosis"
+
     def search_web(self, query: str, max_results: int = 3) -> List[Dict]:
         """Search web for relevant medical information"""
-        try:
-            # Add medical context to query
-            medical_query = f"medical health {query} symptoms treatment diagnosis"
-            
-            response = self.client.search(
-                query=medical_query,
-                search_depth="advanced",
-                max_results=max_results,
-                include_domains=self.medical_sites
-            )
-            
-            results = []
-            for result in response.get("results", []):
-                results.append({
-                    "title": result.get("title", ""),
-                    "content": result.get("content", ""),
-                    "url": result.get("url", ""),
-                    "score": result.get("score", 0)
-                })
-            
-            return results
-            
-        except Exception as e:
-            print(f"Error in web search: {str(e)}")
-            return []
\ No newline at end of file
+        medical_query = self.medical_query(query)
+        key = (medical_query, max_results, tuple(self.medical_sites))
+
+        with span("web_search") as current:
+            cached = self.cache.get(key)
+            current.set(cache_hit=cached is not None)
+            if cached is not None:
+                current.set(results=len(cached))
+                return list(cached)
+
+            try:
+                # Identical concurrent searches share one Tavily call
+                results = self.in_flight.do(key, lambda: self._search(key))
+                current.set(results=len(results))
+                return list(results)
+                
+            except Exception as e:
+                print(f"Error in web search: {str(e)}")
+                current.set(failed=True)
+                return []
+
+    def _search(self, key) -> List[Dict]:
+        # Only successful searches reach the cache; errors propagate to every waiter
+        medical_query, max_results, domains = key
+        response = self.policy.call(
+            self.client.search,
+            query=medical_query,
+            search_depth="advanced",
+            max_results=max_results,
+            include_domains=list(domains),
+            hedge=True
+        )
+        
+        results = self._parse_results(response)
+        self.cache.put(key, results)
+        return results
+
+    @staticmethod
+    def _parse_results(response: Dict) -> List[Dict]:
+        return [
+            {
+                "title": result.get("title", ""),
+                "content": result.get("content", ""),
+                "url": result.get("url", ""),
+                "score": result.get("score", 0)
+            }
+            for result in response.get("results", [])
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.cache.stats(), **self.in_flight.stats()}
+
+
+class AsyncWebScraper(WebScraper):
+    """WebScraper for the async serving mode: Tavily's REST API on the shared connection pool.
+
+    Pass the sync scraper's cache to let both serving modes reuse each other's results.
+    """
+
+    def __init__(self, cache: TTLCache = None):
+        super().__init__()
+        if cache is not None:
+            self.cache = cache
+        self.in_flight = AsyncSingleFlight()
+
+    async def search_web(self, query: str, max_results: int = 3) -> List[Dict]:
+        medical_query = self.medical_query(query)
+        key = (medical_query, max_results, tuple(self.medical_sites))
+
+        with span("web_search") as current:
+            cached = self.cache.get(key)
+            current.set(cache_hit=cached is not None)
+            if cached is not None:
+                current.set(results=len(cached))
+                return list(cached)
+
+            try:
+                results = await self.in_flight.do(key, lambda: self._search(key))
+                current.set(results=len(results))
+                return list(results)
+                
+            except Exception as e:
+                print(f"Error in web search: {str(e)}")
+                current.set(failed=True)
+                return []
+
+    async def _search(self, key) -> List[Dict]:
+        medical_query, max_results, domains = key
+
+        request = self.client.build_request(
+            medical_query, search_depth="advanced", max_results=max_results, include_domains=list(domains)
+        )
+
+        async def search():
+            response = await get_async_client().post(**request)
+            response.raise_for_status()
+            return response.json()
+
+        results = self._parse_results(await self.policy.acall(search, hedge=True))
+        self.cache.put(key, results)
+        return results
\ No newline at end of file